@@ -0,0 +1,127 @@
+"""
+Duplicate-read benchmark: backend calls when one user's devices sync at once.
+
+Every round, each user's ``--devices`` devices call /syncTasks at the same moment
+with the same cursor, so the server sees bursts of identical profile lookups and
+change-page queries. Profiles are evicted from the profile cache before each
+round (``--warm-profiles`` keeps them), as after a cache expiry. Reported per
+mode:
+
+- **direct**: every request makes its own reads (how the server read before)
+- **singleflight**: concurrent identical reads share one backend call
+- **singleflight+cache**: the change page is also kept for ``--cache-ttl`` seconds
+
+Usage (from the repository root):
+    python -m benchmarks.duplicate_reads
+    python -m benchmarks.duplicate_reads --devices 8 --read-latency 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from .endpoints import _seed_tasks
+from .fake_firebase import FakeFirebase
+from .harness import add_latency_args, auth_headers, client_for, latency_from_args, load_app, percentile, print_table
+
+MODES = ["direct", "singleflight", "singleflight+cache"]
+
+
+class DirectReads:
+    """Stand-in for ``SingleFlight`` that runs every call itself."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def do(self, key, fn, *args, **kwargs):
+        return await fn(*args, **kwargs)
+
+
+def configure(app_module, mode: str, cache_ttl: float) -> None:
+    from server import sync
+    from server.singleflight import SingleFlight
+
+    if mode == "direct":
+        app_module.profile_reads = DirectReads("profile")
+        sync.change_reads = DirectReads("sync_changes")
+    else:
+        app_module.profile_reads = SingleFlight("profile")
+        sync.change_reads = SingleFlight("sync_changes", ttl=cache_ttl if mode == "singleflight+cache" else 0.0)
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    fake = FakeFirebase(latency_from_args(args))
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    for uid in users:
+        fake.add_user(uid)
+        _seed_tasks(fake, uid, args.seed_tasks)
+    app_module = load_app(fake)
+
+    rows = []
+    async with client_for(app_module.app) as client:
+        async def device_sync(uid: str):
+            started = time.perf_counter()
+            response = await client.post(
+                "/syncTasks",
+                json={"user_id": uid, "tasks": [], "page_size": args.page_size},
+                headers=auth_headers(uid)
+            )
+            return response.status_code, time.perf_counter() - started
+
+        for mode in args.modes:
+            configure(app_module, mode, args.cache_ttl)
+            before = Counter(fake.calls)
+            latencies, errors = [], 0
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                if not args.warm_profiles:
+                    app_module.profile_cache.clear()
+                results = await asyncio.gather(*[
+                    device_sync(uid) for uid in users for _ in range(args.devices)
+                ])
+                for status_code, latency in results:
+                    errors += status_code >= 400
+                    latencies.append(latency)
+            elapsed = time.perf_counter() - started
+            calls = fake.calls - before
+            requests = len(latencies)
+            latencies.sort()
+            firestore = sum(count for name, count in calls.items() if name.startswith("firestore."))
+            rows.append({
+                "mode": mode,
+                "requests": requests,
+                "errors": errors,
+                "rps": round(requests / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "backend_calls_per_request": round(sum(calls.values()) / requests, 2),
+                "firestore_calls_per_request": round(firestore / requests, 2),
+            })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Count backend reads when several devices of a user sync together")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--users", type=int, default=20, help="Distinct users")
+    parser.add_argument("--devices", type=int, default=4, help="Devices per user syncing in each round")
+    parser.add_argument("--rounds", type=int, default=20, help="Sync bursts per mode")
+    parser.add_argument("--seed-tasks", type=int, default=200, help="Tasks stored per user")
+    parser.add_argument("--page-size", type=int, default=100, help="Changes per sync page")
+    parser.add_argument("--cache-ttl", type=float, default=1.0, help="Change-page cache lifetime in singleflight+cache (s)")
+    parser.add_argument("--warm-profiles", action="store_true", help="Keep profiles cached between rounds")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(rows, [
+        "mode", "requests", "errors", "rps", "p50_ms", "p95_ms",
+        "backend_calls_per_request", "firestore_calls_per_request"
+    ])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
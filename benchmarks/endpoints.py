@@ -0,0 +1,188 @@
+"""
+Endpoint throughput and latency benchmark against the in-memory Firebase fake.
+
+Drives concurrent load at /sendMessage, /syncTasks, /importFile and
+/getAIQuestions and reports requests/sec, p50/p95/p99 latency, backend calls
+per request and peak RSS for each endpoint. Results can be saved as a baseline
+and later runs compared against it; the run fails if throughput drops or p95
+latency grows by more than ``--max-regression`` percent.
+
+Usage (from the repository root):
+    python -m benchmarks.endpoints
+    python -m benchmarks.endpoints --save benchmarks/baselines/endpoints.json
+    python -m benchmarks.endpoints --compare benchmarks/baselines/endpoints.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from .fake_firebase import FakeFirebase
+from .harness import (
+    add_latency_args, auth_headers, client_for, format_delta, latency_from_args,
+    load_app, print_table, run_load
+)
+
+ENDPOINTS = ["sendMessage", "syncTasks", "importFile", "getAIQuestions"]
+
+
+def _seed_tasks(fake: FakeFirebase, uid: str, count: int) -> None:
+    now = int(time.time() * 1000)
+    for i in range(count):
+        fake.db._write(f"users/{uid}/tasks/seed-{i}", {
+            "id": f"seed-{i}",
+            "title": f"Seeded task {i}",
+            "description": None,
+            "is_completed": False,
+            "created_at": now,
+            "updated_at": now,
+            "is_deleted": False,
+            "updatedAt": now - count + i,
+        }, merge=False)
+
+
+def _scenarios(client, args) -> Dict[str, Callable[[int], Any]]:
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    cursors: Dict[str, Any] = {}
+    upload = b"x" * (args.upload_kb * 1024)
+
+    async def send_message(i):
+        uid = users[i % len(users)]
+        return await client.post(
+            "/sendMessage",
+            json={"message": f"benchmark message {i}", "userId": uid},
+            headers=auth_headers(uid)
+        )
+
+    async def sync_tasks(i):
+        uid = users[i % len(users)]
+        now = int(time.time() * 1000)
+        tasks = [
+            {"id": f"client-{i}-{n}", "title": f"Client task {n}", "updated_at": now}
+            for n in range(args.client_tasks)
+        ]
+        response = await client.post(
+            "/syncTasks",
+            json={"user_id": uid, "cursor": cursors.get(uid), "tasks": tasks},
+            headers=auth_headers(uid)
+        )
+        if response.status_code == 200:
+            cursors[uid] = response.json().get("next_cursor")
+        return response
+
+    async def import_file(i):
+        uid = users[i % len(users)]
+        # Every n-th upload repeats earlier content; the rest are unique bytes
+        repeat = args.upload_repeat > 0 and i % round(1 / args.upload_repeat) == 0
+        content = upload if repeat else i.to_bytes(8, "big") + upload[8:]
+        return await client.post(
+            "/importFile",
+            files={"file": (f"bench-{i}.bin", content, "application/octet-stream")},
+            headers=auth_headers(uid)
+        )
+
+    async def get_ai_questions(i):
+        uid = users[i % len(users)]
+        return await client.get("/getAIQuestions", params={"limit": 5}, headers=auth_headers(uid))
+
+    return {
+        "sendMessage": send_message,
+        "syncTasks": sync_tasks,
+        "importFile": import_file,
+        "getAIQuestions": get_ai_questions,
+    }
+
+
+async def run(args) -> Dict[str, Dict[str, Any]]:
+    fake = FakeFirebase(latency_from_args(args))
+    for i in range(args.users):
+        fake.add_user(f"bench-user-{i}")
+        _seed_tasks(fake, f"bench-user-{i}", args.seed_tasks)
+    app_module = load_app(fake)
+
+    results = {}
+    async with client_for(app_module.app) as client:
+        scenarios = _scenarios(client, args)
+        for name in args.endpoints:
+            send = scenarios[name]
+            # Warm up caches and connection state outside the measurement
+            await run_load(send, min(args.concurrency, args.requests), args.concurrency)
+            before = Counter(fake.calls)
+            result = await run_load(send, args.requests, args.concurrency)
+            calls = fake.calls - before
+            result["backend_calls_per_request"] = round(sum(calls.values()) / args.requests, 2)
+            results[name] = result
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], max_regression: float) -> bool:
+    rows = []
+    ok = True
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            rows.append({"endpoint": name, "rps": "new", "p95_ms": "new", "status": "-"})
+            continue
+        rps_drop = (base["rps"] - result["rps"]) / base["rps"] * 100 if base["rps"] else 0.0
+        p95_growth = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        regressed = rps_drop > max_regression or p95_growth > max_regression
+        ok = ok and not regressed
+        rows.append({
+            "endpoint": name,
+            "rps": format_delta(result["rps"], base["rps"]),
+            "p50_ms": format_delta(result["p50_ms"], base["p50_ms"]),
+            "p95_ms": format_delta(result["p95_ms"], base["p95_ms"]),
+            "p99_ms": format_delta(result["p99_ms"], base["p99_ms"]),
+            "peak_rss_mb": format_delta(result["peak_rss_mb"], base["peak_rss_mb"]),
+            "status": "REGRESSION" if regressed else "ok",
+        })
+    print(f"\nCompared with baseline from {baseline.get('meta', {}).get('created', 'unknown')}:")
+    print_table(rows, ["endpoint", "rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb", "status"])
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark API endpoints against an in-memory Firebase fake")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests in flight")
+    parser.add_argument("--users", type=int, default=20, help="Distinct authenticated users")
+    parser.add_argument("--seed-tasks", type=int, default=200, help="Tasks stored per user before syncing")
+    parser.add_argument("--client-tasks", type=int, default=5, help="Tasks sent by the client per sync")
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of each uploaded file (KiB)")
+    parser.add_argument("--upload-repeat", type=float, default=0.0, help="Fraction of uploads that re-import identical bytes")
+    add_latency_args(parser)
+    parser.add_argument("--save", type=Path, help="Write results to this baseline file")
+    parser.add_argument("--compare", type=Path, help="Compare results with this baseline file")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed rps drop / p95 growth (%%)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(
+        [{"endpoint": name, **result} for name, result in results.items()],
+        ["endpoint", "requests", "concurrency", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+         "backend_calls_per_request", "peak_rss_mb"]
+    )
+
+    ok = True
+    if args.compare:
+        ok = compare(results, json.loads(args.compare.read_text()), args.max_regression)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "args": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        }
+        args.save.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+        print(f"\nBaseline written to {args.save}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Load test: a slow backend call must not serialize unrelated requests.
+
+One client authenticates as a user whose profile read takes ``--slow`` seconds.
+While that request is in flight, ``--requests`` concurrent calls from another
+user hit ``/toggleRoot``. With the backend pools in ``server.datastore`` those
+calls finish in milliseconds; if SDK calls ran on the event loop they would all
+wait behind the slow read.
+
+Usage (from the repository root):
+    python -m benchmarks.event_loop_blocking --slow 1.0 --requests 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from .fake_firebase import FakeFirebase
+from .harness import auth_headers, client_for, load_app
+
+
+class _SlowProfiles:
+    """Wraps a user repository so one user's profile read takes ``delay`` seconds."""
+
+    def __init__(self, users, slow_uid: str, delay: float):
+        self._users = users
+        self.slow_uid = slow_uid
+        self.delay = delay
+
+    def get_profile(self, uid):
+        if uid == self.slow_uid:
+            time.sleep(self.delay)
+        return self._users.get_profile(uid)
+
+
+async def _timed(client, path, token, **kwargs):
+    started = time.perf_counter()
+    response = await client.post(path, headers=auth_headers(token), **kwargs)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def main(slow: float, requests: int) -> None:
+    fake = FakeFirebase()
+    fake.add_user("slow-user", is_admin=True)
+    fake.add_user("fast-user", is_admin=True)
+    app_module = load_app(fake)
+    app_module.repos.users = _SlowProfiles(app_module.repos.users, "slow-user", slow)
+
+    async with client_for(app_module.app) as client:
+        body = {"enabled": True}
+        # Warm the fast user's profile cache so only the slow read touches the backend
+        await _timed(client, "/toggleRoot", "fast-user", json=body)
+
+        started = time.perf_counter()
+        slow_task = asyncio.create_task(_timed(client, "/toggleRoot", "slow-user", json=body))
+        await asyncio.sleep(0.01)
+        fast = await asyncio.gather(*[_timed(client, "/toggleRoot", "fast-user", json=body) for _ in range(requests)])
+        fast_done = time.perf_counter() - started
+        slow_latency = await slow_task
+
+    print(f"slow request latency:        {slow_latency * 1000:8.1f} ms")
+    print(f"unrelated requests finished: {fast_done * 1000:8.1f} ms after start ({requests} requests)")
+    print(f"unrelated p50 / max:         {statistics.median(fast) * 1000:8.1f} / {max(fast) * 1000:.1f} ms")
+    verdict = "PASS" if fast_done < slow_latency else "FAIL"
+    print(f"{verdict}: unrelated requests {'did not wait' if verdict == 'PASS' else 'waited'} for the slow backend call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slow", type=float, default=1.0, help="Seconds the slow backend call takes")
+    parser.add_argument("--requests", type=int, default=50, help="Concurrent unrelated requests")
+    args = parser.parse_args()
+    asyncio.run(main(args.slow, args.requests))
@@ -0,0 +1,520 @@
+"""
+In-memory stand-ins for the parts of the Firestore, Auth and Storage APIs the
+server uses, with configurable injected latency.
+
+Every backend operation sleeps for its configured latency (the real SDK is
+blocking too, so this exercises the same thread-pool path) and is counted in
+``FakeFirebase.calls`` so benchmarks can report backend round-trips per request.
+"""
+import io
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+
+
+class Latency:
+    """
+    Per-operation latency in seconds, with optional uniform jitter. ``document`` is
+    added to a query for every document it returns.
+    """
+
+    def __init__(
+        self,
+        read: float = 0.0,
+        write: float = 0.0,
+        storage: float = 0.0,
+        auth: float = 0.0,
+        jitter: float = 0.0,
+        document: float = 0.0
+    ):
+        self.read = read
+        self.write = write
+        self.storage = storage
+        self.auth = auth
+        self.jitter = jitter
+        self.document = document
+
+    def sleep(self, seconds: float) -> None:
+        if seconds or self.jitter:
+            time.sleep(max(0.0, seconds + random.uniform(-self.jitter, self.jitter)))
+
+
+def _apply_transforms(current: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(current)
+    for key, value in data.items():
+        if value is transforms.SERVER_TIMESTAMP:
+            result[key] = datetime.now(timezone.utc)
+        elif value is transforms.DELETE_FIELD:
+            result.pop(key, None)
+        elif isinstance(value, transforms.Increment):
+            result[key] = (result.get(key) or 0) + value.value
+        else:
+            result[key] = value
+    return result
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]], update_time: Optional[int] = None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self) -> FakeSnapshot:
+        self._db._op("get", self._db.latency.read)
+        return self._db._snapshot(self.path)
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._db._op("set", self._db.latency.write)
+        self._db._write(self.path, data, merge)
+
+    def create(self, data: Dict[str, Any]) -> None:
+        self._db._op("create", self._db.latency.write)
+        with self._db._lock:
+            if self.path in self._db._docs:
+                raise AlreadyExists(f"Document already exists: {self.path}")
+            self._db._write_locked(self.path, data, merge=False)
+
+    def update(self, data: Dict[str, Any], option: Optional[Dict[str, Any]] = None) -> None:
+        self._db._op("update", self._db.latency.write)
+        with self._db._lock:
+            if self.path not in self._db._docs:
+                raise NotFound(f"No document to update: {self.path}")
+            expected = (option or {}).get("last_update_time")
+            if expected is not None and self._db._update_times.get(self.path) != expected:
+                raise FailedPrecondition(f"Document was updated since {expected}: {self.path}")
+            self._db._write_locked(self.path, data, merge=True)
+
+    def delete(self, option: Optional[Dict[str, Any]] = None) -> None:
+        self._db._op("delete", self._db.latency.write)
+        with self._db._lock:
+            expected = (option or {}).get("last_update_time")
+            if expected is not None and self._db._update_times.get(self.path) != expected:
+                raise FailedPrecondition(f"Document was updated since {expected}: {self.path}")
+            self._db._docs.pop(self.path, None)
+            self._db._update_times.pop(self.path, None)
+
+
+class FakeQuery:
+    _OPERATORS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        "in": lambda a, b: a in b,
+    }
+
+    def __init__(self, collection: "FakeCollectionReference", orders=(), filters=(), cursor=None, limit_to=None, fields=None):
+        self._collection = collection
+        self._orders = list(orders)
+        self._filters = list(filters)
+        self._cursor = cursor
+        self._limit = limit_to
+        self._fields = fields
+
+    def _copy(self, **changes) -> "FakeQuery":
+        state = {
+            "orders": self._orders, "filters": self._filters, "cursor": self._cursor,
+            "limit_to": self._limit, "fields": self._fields,
+        }
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=self._orders + [(field, direction)])
+
+    def where(self, field: str = None, op: str = None, value: Any = None, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field, op, value)])
+
+    def start_after(self, values: Dict[str, Any]) -> "FakeQuery":
+        return self._copy(cursor=values)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit_to=count)
+
+    def select(self, fields: List[str]) -> "FakeQuery":
+        return self._copy(fields=list(fields))
+
+    def _value(self, path: str, data: Dict[str, Any], field: str) -> Any:
+        if field == "__name__":
+            return self._collection._name(path)
+        return data.get(field)
+
+    def stream(self):
+        db = self._collection._db
+        db._op("query", db.latency.read)
+        rows = self._collection._rows()
+        for field, op, value in self._filters:
+            rows = [(path, data) for path, data in rows if self._OPERATORS[op](data.get(field), value)]
+        for field, direction in reversed(self._orders):
+            rows.sort(key=lambda row: _sort_key(self._value(row[0], row[1], field)), reverse=direction == "DESCENDING")
+        if self._cursor:
+            fields = [field for field, _ in self._orders][:len(self._cursor)]
+            descending = [direction == "DESCENDING" for _, direction in self._orders][:len(fields)]
+            cursor = tuple(_sort_key(self._cursor[field]) for field in fields)
+
+            def after(row):
+                for field, desc, bound in zip(fields, descending, cursor):
+                    value = _sort_key(self._value(row[0], row[1], field))
+                    if value != bound:
+                        return value < bound if desc else value > bound
+                return False
+
+            rows = [row for row in rows if after(row)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if db.latency.document:
+            time.sleep(db.latency.document * len(rows))
+        for path, data in rows:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeSnapshot(FakeDocumentReference(db, path), data, db._update_times.get(path))
+
+    def get(self) -> List[FakeSnapshot]:
+        return list(self.stream())
+
+
+def _sort_key(value: Any):
+    # Firestore orders values of different types by type first
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value.timestamp())
+    return (4, str(value))
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+        super().__init__(self)
+
+    @property
+    def parent(self) -> Optional[FakeDocumentReference]:
+        return FakeDocumentReference(self._db, self.path.rsplit("/", 1)[0]) if "/" in self.path else None
+
+    def _rows(self):
+        return self._db._children(self.path)
+
+    @staticmethod
+    def _name(path: str) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, f"{self.path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data: Dict[str, Any]):
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+
+class FakeCollectionGroup(FakeQuery):
+    """Every collection named ``collection_id``, wherever it is nested."""
+
+    def __init__(self, db: "FakeFirestore", collection_id: str):
+        self._db = db
+        self.id = collection_id
+        super().__init__(self)
+
+    def _rows(self):
+        with self._db._lock:
+            return [
+                (path, dict(data))
+                for path, data in self._db._docs.items()
+                if path.count("/") % 2 == 1 and path.rsplit("/", 2)[-2] == self.id
+            ]
+
+    @staticmethod
+    def _name(path: str) -> str:
+        # Documents of a collection group are ordered by their full path
+        return path
+
+
+class FakeWriteBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference: FakeDocumentReference, data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(("set", reference.path, data, merge, None))
+
+    def create(self, reference: FakeDocumentReference, data: Dict[str, Any]) -> None:
+        self._writes.append(("create", reference.path, data, False, None))
+
+    def update(self, reference: FakeDocumentReference, data: Dict[str, Any], option: Optional[Dict[str, Any]] = None) -> None:
+        self._writes.append(("update", reference.path, data, True, option))
+
+    def delete(self, reference: FakeDocumentReference, option: Optional[Dict[str, Any]] = None) -> None:
+        self._writes.append(("delete", reference.path, None, False, option))
+
+    def commit(self) -> None:
+        if len(self._writes) > 500:
+            raise ValueError("Batched writes are limited to 500 operations")
+        self._db._op("commit", self._db.latency.write)
+        with self._db._lock:
+            # All or nothing: check every precondition before applying any write
+            for kind, path, _, _, option in self._writes:
+                if kind == "create" and path in self._db._docs:
+                    raise AlreadyExists(f"Document already exists: {path}")
+                if kind == "update" and path not in self._db._docs:
+                    raise NotFound(f"No document to update: {path}")
+                expected = (option or {}).get("last_update_time")
+                if expected is not None and self._db._update_times.get(path) != expected:
+                    raise FailedPrecondition(f"Document was updated since {expected}: {path}")
+            for kind, path, data, merge, _ in self._writes:
+                if kind == "delete":
+                    self._db._docs.pop(path, None)
+                    self._db._update_times.pop(path, None)
+                else:
+                    self._db._write_locked(path, data, merge)
+
+
+class FakeFirestore:
+    """Thread-safe in-memory document store with Firestore's client surface."""
+
+    def __init__(self, latency: Optional[Latency] = None, calls: Optional[Counter] = None):
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else Counter()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._update_times: Dict[str, int] = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def _op(self, name: str, latency: float) -> None:
+        self.calls[f"firestore.{name}"] += 1
+        self.latency.sleep(latency)
+
+    def _snapshot(self, path: str) -> FakeSnapshot:
+        with self._lock:
+            data = self._docs.get(path)
+            return FakeSnapshot(
+                FakeDocumentReference(self, path),
+                None if data is None else dict(data),
+                self._update_times.get(path)
+            )
+
+    def _write(self, path: str, data: Dict[str, Any], merge: bool) -> None:
+        with self._lock:
+            self._write_locked(path, data, merge)
+
+    def _write_locked(self, path: str, data: Dict[str, Any], merge: bool) -> None:
+        current = self._docs.get(path, {}) if merge else {}
+        self._docs[path] = _apply_transforms(current, data)
+        self._clock += 1
+        self._update_times[path] = self._clock
+
+    def _delete(self, path: str) -> None:
+        with self._lock:
+            self._docs.pop(path, None)
+            self._update_times.pop(path, None)
+
+    def _children(self, collection_path: str):
+        prefix = collection_path + "/"
+        with self._lock:
+            return [
+                (path, dict(data))
+                for path, data in self._docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, path)
+
+    def collection_group(self, collection_id: str) -> FakeCollectionGroup:
+        return FakeCollectionGroup(self, collection_id)
+
+    def write_option(self, **kwargs: Any) -> Dict[str, Any]:
+        return kwargs
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, references: List[FakeDocumentReference]):
+        self._op("get_all", self.latency.read)
+        return [self._snapshot(reference.path) for reference in references]
+
+
+class FakeBlobWriter:
+    def __init__(self, blob: "FakeBlob", content_type: Optional[str], predefined_acl: Optional[str]):
+        self._blob = blob
+        self._content_type = content_type
+        self._public = predefined_acl == "publicRead"
+        self._buffer = io.BytesIO()
+
+    def write(self, chunk: bytes) -> int:
+        self._blob._bucket._op("upload_chunk")
+        return self._buffer.write(chunk)
+
+    def close(self) -> None:
+        if self._buffer.closed:
+            return
+        self._blob._bucket._op("finalize")
+        self._blob._store(self._buffer.getvalue(), self._content_type, self._public)
+        self._buffer.close()
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self._bucket = bucket
+        self.name = name
+        self.metadata: Optional[Dict[str, str]] = None
+        self.content_type: Optional[str] = None
+
+    @property
+    def public_url(self) -> str:
+        return f"https://storage.fake/{self._bucket.name}/{self.name}"
+
+    def open(self, mode: str = "rb", chunk_size: Optional[int] = None, content_type: Optional[str] = None, predefined_acl: Optional[str] = None, **kwargs):
+        if mode != "wb":
+            raise ValueError("Only 'wb' is supported by the fake bucket")
+        return FakeBlobWriter(self, content_type, predefined_acl)
+
+    def _store(self, data: bytes, content_type: Optional[str], public: bool) -> None:
+        with self._bucket._lock:
+            self._bucket.objects[self.name] = {
+                "data": data,
+                "content_type": content_type,
+                "metadata": dict(self.metadata or {}),
+                "public": public,
+            }
+
+    def upload_from_string(self, data, content_type: Optional[str] = None, predefined_acl: Optional[str] = None) -> None:
+        self._bucket._op("upload")
+        self._store(data.encode("utf-8") if isinstance(data, str) else bytes(data), content_type, predefined_acl == "publicRead")
+
+    def download_as_bytes(self) -> bytes:
+        self._bucket._op("download")
+        with self._bucket._lock:
+            return self._bucket.objects[self.name]["data"]
+
+    def patch(self) -> None:
+        self._bucket._op("patch")
+        with self._bucket._lock:
+            stored = self._bucket.objects.get(self.name)
+            if stored is not None:
+                stored["metadata"].update(self.metadata or {})
+
+    def make_public(self) -> None:
+        self._bucket._op("make_public")
+        with self._bucket._lock:
+            self._bucket.objects[self.name]["public"] = True
+
+    def exists(self) -> bool:
+        self._bucket._op("exists")
+        with self._bucket._lock:
+            return self.name in self._bucket.objects
+
+    def delete(self) -> None:
+        self._bucket._op("delete")
+        with self._bucket._lock:
+            self._bucket.objects.pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(self, name: str = "fake-bucket", latency: Optional[Latency] = None, calls: Optional[Counter] = None):
+        self.name = name
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else Counter()
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _op(self, name: str) -> None:
+        self.calls[f"storage.{name}"] += 1
+        self.latency.sleep(self.latency.storage)
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        self._op("get_blob")
+        with self._lock:
+            stored = self.objects.get(name)
+            if stored is None:
+                return None
+            blob = FakeBlob(self, name)
+            blob.metadata = dict(stored["metadata"])
+            blob.content_type = stored["content_type"]
+        return blob
+
+
+class FakeAuth:
+    """
+    Stand-in for ``firebase_admin.auth``. Tokens have the form ``<uid>`` or
+    ``<uid>:<session>`` (distinct tokens for the same user); ``expired`` and
+    ``invalid`` are rejected.
+    """
+
+    class InvalidIdTokenError(ValueError):
+        pass
+
+    class ExpiredIdTokenError(InvalidIdTokenError):
+        pass
+
+    def __init__(self, latency: Optional[Latency] = None, calls: Optional[Counter] = None):
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else Counter()
+
+    def verify_id_token(self, token: str, check_revoked: bool = False) -> Dict[str, Any]:
+        self.calls["auth.verify_id_token"] += 1
+        self.latency.sleep(self.latency.auth)
+        if token == "expired":
+            raise self.ExpiredIdTokenError("Token expired")
+        if not token or token == "invalid":
+            raise self.InvalidIdTokenError("Invalid token")
+        uid = token.split(":", 1)[0]
+        return {"uid": uid, "email": f"{uid}@example.com", "email_verified": True, "exp": int(time.time()) + 3600}
+
+
+class FakeFirebase:
+    """Bundle of fake Firestore, Storage and Auth sharing one latency profile and call counter."""
+
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.calls: Counter = Counter()
+        self.db = FakeFirestore(self.latency, self.calls)
+        self.bucket = FakeBucket(latency=self.latency, calls=self.calls)
+        self.auth = FakeAuth(self.latency, self.calls)
+
+    def add_user(self, uid: str, is_admin: bool = False, **profile: Any) -> None:
+        self.db._write(f"users/{uid}", {"is_admin": is_admin, **profile}, merge=False)
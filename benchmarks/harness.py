@@ -0,0 +1,130 @@
+"""
+Shared helpers for driving the FastAPI app in-process against the fake backend.
+"""
+import asyncio
+import logging
+import resource
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .fake_firebase import FakeFirebase, Latency
+
+
+def load_app(fake: FakeFirebase, log_level: int = logging.WARNING, admission: bool = False):
+    """
+    Import the server app and point its auth and repositories at ``fake``.
+
+    Admission control is off unless ``admission`` is set: load generators drive
+    far more requests per user than the per-user rate limits allow.
+    """
+    import server.app as app_module
+    from server.repositories.firestore import create_firestore_repositories
+
+    app_module.auth = fake.auth
+    app_module.repos = create_firestore_repositories(fake.db, fake.bucket)
+    app_module.admission.enabled = admission
+    logging.getLogger().setLevel(log_level)
+    for name in ("server", "httpx"):
+        logging.getLogger(name).setLevel(log_level)
+    return app_module
+
+
+def client_for(app, **kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60, **kwargs)
+
+
+def auth_headers(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(
+    send: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """
+    Issue ``requests`` calls of ``send(i)`` with at most ``concurrency`` in flight.
+
+    Returns throughput, latency percentiles (ms), error count and peak RSS.
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await send(i)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def latency_from_args(args) -> Latency:
+    return Latency(
+        read=args.read_latency / 1000,
+        write=args.write_latency / 1000,
+        storage=args.storage_latency / 1000,
+        auth=args.auth_latency / 1000,
+        jitter=args.jitter / 1000
+    )
+
+
+def add_latency_args(parser) -> None:
+    parser.add_argument("--read-latency", type=float, default=5.0, help="Injected Firestore read latency (ms)")
+    parser.add_argument("--write-latency", type=float, default=10.0, help="Injected Firestore write latency (ms)")
+    parser.add_argument("--storage-latency", type=float, default=20.0, help="Injected Storage latency per call (ms)")
+    parser.add_argument("--auth-latency", type=float, default=2.0, help="Injected token verification latency (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform latency jitter (ms)")
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str], stream=None) -> None:
+    stream = stream or sys.stdout
+    widths = {column: max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns), file=stream)
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(widths[column]) for column in columns), file=stream)
+
+
+def format_delta(current: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return "n/a"
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
@@ -0,0 +1,149 @@
+"""
+Logging overhead benchmark: request latency with logging off, written inline, and queued.
+
+Drives the endpoint scenarios from ``benchmarks.endpoints`` at INFO level with
+each logging setup and reports throughput, latency percentiles, records
+written and the time a single ``logger.info`` call costs the caller:
+
+- **off**: WARNING level, no routine records (the floor)
+- **inline**: file handler on the root logger, formatting and writing on the
+  event loop thread (how the server logged before the pipeline)
+- **queue**: ``server.logpipeline``; the caller enqueues, a thread writes
+- **queue+sampling**: the pipeline keeping ``--sample-rate`` of routine records
+
+``--sink-latency`` adds a delay to every write to stand in for a slow disk or a
+blocked stdout pipe, which is where inline logging hurts tail latency most.
+
+Usage (from the repository root):
+    python -m benchmarks.logging_overhead
+    python -m benchmarks.logging_overhead --sink-latency 0.5 --endpoints sendMessage
+"""
+import argparse
+import asyncio
+import logging
+import logging.handlers
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .endpoints import ENDPOINTS, _scenarios, _seed_tasks
+from .fake_firebase import FakeFirebase
+from .harness import add_latency_args, client_for, latency_from_args, load_app, print_table, run_load
+
+MODES = ["off", "inline", "queue", "queue+sampling"]
+
+
+class CountingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file output that counts records and can simulate a slow device."""
+
+    def __init__(self, filename: Path, sink_latency: float):
+        super().__init__(filename, maxBytes=10 * 1024 * 1024, backupCount=1, encoding="utf8")
+        self.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+        self.sink_latency = sink_latency
+        self.written = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.sink_latency:
+            time.sleep(self.sink_latency)
+        super().emit(record)
+        self.written += 1
+
+
+def configure(mode: str, handler: logging.Handler, sample_rate: float) -> None:
+    from server.logpipeline import log_pipeline
+
+    root = logging.getLogger()
+    log_pipeline.stop()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    level = logging.WARNING if mode == "off" else logging.INFO
+    if mode in ("off", "inline"):
+        root.addHandler(handler)
+        root.setLevel(level)
+    else:
+        sampling = {"server": sample_rate} if mode == "queue+sampling" else {}
+        log_pipeline.start(handlers=[handler], sampling=sampling, level="INFO")
+    logging.getLogger("server").setLevel(level)
+
+
+def call_cost_us(calls: int) -> float:
+    """Mean time one ``logger.info`` call takes on the calling thread (µs)."""
+    logger = logging.getLogger("server.app")
+    started = time.perf_counter()
+    for i in range(calls):
+        logger.info("Message sent by user %s with ID: %s", "bench-user", i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    from server.logpipeline import log_pipeline
+
+    fake = FakeFirebase(latency_from_args(args))
+    for i in range(args.users):
+        fake.add_user(f"bench-user-{i}")
+        _seed_tasks(fake, f"bench-user-{i}", args.seed_tasks)
+    app_module = load_app(fake)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        async with client_for(app_module.app) as client:
+            scenarios = _scenarios(client, args)
+            for mode in args.modes:
+                handler = CountingFileHandler(Path(directory) / f"{mode}.log", args.sink_latency / 1000)
+                configure(mode, handler, args.sample_rate)
+                for name in args.endpoints:
+                    send = scenarios[name]
+                    await run_load(send, min(args.concurrency, args.requests), args.concurrency)
+                    written = handler.written
+                    result = await run_load(send, args.requests, args.concurrency)
+                    if mode.startswith("queue"):
+                        # Let the writer catch up so the count covers this run
+                        while log_pipeline.stats()["queued"]:
+                            await asyncio.sleep(0.01)
+                    rows.append({
+                        "mode": mode,
+                        "endpoint": name,
+                        **result,
+                        "records_per_request": round((handler.written - written) / args.requests, 2),
+                    })
+                dropped = log_pipeline.stats()["dropped"] if mode.startswith("queue") else ""
+                cost = await asyncio.to_thread(call_cost_us, args.calls)
+                for row in rows:
+                    if row["mode"] == mode:
+                        row["info_call_us"] = round(cost, 2)
+                        row["dropped"] = dropped
+                log_pipeline.stop()
+                logging.getLogger().removeHandler(handler)
+                handler.close()
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure request latency with inline, queued and sampled logging")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=["sendMessage", "syncTasks", "getAIQuestions"])
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests in flight")
+    parser.add_argument("--users", type=int, default=20, help="Distinct authenticated users")
+    parser.add_argument("--seed-tasks", type=int, default=200, help="Tasks stored per user before syncing")
+    parser.add_argument("--client-tasks", type=int, default=5, help="Tasks sent by the client per sync")
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of each uploaded file (KiB)")
+    parser.add_argument("--upload-repeat", type=float, default=0.0, help="Fraction of uploads that re-import identical bytes")
+    parser.add_argument("--sink-latency", type=float, default=0.0, help="Delay added to every log write (ms)")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="Routine records kept in queue+sampling mode")
+    parser.add_argument("--calls", type=int, default=5000, help="logger.info calls timed per mode")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(rows, [
+        "mode", "endpoint", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "errors",
+        "records_per_request", "info_call_us", "dropped"
+    ])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
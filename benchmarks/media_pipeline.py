@@ -0,0 +1,137 @@
+"""
+Media pipeline benchmark: request latency while uploaded images are resized.
+
+Imports ``--uploads`` photos of ``--megapixels`` and measures the latency of
+``/getAIQuestions`` requests sent alongside, one every ``--probe-interval`` ms
+per probe, in three modes:
+
+- **idle**: no uploads, the floor
+- **inline**: each photo's variants are derived on the event loop, as a
+  handler calling ``media.derive`` directly would
+- **pool**: photos go through ``/importFile`` and the media pipeline's worker
+  processes (``MEDIA_PROCESSES``)
+
+Needs Pillow.
+
+Usage (from the repository root):
+    python -m benchmarks.media_pipeline
+    python -m benchmarks.media_pipeline --uploads 40 --megapixels 24
+"""
+import argparse
+import asyncio
+import io
+import sys
+import time
+from typing import Any, Dict, List
+
+from .fake_firebase import FakeFirebase
+from .harness import (
+    add_latency_args, auth_headers, client_for, latency_from_args, load_app, percentile, print_table
+)
+
+MODES = ["idle", "inline", "pool"]
+
+
+def _photo(megapixels: float) -> bytes:
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    image = Image.effect_noise((width, width * 3 // 4), 40).convert("RGB")
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+async def _probe(client, done: asyncio.Event, concurrency: int, interval: float) -> List[float]:
+    latencies: List[float] = []
+
+    async def worker():
+        while not done.is_set():
+            # Timed from when the request was due, so time the loop spent blocked counts
+            due = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            await client.get("/getAIQuestions", params={"limit": 5}, headers=auth_headers("bench-user"))
+            latencies.append(time.perf_counter() - due)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    from server import media
+    from server.mediapipeline import media_pipeline
+
+    fake = FakeFirebase(latency_from_args(args))
+    fake.add_user("bench-user")
+    app_module = load_app(fake)
+    photo = _photo(args.megapixels)
+
+    async def inline():
+        for _ in range(args.uploads):
+            media.derive(
+                photo,
+                "image/jpeg",
+                image_sizes=media_pipeline.image_sizes,
+                image_format=media_pipeline.image_format,
+                image_quality=media_pipeline.image_quality,
+                max_pixels=media_pipeline.max_pixels,
+                preview_chars=media_pipeline.preview_chars
+            )
+            await asyncio.sleep(0)
+
+    async def pool(client):
+        for i in range(args.uploads):
+            await client.post(
+                "/importFile",
+                # distinct bytes per upload, or the dedup index would skip the work
+                files={"file": (f"photo-{i}.jpg", photo + i.to_bytes(4, "big"), "image/jpeg")},
+                headers=auth_headers("bench-user")
+            )
+        await media_pipeline.queue.join()
+
+    rows = []
+    async with client_for(app_module.app) as client:
+        for mode in args.modes:
+            done = asyncio.Event()
+            probe = asyncio.create_task(_probe(client, done, args.concurrency, args.probe_interval / 1000))
+            started = time.perf_counter()
+            if mode == "inline":
+                await inline()
+            elif mode == "pool":
+                await pool(client)
+            else:
+                await asyncio.sleep(args.idle_seconds)
+            elapsed = time.perf_counter() - started
+            done.set()
+            latencies = sorted(await probe)
+            rows.append({
+                "mode": mode,
+                "uploads": 0 if mode == "idle" else args.uploads,
+                "seconds": round(elapsed, 2),
+                "requests": len(latencies),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            })
+    await media_pipeline.stop()
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure request latency while uploaded images are resized")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--uploads", type=int, default=10, help="Photos imported per mode")
+    parser.add_argument("--megapixels", type=float, default=12, help="Size of each photo")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent latency probes in flight")
+    parser.add_argument("--probe-interval", type=float, default=5, help="Pause between a probe's requests (ms)")
+    parser.add_argument("--idle-seconds", type=float, default=2.0, help="Duration of the idle mode")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(rows, ["mode", "uploads", "seconds", "requests", "p50_ms", "p99_ms", "max_ms"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
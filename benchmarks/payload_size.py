@@ -0,0 +1,136 @@
+"""
+Sync payload benchmark: bytes on the wire and encode time per response encoding.
+
+Builds a /syncTasks page of ``--tasks`` varied tasks and encodes it the ways a
+client can negotiate: JSON or MessagePack (``Accept``), row or columnar layout,
+each sent as is, gzip-compressed or brotli-compressed (``Accept-Encoding``).
+Reported per combination: body size, size relative to plain JSON, the server's
+encode time (serialization plus compression) and, as a stand-in for client
+parse time, the time to decompress and decode it again in Python.
+
+Brotli rows are skipped when the brotli package is not installed, MessagePack
+rows when msgpack is not.
+
+Usage (from the repository root):
+    python -m benchmarks.payload_size
+    python -m benchmarks.payload_size --tasks 200 1000 5000 --repeat 50
+"""
+import argparse
+import gzip
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+import orjson
+
+from .harness import print_table
+
+WORDS = (
+    "buy milk call mom review pull request draft report book flights pay rent water plants "
+    "schedule dentist renew passport prepare slides reply to email clean garage update resume "
+    "plan trip groceries fix bike finish chapter order gift cancel subscription backup photos"
+).split()
+
+
+def _sync_page(count: int, seed: int = 7) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    now = int(time.time() * 1000)
+
+    def words(low: int, high: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+    return {
+        "synced_tasks": [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "title": words(2, 6),
+                "description": words(5, 25) if rng.random() < 0.6 else None,
+                "is_completed": rng.random() < 0.4,
+                "created_at": now - rng.randint(0, 90 * 24 * 3600 * 1000),
+                "updated_at": now - rng.randint(0, 7 * 24 * 3600 * 1000),
+                "is_deleted": rng.random() < 0.05,
+            }
+            for _ in range(count)
+        ],
+        "next_cursor": "WzE3MDAwMDAwMDAwMDAsInRhc2stOTk5Il0",
+        "has_more": True,
+        "server_time": now,
+    }
+
+
+def _median(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def run(args) -> List[Dict[str, Any]]:
+    import server.app as app_module
+    from server import compression as compression_module
+    from server import responses
+    from server.compression import ResponseCompression
+    from server.responses import Encoding, model_response
+
+    compression = ResponseCompression(
+        ["br", "gzip"], minimum_size=0, gzip_level=args.gzip_level, brotli_quality=args.brotli_quality
+    )
+    brotli = compression_module.brotli
+    msgpack = responses.msgpack
+
+    encodings = [("json", Encoding(responses.JSON_MEDIA_TYPE)), ("json/columnar", Encoding(responses.JSON_MEDIA_TYPE, True))]
+    if msgpack is not None:
+        encodings += [
+            ("msgpack", Encoding(responses.MSGPACK_MEDIA_TYPE)),
+            ("msgpack/columnar", Encoding(responses.MSGPACK_MEDIA_TYPE, True)),
+        ]
+    codings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    decompress = {"identity": lambda body: body, "gzip": gzip.decompress}
+    if brotli is not None:
+        decompress["br"] = brotli.decompress
+
+    rows = []
+    for tasks in args.tasks:
+        page = _sync_page(tasks)
+        model = app_module.SyncResponse(status="success", **page)
+        baseline = None
+        for name, encoding in encodings:
+            load = msgpack.unpackb if encoding.media_type == responses.MSGPACK_MEDIA_TYPE else orjson.loads
+            for coding in codings:
+                def encode():
+                    body = model_response(model, encoding=encoding, columnar_fields=["synced_tasks"]).body
+                    return body if coding == "identity" else compression.compress(body, coding)
+
+                body = encode()
+                baseline = baseline or len(body)
+                rows.append({
+                    "tasks": tasks,
+                    "encoding": name,
+                    "compression": coding,
+                    "bytes": len(body),
+                    "vs_json": f"{len(body) / baseline:.3f}",
+                    "encode_us": round(_median(encode, args.repeat) * 1e6, 1),
+                    "decode_us": round(_median(lambda: load(decompress[coding](body)), args.repeat) * 1e6, 1),
+                })
+    if brotli is None:
+        print("brotli is not installed; br rows skipped")
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare sync payload size and encode time per encoding")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[100, 1000], help="Tasks in the /syncTasks page")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed calls per case")
+    parser.add_argument("--gzip-level", type=int, default=4)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    args = parser.parse_args()
+    print_table(run(args), ["tasks", "encoding", "compression", "bytes", "vs_json", "encode_us", "decode_us"])
+
+
+if __name__ == "__main__":
+    main()
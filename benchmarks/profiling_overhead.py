@@ -0,0 +1,90 @@
+"""
+Diagnostics overhead benchmark: request latency with request tracing off, on, and while profiling.
+
+Drives the endpoint scenarios from ``benchmarks.endpoints`` in each mode and
+reports throughput and latency percentiles:
+
+- **off**: no per-request trace (``SLOW_REQUEST_LOG_SIZE=0``, the floor)
+- **traced**: phase timings for the slow-request log (the default)
+- **profiled**: traced, while a route-limited sampling profile of the endpoint
+  runs at ``--interval`` ms (``--all-threads`` to sample every thread)
+
+Usage (from the repository root):
+    python -m benchmarks.profiling_overhead
+    python -m benchmarks.profiling_overhead --interval 1 --all-threads --endpoints syncTasks
+"""
+import argparse
+import asyncio
+import sys
+from typing import Any, Dict, List
+
+from .endpoints import ENDPOINTS, _scenarios, _seed_tasks
+from .fake_firebase import FakeFirebase
+from .harness import add_latency_args, client_for, latency_from_args, load_app, print_table, run_load
+
+MODES = ["off", "traced", "profiled"]
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    from server.profiling import profiler, slow_requests
+
+    fake = FakeFirebase(latency_from_args(args))
+    for i in range(args.users):
+        fake.add_user(f"bench-user-{i}")
+        _seed_tasks(fake, f"bench-user-{i}", args.seed_tasks)
+    app_module = load_app(fake)
+    size = slow_requests.size
+
+    rows = []
+    async with client_for(app_module.app) as client:
+        scenarios = _scenarios(client, args)
+        for mode in args.modes:
+            slow_requests.size = 0 if mode == "off" else size
+            for name in args.endpoints:
+                send = scenarios[name]
+                await run_load(send, min(args.concurrency, args.requests), args.concurrency)
+                profile = None
+                if mode == "profiled":
+                    profile = asyncio.create_task(profiler.profile(
+                        profiler.max_seconds,
+                        route=f"/{name}",
+                        requests=args.requests,
+                        interval=args.interval / 1000,
+                        all_threads=args.all_threads
+                    ))
+                    await asyncio.sleep(0)
+                result = await run_load(send, args.requests, args.concurrency)
+                rows.append({
+                    "mode": mode,
+                    "endpoint": name,
+                    **result,
+                    "samples": (await profile)["samples"] if profile is not None else "",
+                })
+    slow_requests.size = size
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure request latency with tracing and the sampling profiler")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=["sendMessage", "syncTasks", "getAIQuestions"])
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests in flight")
+    parser.add_argument("--users", type=int, default=20, help="Distinct authenticated users")
+    parser.add_argument("--seed-tasks", type=int, default=200, help="Tasks stored per user before syncing")
+    # No client tasks by default: stored tasks would grow from mode to mode and skew the later ones
+    parser.add_argument("--client-tasks", type=int, default=0, help="Tasks sent by the client per sync")
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of each uploaded file (KiB)")
+    parser.add_argument("--upload-repeat", type=float, default=0.0, help="Fraction of uploads that re-import identical bytes")
+    parser.add_argument("--interval", type=float, default=10, help="Profiler sampling interval (ms)")
+    parser.add_argument("--all-threads", action="store_true", help="Profile every thread, not just the event loop")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(rows, ["mode", "endpoint", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "errors", "samples"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Micro-benchmark: response encoding cost of the default FastAPI path vs. the fast path.
+
+For a /syncTasks page of ``--tasks`` tasks it times:
+
+- ``fastapi+json``: what FastAPI does when a handler returns a model with a
+  ``response_model`` (dump, re-validate and serialize via ``serialize_response``),
+  rendered by the stdlib-based ``JSONResponse``
+- ``fastapi+orjson``: the same round trip rendered by ``ORJSONResponse`` (the app's
+  default response class)
+- ``model_dump_json``: ``server.responses.model_response``, used by /syncTasks
+
+and, for the static root payloads, rebuilding + encoding the dict per call vs.
+``PrecomputedJSON``. Every path is checked to produce the same JSON document.
+
+Usage (from the repository root):
+    python -m benchmarks.serialization --tasks 1000 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from .harness import print_table
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    """Median seconds per call over ``repeat`` calls (after one warm-up call)."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def _sync_page(count: int) -> Dict[str, Any]:
+    now = int(time.time() * 1000)
+    return {
+        "synced_tasks": [
+            {
+                "id": f"task-{i}",
+                "title": f"Task number {i}",
+                "description": "Some longer description text for the task " * 2,
+                "is_completed": i % 3 == 0,
+                "created_at": now - i,
+                "updated_at": now,
+                "is_deleted": False,
+            }
+            for i in range(count)
+        ],
+        "next_cursor": "WzE3MDAwMDAwMDAwMDAsInRhc2stOTk5Il0",
+        "has_more": True,
+        "server_time": now,
+    }
+
+
+def run(args) -> List[Dict[str, Any]]:
+    import server.app as app_module
+    from server.responses import ORJSONResponse, model_response
+
+    route = next(route for route in app_module.app.routes if getattr(route, "path", None) == "/syncTasks")
+    page = _sync_page(args.tasks)
+    loop = asyncio.new_event_loop()
+
+    def fastapi_path(response_class):
+        def encode():
+            # Handlers build the model, FastAPI then serializes it against response_model
+            model = app_module.SyncResponse(status="success", **page)
+            content = loop.run_until_complete(
+                serialize_response(field=route.response_field, response_content=model, is_coroutine=True)
+            )
+            return response_class(content).body
+        return encode
+
+    def fast_path():
+        return model_response(app_module.SyncResponse(status="success", **page)).body
+
+    static = {
+        "message": "Welcome to the Genesis AI API",
+        "status": "running",
+        "version": "1.0.0",
+        "documentation": "/docs",
+    }
+
+    def static_dict():
+        return JSONResponse({**static, "timestamp": datetime.utcnow().isoformat()}).body
+
+    def static_precomputed():
+        return app_module.ROOT_PAYLOAD.response(timestamp=datetime.utcnow().isoformat()).body
+
+    def read_root_dict():
+        return JSONResponse(json.loads(app_module.READ_ROOT_PAYLOAD.body)).body
+
+    def read_root_precomputed():
+        return app_module.READ_ROOT_PAYLOAD.response().body
+
+    cases = [
+        ("syncTasks", "fastapi+json", fastapi_path(JSONResponse)),
+        ("syncTasks", "fastapi+orjson", fastapi_path(ORJSONResponse)),
+        ("syncTasks", "model_dump_json", fast_path),
+        ("root", "dict+json", static_dict),
+        ("root", "precomputed", static_precomputed),
+        ("read_root", "dict+json", read_root_dict),
+        ("read_root", "precomputed", read_root_precomputed),
+    ]
+
+    rows = []
+    baselines: Dict[str, float] = {}
+    reference: Dict[str, Any] = {}
+    for payload, path, encode in cases:
+        document = json.loads(encode())
+        document.pop("timestamp", None)
+        document.pop("server_time", None)
+        if payload in reference and document != reference[payload]:
+            raise SystemExit(f"{payload}: {path} produced a different document")
+        reference.setdefault(payload, document)
+
+        seconds = _time(encode, args.repeat)
+        baselines.setdefault(payload, seconds)
+        rows.append({
+            "payload": payload,
+            "path": path,
+            "bytes": len(encode()),
+            "median_us": round(seconds * 1e6, 1),
+            "speedup": f"{baselines[payload] / seconds:.2f}x",
+        })
+    loop.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare response encoding paths")
+    parser.add_argument("--tasks", type=int, default=1000, help="Tasks in the /syncTasks page")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per case")
+    args = parser.parse_args()
+    print_table(run(args), ["payload", "path", "bytes", "median_us", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Load test: how many idle /events streams one worker process can hold.
+
+Starts the app in a child process (one uvicorn worker, fake backend), opens
+``--connections`` Server-Sent Events streams in steps, and after each step reports:
+
+- server RSS and RSS per stream (from ``/proc/<pid>/status``)
+- server CPU used while the streams sit idle for ``--idle`` seconds (heartbeats only)
+- fan-out latency: time from a /sendMessage call until every stream of that user
+  has received the ``message.created`` event, for ``--samples`` users
+
+Each simulated user holds ``--per-user`` streams, as if signed in on several devices.
+Linux only (reads ``/proc``).
+
+Usage (from the repository root):
+    python -m benchmarks.sse_connections --connections 5000 --steps 5 --heartbeat 15
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from .harness import auth_headers, percentile, print_table
+
+
+def _serve(args) -> None:
+    import uvicorn
+
+    from .fake_firebase import FakeFirebase
+    from .harness import load_app
+
+    _raise_nofile()
+    app_module = load_app(FakeFirebase())
+    app_module.config.SSE_HEARTBEAT = args.heartbeat
+    app_module.hub.max_connections = args.connections + args.samples
+    app_module.hub.max_connections_per_user = args.per_user + 1
+    server = uvicorn.Server(uvicorn.Config(
+        app_module.app, host="127.0.0.1", port=args.port, log_level="warning",
+        lifespan="off", backlog=4096, timeout_graceful_shutdown=1
+    ))
+    server.run()
+
+
+def _raise_nofile() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Stream:
+    """One raw HTTP/1.1 connection reading an event stream."""
+
+    def __init__(self, uid: str):
+        self.uid = uid
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Task = None
+
+    async def open(self, port: int) -> None:
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(
+            f"GET /events HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {self.uid}\r\n"
+            f"Accept: text/event-stream\r\n\r\n".encode()
+        )
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if b" 200 " not in status_line:
+            raise RuntimeError(f"/events for {self.uid} failed: {status_line!r}")
+        while await self.reader.readline() not in (b"\r\n", b""):
+            pass
+        self.task = asyncio.create_task(self._read())
+        await self.wait_for("ready")
+
+    async def _read(self) -> None:
+        # The body is chunked; event names are all this test needs from it
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            if line.startswith(b"event: "):
+                self.events.put_nowait(line[7:].strip().decode())
+
+    async def wait_for(self, event: str, timeout: float = 30) -> float:
+        async with asyncio.timeout(timeout):
+            while await self.events.get() != event:
+                pass
+        return time.perf_counter()
+
+    def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        self.writer.close()
+
+
+async def _open_streams(port: int, users: List[str], per_user: int, concurrency: int) -> List[Stream]:
+    semaphore = asyncio.Semaphore(concurrency)
+    streams = [Stream(uid) for uid in users for _ in range(per_user)]
+
+    async def open_one(stream: Stream):
+        async with semaphore:
+            await stream.open(port)
+
+    await asyncio.gather(*(open_one(stream) for stream in streams))
+    return streams
+
+
+async def _fan_out(port: int, streams: List[Stream], samples: int) -> List[float]:
+    by_user: Dict[str, List[Stream]] = {}
+    for stream in streams:
+        by_user.setdefault(stream.uid, []).append(stream)
+    users = list(by_user)[::max(1, len(by_user) // samples)][:samples]
+    latencies = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        for uid in users:
+            started = time.perf_counter()
+            response = await client.post("/sendMessage", json={"message": "ping", "userId": uid}, headers=auth_headers(uid))
+            response.raise_for_status()
+            arrivals = await asyncio.gather(*(stream.wait_for("message.created") for stream in by_user[uid]))
+            latencies.append(max(arrivals) - started)
+    latencies.sort()
+    return latencies
+
+
+async def _wait_until_up(port: int, process: subprocess.Popen) -> None:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(200):
+            if process.poll() is not None:
+                raise SystemExit("Server process exited during startup")
+            try:
+                await client.get("/health")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise SystemExit("Server did not start")
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    _raise_nofile()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.sse_connections", "--serve",
+        "--port", str(args.port), "--connections", str(args.connections),
+        "--per-user", str(args.per_user), "--samples", str(args.samples),
+        "--heartbeat", str(args.heartbeat),
+    ])
+    streams: List[Stream] = []
+    rows = []
+    try:
+        await _wait_until_up(args.port, process)
+        baseline_rss = _rss_mb(process.pid)
+        rows.append({"streams": 0, "rss_mb": round(baseline_rss, 1)})
+
+        step = max(args.per_user, args.connections // args.steps // args.per_user * args.per_user)
+        user = 0
+        while len(streams) < args.connections:
+            count = min(step, args.connections - len(streams)) // args.per_user or 1
+            users = [f"sse-user-{user + i}" for i in range(count)]
+            user += count
+            started = time.perf_counter()
+            streams += await _open_streams(args.port, users, args.per_user, args.open_concurrency)
+            open_seconds = time.perf_counter() - started
+
+            cpu_before = _cpu_seconds(process.pid)
+            await asyncio.sleep(args.idle)
+            idle_cpu = (_cpu_seconds(process.pid) - cpu_before) / args.idle
+
+            rss = _rss_mb(process.pid)
+            fan_out = await _fan_out(args.port, streams, args.samples)
+            rows.append({
+                "streams": len(streams),
+                "open_s": round(open_seconds, 2),
+                "rss_mb": round(rss, 1),
+                "kb_per_stream": round((rss - baseline_rss) * 1024 / len(streams), 1),
+                "idle_cpu_pct": round(idle_cpu * 100, 1),
+                "fanout_p50_ms": round(percentile(fan_out, 0.50) * 1000, 2),
+                "fanout_max_ms": round(fan_out[-1] * 1000, 2) if fan_out else 0.0,
+            })
+    finally:
+        for stream in streams:
+            stream.close()
+        process.terminate()
+        process.wait(timeout=30)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure idle /events streams held by one worker")
+    parser.add_argument("--connections", type=int, default=5000, help="Streams to open in total")
+    parser.add_argument("--steps", type=int, default=5, help="Measure after each of this many equal steps")
+    parser.add_argument("--per-user", type=int, default=2, help="Streams per simulated user")
+    parser.add_argument("--samples", type=int, default=20, help="Users whose fan-out latency is measured per step")
+    parser.add_argument("--idle", type=float, default=5.0, help="Seconds to measure idle CPU after each step")
+    parser.add_argument("--heartbeat", type=float, default=15.0, help="Server heartbeat interval (seconds)")
+    parser.add_argument("--open-concurrency", type=int, default=200, help="Connections opened at once")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args)
+        return
+    rows = asyncio.run(run(args))
+    print_table(rows, ["streams", "open_s", "rss_mb", "kb_per_stream", "idle_cpu_pct", "fanout_p50_ms", "fanout_max_ms"])
+
+
+if __name__ == "__main__":
+    main()
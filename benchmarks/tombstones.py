@@ -0,0 +1,127 @@
+"""
+Tombstone benchmark: sync latency as deleted tasks pile up, before and after compaction.
+
+For each ``--tombstones`` count, a user gets that many deleted tasks older than
+the compaction horizon next to ``--live-tasks`` live ones. Full resyncs (paging
+/syncTasks from no cursor to the end) and incremental syncs (from a recent
+cursor) are timed, one compaction pass is run, and both are timed again. The
+injected read latency grows with the number of documents a query returns
+(``--document-latency``), as Firestore reads are billed and transferred per
+document.
+
+Usage (from the repository root):
+    python -m benchmarks.tombstones
+    python -m benchmarks.tombstones --tombstones 0 10000 50000 --page-size 500
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+from .fake_firebase import FakeFirebase
+from .harness import add_latency_args, auth_headers, client_for, latency_from_args, load_app, print_table
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def _seed(fake: FakeFirebase, uid: str, live: int, tombstones: int) -> None:
+    now = int(time.time() * 1000)
+    stamp = now - 60 * DAY_MS
+    for i in range(tombstones):
+        stamp += 1
+        fake.db._write(f"users/{uid}/tasks/deleted-{i}", {
+            "id": f"deleted-{i}", "title": f"Deleted task {i}", "is_completed": False,
+            "created_at": stamp, "updated_at": stamp, "is_deleted": True, "updatedAt": stamp,
+        }, merge=False)
+    for i in range(live):
+        stamp = now - live + i
+        fake.db._write(f"users/{uid}/tasks/live-{i}", {
+            "id": f"live-{i}", "title": f"Live task {i}", "is_completed": False,
+            "created_at": stamp, "updated_at": stamp, "is_deleted": False, "updatedAt": stamp,
+        }, merge=False)
+
+
+async def _time_syncs(client, uid: str, page_size: int, repeat: int) -> Dict[str, Any]:
+    full, incremental = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor, pages, documents = None, 0, 0
+        while True:
+            response = await client.post(
+                "/syncTasks",
+                json={"user_id": uid, "cursor": cursor, "page_size": page_size, "tasks": []},
+                headers=auth_headers(uid)
+            )
+            body = response.json()
+            cursor, pages, documents = body["next_cursor"], pages + 1, documents + len(body["synced_tasks"])
+            if not body["has_more"]:
+                break
+        full.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await client.post(
+            "/syncTasks",
+            json={"user_id": uid, "cursor": cursor, "page_size": page_size, "tasks": []},
+            headers=auth_headers(uid)
+        )
+        incremental.append(time.perf_counter() - started)
+    return {
+        "pages": pages,
+        "documents": documents,
+        "full_resync_ms": round(statistics.median(full) * 1000, 1),
+        "incremental_ms": round(statistics.median(incremental) * 1000, 2),
+    }
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    from server.compaction import TombstoneCompactor
+
+    latency = latency_from_args(args)
+    latency.document = args.document_latency / 1000
+    fake = FakeFirebase(latency)
+    app_module = load_app(fake)
+
+    rows = []
+    async with client_for(app_module.app) as client:
+        for index, tombstones in enumerate(args.tombstones):
+            uid = f"bench-user-{index}"
+            fake.add_user(uid)
+            _seed(fake, uid, args.live_tasks, tombstones)
+            before = await _time_syncs(client, uid, args.page_size, args.repeat)
+            rows.append({"tombstones": tombstones, "phase": "before", **before})
+
+            compactor = TombstoneCompactor(
+                interval=0, horizon=30 * 24 * 3600, batch_size=250, max_batches=1_000_000, lease=600
+            )
+            started = time.perf_counter()
+            reclaimed = await compactor.run_pass(app_module.repos.tasks, app_module.repos.leases)
+            compaction_ms = round((time.perf_counter() - started) * 1000, 1)
+            after = await _time_syncs(client, uid, args.page_size, args.repeat)
+            rows.append({
+                "tombstones": tombstones, "phase": "after", **after,
+                "reclaimed": reclaimed, "compaction_ms": compaction_ms,
+            })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure sync latency against the number of task tombstones")
+    parser.add_argument("--tombstones", type=int, nargs="+", default=[0, 1000, 5000, 20000])
+    parser.add_argument("--live-tasks", type=int, default=500, help="Live tasks per user")
+    parser.add_argument("--page-size", type=int, default=200, help="Changes per sync page")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed syncs per measurement (median reported)")
+    parser.add_argument("--document-latency", type=float, default=0.02, help="Query latency per returned document (ms)")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(rows, [
+        "tombstones", "phase", "pages", "documents", "full_resync_ms", "incremental_ms", "reclaimed", "compaction_ms"
+    ])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
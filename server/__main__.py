@@ -0,0 +1,39 @@
+"""
+Launch the API server with uvicorn using the settings in ``server/config.py``.
+
+    python -m server                                   # development: auto-reload
+    ENVIRONMENT=production WORKERS=4 python -m server  # production: 4 workers, no reload
+
+Each worker process imports the app and initializes Firebase and the storage
+backend in its own lifespan hook, after the fork.
+"""
+import logging
+
+import uvicorn
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    logger.info(
+        "Starting %s server on %s:%s (%s)",
+        config.ENVIRONMENT, config.HOST, config.PORT,
+        "reload" if config.RELOAD else f"{config.WORKERS} workers"
+    )
+    uvicorn.run(
+        "server.app:app",
+        host=config.HOST,
+        port=config.PORT,
+        reload=config.RELOAD,
+        workers=None if config.RELOAD else config.WORKERS,
+        timeout_graceful_shutdown=config.GRACEFUL_SHUTDOWN_TIMEOUT,
+        log_config=config.LOGGING_CONFIG,
+        log_level="debug" if config.DEBUG else "info"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import asyncio
+import math
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from . import config
+from .metrics import registry
+
+admission_rejections = registry.counter(
+    "admission_rejections_total", "Requests shed by admission control", ["endpoint_class", "reason"]
+)
+
+
+class RateLimitedError(HTTPException):
+    """Raised when a user has exhausted their request budget for an endpoint class."""
+
+    def __init__(self, endpoint_class: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many '{endpoint_class}' requests, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+class OverloadedError(HTTPException):
+    """Raised when an endpoint class is saturated and the request is shed."""
+
+    def __init__(self, endpoint_class: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server is busy handling '{endpoint_class}' requests, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+class EndpointClass:
+    """
+    Admission state for one class of endpoints.
+
+    - **rate** / **burst**: Per-user token bucket, refilled at ``rate`` tokens per
+      second up to ``burst``; each request takes one token
+    - **max_concurrency**: Requests of this class served at once across all users
+    - **max_queue**: Requests allowed to wait for a slot; beyond that they are shed
+      immediately
+    - **queue_timeout**: Longest a request may wait for a slot before it is shed
+
+    Buckets live in an LRU table of at most ``max_users`` entries, so every
+    operation is O(1).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        max_users: int = 100000
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+
+    def take_token(self, uid: str) -> Optional[float]:
+        """Take one token from ``uid``'s bucket; returns seconds to wait if it is empty."""
+        now = time.monotonic()
+        bucket = self._buckets.get(uid)
+        if bucket is None:
+            bucket = self._buckets[uid] = [float(self.burst), now]
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(uid)
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            return (1.0 - bucket[0]) / self.rate if self.rate > 0 else self.queue_timeout
+        bucket[0] -= 1.0
+        return None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def acquire(self) -> asyncio.Semaphore:
+        """Wait (within the queue budget) for a slot; raises ``OverloadedError`` otherwise."""
+        semaphore = self._semaphore()
+        if semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                admission_rejections.inc(self.name, "queue_full")
+                raise OverloadedError(self.name, self.queue_timeout)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                admission_rejections.inc(self.name, "queue_timeout")
+                raise OverloadedError(self.name, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        return semaphore
+
+    @asynccontextmanager
+    async def admit(self, uid: str):
+        """Hold an admission slot for ``uid`` while the body runs."""
+        retry_after = self.take_token(uid)
+        if retry_after is not None:
+            self.rate_limited += 1
+            admission_rejections.inc(self.name, "rate_limited")
+            raise RateLimitedError(self.name, retry_after)
+
+        semaphore = await self.acquire()
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "burst": self.burst,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "tracked_users": len(self._buckets),
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+        }
+
+
+class AdmissionController:
+    """Maps routes to endpoint classes and admits authenticated requests into them."""
+
+    def __init__(
+        self,
+        classes: Dict[str, Dict[str, Any]],
+        routes: Dict[str, str],
+        default_class: str,
+        max_users: int,
+        enabled: bool = True
+    ):
+        self.classes = {name: EndpointClass(name, max_users=max_users, **limits) for name, limits in classes.items()}
+        self.routes = routes
+        self.default_class = default_class
+        self.enabled = enabled
+
+    def endpoint_class(self, path: str) -> EndpointClass:
+        return self.classes[self.routes.get(path, self.default_class)]
+
+    def admit(self, uid: str, path: str):
+        """Async context manager admitting ``uid`` to the endpoint class of route ``path``."""
+        if not self.enabled:
+            return nullcontext()
+        return self.endpoint_class(path).admit(uid)
+
+    def stats(self) -> list:
+        return [endpoint_class.stats() for endpoint_class in self.classes.values()]
+
+
+admission = AdmissionController(
+    config.ADMISSION_CLASSES,
+    config.ADMISSION_ROUTES,
+    default_class=config.ADMISSION_DEFAULT_CLASS,
+    max_users=config.ADMISSION_MAX_USERS,
+    enabled=config.ADMISSION_ENABLED
+)
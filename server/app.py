@@ -1,40 +1,198 @@
+import time
+_import_started = time.perf_counter()
+
 import os
 import uuid
+import asyncio
 import json
-from datetime import datetime
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Header, Request
+import hashlib
+from datetime import datetime, timezone
+from typing import List, Literal, Optional, Dict, Any
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Header, Request, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
-import firebase_admin
-from firebase_admin import credentials, firestore, auth, storage
+from contextlib import asynccontextmanager
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from . import config
+from .cache import TTLCache
+from .datastore import auth_pool, firestore_pool, storage_pool
+from . import datastore
+from .uploads import ContentLengthLimitMiddleware, dedup_scope, hash_upload, stream_upload
+from .postprocess import post_processing
+from .mediapipeline import STATE_KEY as MEDIA_STATE_KEY, media_pipeline
+from . import sync
+from . import ingest
+from .coalescer import MAX_BATCH_WRITES, WriteCoalescer
+from . import backends
+from . import metrics
+from .admission import admission
+from .questions import question_pool
+from .pubsub import hub
+from .responses import ORJSONResponse, PrecomputedJSON, etag_matches, model_response, negotiate_encoding
+from .history import message_history, parse_fields
+from .repositories import HistoryPosition
+from .logpipeline import log_pipeline, setup_logging
+from .settings import settings_cache
+from .idempotency import IdempotencyMiddleware, IdempotencyStore
+from .singleflight import SingleFlight
+from .compaction import tombstone_compactor
+from .compression import CompressionMiddleware, ResponseCompression
+from . import profiling
+from .profiling import TracedRoute, TracingMiddleware, profiler, slow_requests
+
 logger = logging.getLogger(__name__)
 
-# Configuration
-SERVICE_ACCOUNT_KEY_PATH = os.path.join(os.path.dirname(__file__), "credentials", "auraframefx-firebase-adminsdk-fbsvc-9c493ac034.json")
-
-# Initialize Firebase Admin SDK
-try:
-    # Check if Firebase app is already initialized to avoid error on hot reload
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
-        firebase_admin.initialize_app(cred, {
-            'databaseURL': 'https://auraframefx.firebaseio.com',
-            'storageBucket': 'auraframefx.appspot.com'
-        })
-    
-    # Initialize Firestore and Storage
-    db = firestore.client()
-    bucket = storage.bucket()
-    logger.info("Firebase Admin SDK initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing Firebase Admin SDK: {e}")
-    raise
+# Firebase and the storage backend selected by config.STORAGE_BACKEND are set up per
+# process by the lifespan hook (or on first use), so importing this module stays cheap
+repos = backends.LazyRepositories()
+auth = backends.LazyModule("firebase_admin.auth", before=backends.init_firebase)
+
+# Verified-token and user-profile caches shared by all authenticated endpoints
+token_cache = TTLCache(maxsize=config.TOKEN_CACHE_SIZE, ttl=config.TOKEN_CACHE_TTL, name="token")
+profile_cache = TTLCache(maxsize=config.PROFILE_CACHE_SIZE, ttl=config.PROFILE_CACHE_TTL, name="profile")
+# Profile misses for the same user (several devices at once) share one Firestore read
+profile_reads = SingleFlight("profile")
+
+# gzip / brotli response compression, negotiated per request
+response_compression = ResponseCompression(
+    encodings=config.COMPRESSION_ENCODINGS.split(","),
+    minimum_size=config.COMPRESSION_MIN_SIZE,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+    thread_size=config.COMPRESSION_THREAD_SIZE
+)
+
+# Idempotency-Key records: per worker, or shared through the storage backend
+idempotency_store = IdempotencyStore(
+    shared=(lambda: repos.idempotency) if config.IDEMPOTENCY_STORE == "shared" else None,
+    cache_size=config.IDEMPOTENCY_CACHE_SIZE,
+    ttl=config.IDEMPOTENCY_TTL,
+    lease=config.IDEMPOTENCY_LEASE,
+    wait_timeout=config.IDEMPOTENCY_WAIT_TIMEOUT
+)
+
+def commit_messages(messages: List[Dict[str, Any]]) -> List[HistoryPosition]:
+    """Insert messages with auto-generated IDs in one batched write (blocking); returns (timestamp, id) pairs."""
+    return repos.messages.add_many(messages)
+
+def response_timestamp(stored: datetime) -> datetime:
+    """A stored message timestamp as returned to clients: naive UTC, like /messages."""
+    return stored.astimezone(timezone.utc).replace(tzinfo=None)
+
+# Concurrent /sendMessage inserts are group-committed as one batched write
+message_writer = WriteCoalescer(
+    "messages",
+    commit_messages,
+    max_batch=config.MESSAGE_BATCH_SIZE,
+    max_delay=config.MESSAGE_BATCH_DELAY
+)
+
+# Expose cache, backend pool and queue counters on /metrics
+metrics.track_stats("cache", "cache", [token_cache, profile_cache, message_history.cache], {
+    "hits": ("counter", "Cache hits"),
+    "misses": ("counter", "Cache misses"),
+    "hit_ratio": ("gauge", "Cache hits / lookups since start"),
+    "size": ("gauge", "Entries currently cached"),
+    "evictions": ("counter", "Entries evicted to stay within maxsize"),
+})
+metrics.track_stats("backend_pool", "backend", [auth_pool, firestore_pool, storage_pool], {
+    "in_flight": ("gauge", "Backend calls currently holding a pool slot"),
+    "max_concurrency": ("gauge", "Backend pool concurrency limit"),
+})
+metrics.track_stats("postprocess", "queue", [post_processing, media_pipeline.queue], {
+    "depth": ("gauge", "Jobs waiting in the post-processing queue"),
+    "processed": ("counter", "Post-processing jobs completed"),
+    "retried": ("counter", "Post-processing job retries"),
+    "failed": ("counter", "Post-processing jobs that exhausted their retries"),
+    "rejected": ("counter", "Post-processing jobs dropped because the queue was full"),
+})
+metrics.track_stats("media", "pipeline", [media_pipeline], {
+    "variants": ("counter", "Upload variants (thumbnails, previews) stored"),
+    "unprocessable": ("counter", "Uploads whose content could not be decoded"),
+    "pool_restarts": ("counter", "Process pools replaced after a worker process died"),
+    "bytes_in": ("counter", "Bytes of originals processed"),
+    "bytes_out": ("counter", "Bytes of variants stored"),
+})
+metrics.track_stats("write_coalescer", "writer", [message_writer], {
+    "batches": ("counter", "Batched commits"),
+    "documents": ("counter", "Documents committed"),
+    "failed_batches": ("counter", "Batched commits that failed"),
+    "pending": ("gauge", "Documents waiting for the next commit"),
+})
+metrics.track_stats("admission", "endpoint_class", admission.classes.values(), {
+    "in_flight": ("gauge", "Admitted requests currently being served"),
+    "waiting": ("gauge", "Requests waiting for a concurrency slot"),
+    "admitted": ("counter", "Requests admitted"),
+})
+metrics.track_stats("question_pool", "pool", [question_pool], {
+    "size": ("gauge", "Pre-generated questions ready to serve"),
+    "served": ("counter", "Questions served"),
+    "generated": ("counter", "Questions generated by the background producer"),
+    "fallbacks": ("counter", "Requests topped up by the local generator because the pool ran short"),
+    "generation_errors": ("counter", "Failed generator calls"),
+})
+metrics.track_stats("events", "hub", [hub], {
+    "connections": ("gauge", "Open Server-Sent Events streams"),
+    "published": ("counter", "Change events published to at least one stream"),
+    "delivered": ("counter", "Change events queued for a stream"),
+    "evicted": ("counter", "Streams closed because their queue overflowed"),
+    "rejected": ("counter", "Streams refused by connection limits"),
+})
+metrics.track_stats("settings", "cache", [settings_cache], {
+    "keys": ("gauge", "Settings held in memory"),
+    "refreshes": ("counter", "Full reloads of the settings collection"),
+    "notifications": ("counter", "Change notifications from the settings listener"),
+    "errors": ("counter", "Failed settings reloads"),
+    "age_seconds": ("gauge", "Seconds since the settings cache was last reloaded or notified"),
+})
+metrics.track_stats("idempotency", "store", [idempotency_store], {
+    "in_flight": ("gauge", "Idempotency keys executing in this process"),
+    "executed": ("counter", "Requests with an Idempotency-Key that ran"),
+    "replayed": ("counter", "Duplicates answered from a stored result"),
+    "waited": ("counter", "Duplicates that waited for the first execution"),
+    "busy": ("counter", "Duplicates answered 409 because the first execution was still running"),
+})
+metrics.track_stats("singleflight", "group", [profile_reads, sync.change_reads], {
+    "in_flight": ("gauge", "Distinct reads currently in flight"),
+    "calls": ("counter", "Backend reads started"),
+    "shared": ("counter", "Callers served by joining a read already in flight"),
+    "cache_hits": ("counter", "Callers served from a recently completed read"),
+    "errors": ("counter", "Coalesced reads that failed"),
+})
+metrics.track_stats("compaction", "collection", [tombstone_compactor], {
+    "passes": ("counter", "Tombstone compaction passes run"),
+    "skipped": ("counter", "Passes skipped because another worker held the lease"),
+    "reclaimed": ("counter", "Task tombstones purged"),
+    "errors": ("counter", "Failed compaction passes"),
+    "last_pass_seconds": ("gauge", "Duration of the last compaction pass"),
+})
+metrics.track_stats("compression", "middleware", [response_compression], {
+    "compressed": ("counter", "Responses sent compressed"),
+    "bytes_in": ("counter", "Response bytes before compression"),
+    "bytes_out": ("counter", "Response bytes after compression"),
+})
+metrics.track_stats("slow_requests", "log", [slow_requests], {
+    "recorded": ("counter", "Requests recorded in the slow-request log"),
+    "size": ("gauge", "Entries in the slow-request log"),
+})
+metrics.track_stats("profiler", "profiler", [profiler], {
+    "active": ("gauge", "1 while a sampling profile is being recorded"),
+    "sessions": ("counter", "Sampling profiles recorded"),
+    "samples": ("counter", "Stack samples taken"),
+})
+metrics.track_stats("logging", "pipeline", [log_pipeline], {
+    "queued": ("gauge", "Log records waiting for the writer thread"),
+    "dropped": ("counter", "Routine log records dropped because the queue was full"),
+    "sampled_out": ("counter", "Routine log records skipped by per-logger sampling"),
+})
+metrics.registry.callback(
+    "startup_step_seconds",
+    "Time this process spent in each backend initialization step",
+    lambda: [({"step": step}, ms / 1000) for step, ms in backends.timings.items()]
+)
 
 # Request/Response Models
 class MessageRequest(BaseModel):
@@ -49,9 +207,32 @@ class MessageResponse(BaseModel):
     timestamp: datetime
     status: str = "success"
 
+class IngestResult(BaseModel):
+    index: int
+    status: str
+    message: Optional[MessageResponse] = None
+    error: Optional[str] = None
+
 class ImportResponse(BaseModel):
     status: str = "success"
     message: Optional[str] = None
+    url: Optional[str] = None
+    path: Optional[str] = None
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    digest: Optional[str] = None
+    deduplicated: bool = False
+    processing: Optional[str] = None
+
+class UploadVariant(BaseModel):
+    path: str
+    url: str
+
+class UploadStatusResponse(BaseModel):
+    status: str = "success"
+    path: str
+    state: str
+    variants: Dict[str, UploadVariant] = Field(default_factory=dict)
+    error: Optional[str] = None
 
 class RootToggleRequest(BaseModel):
     enabled: bool
@@ -59,6 +240,7 @@ class RootToggleRequest(BaseModel):
 class RootToggleResponse(BaseModel):
     status: str = "success"
     enabled: bool
+    version: int
 
 class AskQuestion(BaseModel):
     question: str
@@ -80,6 +262,8 @@ class Task(BaseModel):
 class SyncRequest(BaseModel):
     user_id: str
     last_sync_time: Optional[int] = None
+    cursor: Optional[str] = None
+    page_size: Optional[int] = Field(default=None, ge=1)
     tasks: List[Task] = Field(default_factory=list)
 
 class SyncResponse(BaseModel):
@@ -87,6 +271,72 @@ class SyncResponse(BaseModel):
     message: str = ""
     synced_tasks: List[Task] = Field(default_factory=list)
     server_time: int = Field(default_factory=lambda: int(datetime.utcnow().timestamp() * 1000))
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    full_resync: bool = False
+
+class ProfileRequest(BaseModel):
+    seconds: float = Field(default=10, gt=0, le=config.PROFILER_MAX_SECONDS)
+    route: Optional[str] = None
+    requests: int = Field(default=100, ge=1)
+    interval_ms: Optional[float] = Field(default=None, ge=1, le=1000)
+    all_threads: bool = False
+    limit: int = Field(default=50, ge=1, le=1000)
+    format: Literal["json", "collapsed"] = "json"
+
+class ProfileFunction(BaseModel):
+    function: str
+    self_samples: int
+    total_samples: int
+
+class ProfileStack(BaseModel):
+    stack: str
+    samples: int
+
+class ProfileResponse(BaseModel):
+    status: str = "success"
+    route: Optional[str] = None
+    requests: Optional[int] = None
+    seconds: float
+    interval_ms: float
+    samples: int
+    idle_samples: int
+    busy_samples: int
+    functions: List[ProfileFunction]
+    stacks: List[ProfileStack]
+
+class SlowRequestsResponse(BaseModel):
+    status: str = "success"
+    worker: int
+    threshold_ms: float
+    requests: List[Dict[str, Any]]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize backends for this worker process before serving; drain queues on shutdown."""
+    # Route this worker's logging through the queue-based pipeline; done here rather than
+    # at import so tests, tools and the media worker processes keep their own logging
+    setup_logging()
+    try:
+        timings = await asyncio.to_thread(backends.initialize)
+    except Exception as e:
+        logger.error("Error initializing backends: %s", e)
+        raise
+    logger.info(
+        "Worker %d ready in %.0f ms (init steps, ms: %s)",
+        os.getpid(), (time.perf_counter() - _import_started) * 1000, timings
+    )
+    # Start generating AI questions so the first requests are served from the pool
+    question_pool.start()
+    await settings_cache.start(repos.settings)
+    tombstone_compactor.start(lambda: repos.tasks, lambda: repos.leases)
+    yield
+    hub.close_all()
+    await tombstone_compactor.stop()
+    await settings_cache.stop()
+    await question_pool.stop()
+    await media_pipeline.stop()
+    await post_processing.stop()
 
 # Initialize FastAPI
 app = FastAPI(
@@ -95,8 +345,23 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
+# Endpoints mark where they start and return in the request's phase timings
+app.router.route_class = TracedRoute
+
+# Run retried writes that carry an Idempotency-Key once (innermost, so replays get CORS headers)
+app.add_middleware(
+    IdempotencyMiddleware,
+    store=idempotency_store,
+    identify=lambda authorization: identify(authorization),
+    paths=config.IDEMPOTENCY_ROUTES
+)
+
+# Compress large list responses (sync pages, history, questions) for clients that accept it
+app.add_middleware(CompressionMiddleware, compression=response_compression)
 
 # CORS Middleware Configuration
 app.add_middleware(
@@ -109,14 +374,39 @@ app.add_middleware(
     max_age=600
 )
 
-# Dependency to verify Firebase token and get user context
-async def get_current_user(
-    authorization: str = Header(..., description="Bearer token")
-):
+# Serve locally stored blobs when running without Cloud Storage
+if config.STORAGE_BACKEND == "sql":
+    # Objects live under <LOCAL_BLOB_DIR>/objects, created when the blob store initializes
+    app.mount(
+        config.LOCAL_BLOB_URL,
+        StaticFiles(directory=os.path.join(config.LOCAL_BLOB_DIR, "objects"), check_dir=False),
+        name="blobs"
+    )
+
+# Reject oversized uploads from their Content-Length before the body is parsed
+app.add_middleware(
+    ContentLengthLimitMiddleware,
+    limits={"/importFile": config.MAX_UPLOAD_SIZE + config.UPLOAD_MULTIPART_OVERHEAD}
+)
+
+# Per-phase timings for the slow-request log and the route profiler (inside the metrics
+# middleware, which resolves the endpoint)
+app.add_middleware(TracingMiddleware, log=slow_requests, profiler=profiler)
+
+# Per-endpoint latency, status and in-flight metrics (outermost, so rejections count too)
+app.add_middleware(metrics.MetricsMiddleware)
+
+async def authenticate(authorization: str) -> Dict[str, Any]:
     """
     Verify the Firebase ID token and return the user's UID and additional claims.
     The token should be passed in the Authorization header as: 'Bearer <token>'
+
+    Verified tokens are cached by their SHA-256 hash until the token's ``exp`` claim,
+    and user profiles are cached by UID for ``PROFILE_CACHE_TTL`` seconds (never past
+    the token's expiry), so repeated calls skip both verification and the Firestore read.
+    Concurrent cache misses for the same UID share a single read.
     """
+    profiling.mark("auth")
     if not authorization.startswith("Bearer "):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -126,14 +416,22 @@ async def get_current_user(
     
     token = authorization.split(" ")[1]
     
+    token_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
     try:
         # Verify the token and get the user's Firebase UID and claims
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = token_cache.get(token_key)
+        if decoded_token is None:
+            decoded_token = await auth_pool.run(auth.verify_id_token, token)
+            token_cache.set(token_key, decoded_token, expires_at=decoded_token.get("exp"))
         user_id = decoded_token["uid"]
+        profiling.set_user(user_id)
         
         # Get additional user data from Firestore
-        user_doc = db.collection("users").document(user_id).get()
-        user_data = user_doc.to_dict() if user_doc.exists else {}
+        user_data = profile_cache.get(user_id)
+        if user_data is None:
+            user_data = await profile_reads.do(user_id, firestore_pool.run, repos.users.get_profile, user_id)
+            profile_cache.set(user_id, user_data, expires_at=decoded_token.get("exp"))
         
         return {
             "uid": user_id,
@@ -141,9 +439,12 @@ async def get_current_user(
             "email_verified": decoded_token.get("email_verified", False),
             "is_admin": user_data.get("is_admin", False),
             "permissions": user_data.get("permissions", []),
-            "metadata": user_data
+            "metadata": user_data,
+            "token_expires_at": decoded_token.get("exp")
         }
         
+    except HTTPException:
+        raise
     except auth.ExpiredIdTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -157,14 +458,53 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        logger.error(f"Error verifying token: {e}", exc_info=True)
+        logger.error("Error verifying token: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def identify(authorization: str) -> str:
+    """UID of the verified caller (idempotency keys are scoped to it)."""
+    return (await authenticate(authorization))["uid"]
+
+# Dependency to verify Firebase token and get user context
+async def get_current_user(
+    request: Request,
+    authorization: str = Header(..., description="Bearer token")
+):
+    """
+    Authenticate the request, then admit it through admission control.
+
+    Limits key on the authenticated UID and the endpoint class of the route
+    (``config.ADMISSION_ROUTES``): a user over their token-bucket rate gets 429, and
+    a request that cannot get a slot within the class's queue budget gets 503, both
+    with Retry-After. The slot is held until the endpoint has returned.
+    """
+    user = await authenticate(authorization)
+    profiling.mark("admission")
+    async with admission.admit(user["uid"], request.url.path):
+        profiling.mark("validation")
+        yield user
+
+async def get_admin_user(user: dict = Depends(get_current_user)):
+    """``get_current_user`` for admin-only endpoints: 403 unless the profile has ``is_admin``."""
+    if not user.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions. Admin access required."
+        )
+    return user
+
 # Root Endpoint
+ROOT_PAYLOAD = PrecomputedJSON({
+    "message": "Welcome to the Genesis AI API",
+    "status": "running",
+    "version": "1.0.0",
+    "documentation": "/docs"
+})
+
 @app.get(
     "/",
     status_code=status.HTTP_200_OK,
@@ -177,13 +517,7 @@ async def root():
     Returns:
         dict: Welcome message and API status
     """
-    return {
-        "message": "Welcome to the Genesis AI API",
-        "status": "running",
-        "version": "1.0.0",
-        "timestamp": datetime.utcnow().isoformat(),
-        "documentation": "/docs"
-    }
+    return ROOT_PAYLOAD.response(timestamp=datetime.utcnow().isoformat())
 
 # Message Endpoints
 @app.post(
@@ -212,45 +546,185 @@ async def send_message(
             )
             
         # Prepare message data
-        message_data = message.dict()
+        message_data = message.model_dump()
         message_data.update({
-            "timestamp": firestore.SERVER_TIMESTAMP,
             "userId": user["uid"],
             "status": "sent"
         })
         
-        # Add message to Firestore in a transaction
-        @firestore.transactional
-        def create_message(transaction, message_data):
-            # Create a new document reference with auto-generated ID
-            message_ref = db.collection("messages").document()
-            
-            # Set the document data
-            transaction.set(message_ref, message_data)
-            
-            # Update the message data with the generated ID
-            message_data["id"] = message_ref.id
-            return message_data
-            
-        # Run the transaction
-        transaction = db.transaction()
-        message_data = create_message(transaction, message_data)
+        # Insert with an auto-generated ID; concurrent inserts share one batched commit
+        timestamp, message_id = await message_writer.submit(message_data)
+        message_history.record_write(user["uid"])
         
         # Log the successful message sending
-        logger.info(f"Message sent by user {user['uid']} with ID: {message_data['id']}")
+        logger.info("Message sent by user %s with ID: %s", user["uid"], message_id)
         
         # Return the created message with ID and status
-        return MessageResponse(**message_data)
+        response = MessageResponse(
+            id=message_id,
+            message=message_data["message"],
+            userId=user["uid"],
+            timestamp=response_timestamp(timestamp),
+            status="sent"
+        )
+        
+        # Notify the user's other connected sessions
+        if hub.has_subscribers(user["uid"]):
+            hub.publish(user["uid"], "message.created", response.model_dump())
+        
+        return response
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error sending message: {str(e)}", exc_info=True)
+        logger.error("Error sending message: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while sending the message"
         )
 
+@app.post(
+    "/ingestMessages",
+    status_code=status.HTTP_200_OK,
+    tags=["Messages"]
+)
+async def ingest_messages(
+    request: Request,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Send a backlog of messages in one request, e.g. when a device comes back online.
+    
+    - **body**: A JSON array of messages (`Content-Type: application/json`) or one
+      message per line (`application/x-ndjson`), each shaped like a /sendMessage body
+    - **userId**: Set from the auth token for every message, as in /sendMessage
+    - Returns: One result per item, in order:
+      `{"index", "status": "sent", "message": <MessageResponse>}` or
+      `{"index", "status": "error", "error"}`. NDJSON requests get NDJSON lines ending
+      with a `{"summary": {...}}` line; JSON requests get
+      `{"results": [...], "accepted", "rejected", "error"}`
+    
+    Items are validated as the body arrives and written in batches of
+    `INGEST_BATCH_SIZE`; results are spooled (to disk past `INGEST_SPOOL_SIZE`
+    bytes), so memory stays bounded however long the body is. Invalid items are
+    reported and skipped; a malformed body stops ingestion at that point (earlier
+    items stay written) and is reported in `error`.
+    """
+    uid = user["uid"]
+    items, ndjson = ingest.split_body(request.stream(), request.headers.get("content-type"))
+    
+    def prepare(raw: bytes) -> Dict[str, Any]:
+        message = MessageRequest.model_validate_json(raw)
+        if not message.message.strip():
+            raise ValueError("Message cannot be empty")
+        message_data = message.model_dump()
+        message_data.update({
+            "userId": uid,
+            "status": "sent"
+        })
+        return message_data
+    
+    async def commit(documents: List[Dict[str, Any]]) -> List[MessageResponse]:
+        positions = await firestore_pool.run(commit_messages, documents, operation="ingest_messages")
+        message_history.record_write(uid)
+        responses = [
+            MessageResponse(
+                id=message_id, message=document["message"], userId=uid, timestamp=response_timestamp(timestamp), status="sent"
+            )
+            for (timestamp, message_id), document in zip(positions, documents)
+        ]
+        if hub.has_subscribers(uid):
+            for response in responses:
+                hub.publish(uid, "message.created", response.model_dump())
+        return responses
+    
+    def render(index: int, document: Any, response: Optional[MessageResponse], error: Optional[str]) -> bytes:
+        if error is not None:
+            return IngestResult(index=index, status="error", error=error).model_dump_json().encode("utf-8")
+        return IngestResult(index=index, status="sent", message=response).model_dump_json().encode("utf-8")
+    
+    outcomes = ingest.ingest(
+        items, prepare, commit,
+        batch_size=max(1, min(config.INGEST_BATCH_SIZE, MAX_BATCH_WRITES)),
+        max_items=config.INGEST_MAX_ITEMS
+    )
+    results = await ingest.spool_results(ingest.encode_results(outcomes, render, ndjson), config.INGEST_SPOOL_SIZE)
+    logger.info("Ingested messages for user %s", uid)
+    return StreamingResponse(
+        ingest.iter_spool(results),
+        media_type="application/x-ndjson" if ndjson else "application/json"
+    )
+
+async def find_upload(scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+    """Reference an already stored upload with this digest for ``uid``, if any (best effort)."""
+    try:
+        return await firestore_pool.run(repos.uploads.reference, scope, digest, uid, operation="find_upload")
+    except Exception as e:
+        logger.warning("Upload index lookup failed, storing a new copy: %s", e)
+        return None
+
+async def index_upload(scope: Optional[str], digest: str, entry: Dict[str, Any], uid: str) -> Dict[str, Any]:
+    """Record a new upload by ``uid`` in the index; returns the entry that ended up indexed."""
+    try:
+        return await firestore_pool.run(repos.uploads.add, scope, digest, entry, uid, operation="index_upload")
+    except Exception as e:
+        # The object is stored either way; it just won't be found by later imports
+        logger.warning("Failed to index upload %s: %s", entry["path"], e)
+        return entry
+
+def upload_response(entry: Dict[str, Any], digest: str, deduplicated: bool = False, processing: Optional[str] = None) -> Response:
+    return model_response(ImportResponse(
+        message="File already uploaded" if deduplicated else "File uploaded successfully",
+        url=repos.blobs.public_url(entry["path"]),
+        path=entry["path"],
+        metadata=entry.get("metadata", {}),
+        digest=digest,
+        deduplicated=deduplicated,
+        processing=processing
+    ), status_code=status.HTTP_201_CREATED)
+
+def upload_path_visible(uid: str, path: str) -> bool:
+    """Whether ``uid`` may look up the upload stored at ``path``."""
+    directory, _, filename = path.rpartition("/")
+    if not filename or filename.startswith("."):
+        return False
+    if directory == f"users/{uid}/uploads":
+        return True
+    # With a global index, imports may return another user's (public) object
+    parts = directory.split("/")
+    return config.UPLOAD_DEDUP == "global" and len(parts) == 3 and parts[0] == "users" and parts[2] == "uploads"
+
+@app.get(
+    "/messages",
+    status_code=status.HTTP_200_OK,
+    tags=["Messages"],
+    responses={304: {"description": "The page matches If-None-Match"}}
+)
+async def get_messages(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(config.HISTORY_PAGE_SIZE, ge=1, le=config.HISTORY_MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of message, userId, status"),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Page through the user's messages, newest first.
+    
+    - **cursor**: Omit for the newest page, then pass the previous `next_cursor`
+    - **limit**: Messages per page
+    - **fields**: Fields to include besides `id` and `timestamp` (default: all)
+    - Returns: `{"messages": [...], "next_cursor", "has_more"}` with a strong `ETag`;
+      a matching `If-None-Match` gets 304 Not Modified
+    
+    Recent pages are cached per worker for up to `HISTORY_CACHE_TTL` seconds; the
+    newest page is invalidated as soon as this worker stores a message for the user.
+    """
+    page = await message_history.page(repos.messages, user["uid"], cursor, limit, parse_fields(fields))
+    headers = {"ETag": page.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(page.body, media_type="application/json", headers=headers)
+
 # File Endpoints
 @app.post(
     "/importFile", 
@@ -266,7 +740,14 @@ async def import_file(
     Upload and import a file to Firebase Storage.
     
     - **file**: The file to upload (supports any file type)
-    - Returns: Public URL of the uploaded file
+    - Returns: Public URL of the uploaded file and its SHA-256 `digest`; `processing` is
+      `queued` when smaller variants (image thumbnails, document text previews) will be
+      derived in the background, see /uploadStatus
+    
+    Uploads are deduplicated by content (see `UPLOAD_DEDUP`): re-importing bytes
+    already stored returns the existing object with `deduplicated` set and
+    performs no storage write. Each import holds one reference to the object,
+    recorded with the importing user.
     """
     try:
         # Validate file
@@ -281,6 +762,15 @@ async def import_file(
         if not file_extension:
             file_extension = ".bin"
             
+        # Hash the spooled upload first so a duplicate never reaches storage
+        digest, size = await hash_upload(file)
+        scope = dedup_scope(user['uid'])
+        if config.UPLOAD_DEDUP != "off":
+            existing = await find_upload(scope, digest, user["uid"])
+            if existing is not None:
+                logger.info("File uploaded by user %s matches %s", user["uid"], existing["path"])
+                return upload_response(existing, digest, deduplicated=True)
+        
         # Generate a unique filename with timestamp
         timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
         filename = f"{timestamp}_{uuid.uuid4().hex}{file_extension}"
@@ -289,77 +779,107 @@ async def import_file(
         user_dir = f"users/{user['uid']}/uploads"
         storage_path = f"{user_dir}/{filename}"
         
+        # Metadata and ACL are sent with the upload itself so the response costs a
+        # single storage write
+        process_media = media_pipeline.accepts(file.content_type)
+        metadata = {
+            'originalName': file.filename,
+            'contentType': file.content_type,
+            'uploadedBy': user['uid'],
+            'uploadedAt': datetime.utcnow().isoformat(),
+            'size': size,
+            'sha256': digest
+        }
+        
         try:
-            # Read file content
-            content = await file.read()
-            
-            # Validate file size (e.g., 10MB max)
-            max_size = 10 * 1024 * 1024  # 10MB
-            if len(content) > max_size:
-                raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail=f"File size exceeds maximum limit of {max_size} bytes"
-                )
-                
-            # Upload to Firebase Storage
-            blob = bucket.blob(storage_path)
-            blob.upload_from_string(
-                content,
-                content_type=file.content_type or 'application/octet-stream'
+            # Stream to storage in chunks, enforcing the size limit as we go
+            writer = repos.blobs.open_writer(
+                storage_path,
+                content_type=file.content_type or 'application/octet-stream',
+                metadata={
+                    **{key: str(value) for key, value in metadata.items()},
+                    **({MEDIA_STATE_KEY: "queued"} if process_media else {})
+                },
+                # Make the file publicly accessible (or implement signed URLs for private access)
+                public=True
             )
-            
-            # Set metadata
-            metadata = {
-                'originalName': file.filename,
-                'contentType': file.content_type,
-                'size': len(content),
-                'uploadedBy': user['uid'],
-                'uploadedAt': datetime.utcnow().isoformat()
-            }
-            blob.metadata = metadata
-            blob.patch()
-            
-            # Make the file publicly accessible (or implement signed URLs for private access)
-            blob.make_public()
+            await stream_upload(file, writer)
             
             # Log the successful upload
-            logger.info(f"File uploaded by user {user['uid']} to {storage_path}")
-            
-            return {
-                "status": "success",
-                "message": "File uploaded successfully",
-                "url": blob.public_url,
-                "path": storage_path,
-                "metadata": metadata
-            }
+            logger.info("File uploaded by user %s to %s", user["uid"], storage_path)
             
         except HTTPException:
             raise
             
         except Exception as upload_error:
-            logger.error(f"Error uploading file: {str(upload_error)}", exc_info=True)
-            # Attempt to clean up if the blob was partially created
-            try:
-                if 'blob' in locals() and blob.exists():
-                    blob.delete()
-            except Exception as cleanup_error:
-                logger.error(f"Error cleaning up failed upload: {str(cleanup_error)}")
+            logger.error("Error uploading file: %s", upload_error, exc_info=True)
+            # Clean up in the background in case the object was finalized before the error
+            post_processing.submit("cleanup_failed_upload", storage_pool.run, repos.blobs.delete, storage_path)
                 
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload file to storage"
             )
-            
+        
+        entry = {"path": storage_path, "metadata": metadata}
+        if config.UPLOAD_DEDUP != "off":
+            entry = await index_upload(scope, digest, entry, user["uid"])
+            if entry["path"] != storage_path:
+                # A concurrent import of the same bytes was indexed first; keep that object
+                post_processing.submit("delete_duplicate_upload", storage_pool.run, repos.blobs.delete, storage_path)
+                return upload_response(entry, digest, deduplicated=True)
+        
+        # Thumbnails and previews are derived in worker processes, off the request path
+        processing = None
+        if process_media:
+            processing = "queued" if await media_pipeline.submit(repos.blobs, storage_path, file.content_type) else "failed"
+        return upload_response(entry, digest, processing=processing)
+        
     except HTTPException:
         raise
         
     except Exception as e:
-        logger.error(f"Unexpected error in import_file: {str(e)}", exc_info=True)
+        logger.error("Unexpected error in import_file: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while processing the file"
         )
 
+@app.get(
+    "/uploadStatus",
+    response_model=UploadStatusResponse,
+    status_code=status.HTTP_200_OK,
+    tags=["Files"]
+)
+async def get_upload_status(
+    path: str = Query(..., description="path returned by /importFile"),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Processing state and derived variants of an uploaded file.
+    
+    - **path**: The `path` returned by /importFile
+    - Returns: `state` (`queued`, `processing`, `done`, `failed`, or `none` for files
+      without variants) and, once done, `variants` by name (`thumb`, `medium` per
+      `MEDIA_IMAGE_SIZES`; `preview` for documents), each stored next to the original
+    
+    Images are never upscaled, so a small image may have fewer variants (or none).
+    """
+    if not upload_path_visible(user["uid"], path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    media_status = await media_pipeline.status(repos.blobs, path)
+    if media_status is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return model_response(UploadStatusResponse(
+        path=path,
+        state=media_status["state"],
+        variants={
+            name: UploadVariant(path=variant, url=repos.blobs.public_url(variant))
+            for name, variant in media_status["variants"].items()
+        },
+        error=media_status["error"]
+    ))
+
 # Root Toggle Endpoint
 @app.post(
     "/toggleRoot", 
@@ -369,7 +889,7 @@ async def import_file(
 )
 async def toggle_root(
     request: RootToggleRequest,
-    user: dict = Depends(get_current_user)
+    user: dict = Depends(get_admin_user)
 ):
     """
     Toggle root access for the application.
@@ -378,48 +898,143 @@ async def toggle_root(
     - Requires admin privileges
     """
     try:
-        # Verify user has admin privileges
-        user_doc = db.collection("users").document(user["uid"]).get()
-        if not user_doc.exists or not user_doc.to_dict().get("is_admin", False):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions. Admin access required."
-            )
-            
-        # Update the root access setting (in a real app, this would be more secure)
-        # Here we're just logging for demonstration
-        logger.warning(f"Root access {'enabled' if request.enabled else 'disabled'} by admin {user['uid']}")
-        
-        # In a real implementation, you might update a Firestore document or use Firebase Remote Config
-        return RootToggleResponse(
-            status="success",
-            enabled=request.enabled,
-            message=f"Root access has been {'enabled' if request.enabled else 'disabled'}"
+        # Write through the settings cache so this worker sees the change at once;
+        # the others pick it up from their listener or next reload
+        setting = await settings_cache.set(repos.settings, "root", {
+            "enabled": request.enabled,
+            "updatedBy": user["uid"],
+            "updatedAt": datetime.utcnow().isoformat()
+        })
+        logger.warning(
+            "Root access %s by admin %s (settings version %d)",
+            "enabled" if request.enabled else "disabled", user["uid"], setting.version
         )
+        return RootToggleResponse(status="success", enabled=request.enabled, version=setting.version)
         
     except HTTPException:
         raise
         
     except Exception as e:
-        logger.error(f"Error toggling root access: {str(e)}", exc_info=True)
+        logger.error("Error toggling root access: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while updating root access"
         )
 
-        # Update root status in Firestore
-        db.collection("settings").document("root").set({
-            "enabled": request.enabled,
-            "updatedBy": user["uid"],
-            "updatedAt": firestore.SERVER_TIMESTAMP
-        }, merge=True)
+# Diagnostics Endpoints
+@app.post(
+    "/admin/profile",
+    response_model=ProfileResponse,
+    status_code=status.HTTP_200_OK,
+    tags=["Admin"]
+)
+async def profile_worker(
+    request: ProfileRequest = Body(default_factory=ProfileRequest),
+    user: dict = Depends(get_admin_user)
+):
+    """
+    Record a sampling profile of the worker serving this request and return it.
+    
+    - **seconds**: How long to sample, or with `route`, the longest to wait for its requests
+    - **route**: Only sample while requests to this route path (e.g. `/syncTasks`) are
+      being served, and stop after `requests` of them have completed
+    - **interval_ms**: Time between stack samples (default `PROFILER_INTERVAL`)
+    - **all_threads**: Also sample backend and other threads, not just the event loop
+    - **limit**: Functions and stacks to return, most sampled first
+    - **format**: `json`, or `collapsed` for every stack as `frame;frame;... count` lines
+      (flamegraph.pl, speedscope)
+    - Requires admin privileges; one profile at a time per worker (409 otherwise)
+    
+    Samples where a thread was waiting for work are counted in `idle_samples` and left
+    out of the stacks. With several workers, only the one serving this request is profiled.
+    """
+    if request.route is not None and request.route not in {getattr(route, "path", None) for route in app.routes}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown route: {request.route}"
+        )
+    profile = await profiler.profile(
+        request.seconds,
+        route=request.route,
+        requests=request.requests,
+        interval=request.interval_ms / 1000 if request.interval_ms else None,
+        all_threads=request.all_threads
+    )
+    logger.info(
+        "Profile of %gs (route %s, %d samples) recorded for admin %s",
+        profile["seconds"], request.route, profile["samples"], user["uid"]
+    )
+    if request.format == "collapsed":
+        return PlainTextResponse(profiling.collapsed(profile["stacks"]))
+    profile["functions"] = profile["functions"][:request.limit]
+    profile["stacks"] = profile["stacks"][:request.limit]
+    return model_response(ProfileResponse(**profile))
 
-        return RootToggleResponse(status="success")
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error toggling root access: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to toggle root access: {str(e)}")
+@app.get(
+    "/admin/slowRequests",
+    response_model=SlowRequestsResponse,
+    status_code=status.HTTP_200_OK,
+    tags=["Admin"]
+)
+async def get_slow_requests(
+    endpoint: Optional[str] = Query(None, description="Only requests to this route path"),
+    limit: int = Query(50, ge=1, le=1000),
+    user: dict = Depends(get_admin_user)
+):
+    """
+    The latest requests that took at least `SLOW_REQUEST_THRESHOLD` seconds, newest first.
+    
+    - **endpoint**: Only requests to this route path
+    - **limit**: Entries to return (the worker keeps the last `SLOW_REQUEST_LOG_SIZE`)
+    - Returns: Per request, `total_ms` and `phases` (ms, in order, adding up to the total):
+      `receive`, `auth`, `admission`, `validation`, `handler`, `serialize`, `send`; and a
+      `breakdown` of backend calls (`auth`, `firestore`, `storage`), `encode` and `compress`
+      within those phases
+    - Requires admin privileges
+    
+    Each worker keeps its own log; `worker` is the process ID of the one that answered.
+    """
+    return model_response(SlowRequestsResponse(
+        worker=os.getpid(),
+        threshold_ms=slow_requests.threshold * 1000,
+        requests=slow_requests.entries(endpoint, limit)
+    ))
+
+@app.get(
+    "/admin/stats",
+    status_code=status.HTTP_200_OK,
+    tags=["Admin"]
+)
+async def get_stats(user: dict = Depends(get_admin_user)):
+    """
+    Internal counters of the answering worker: caches, backend pools, queues, writers,
+    admission control and the other subsystems also exported on /metrics.
+    
+    - Returns: One object per subsystem, and `startup_ms` (backend initialization steps)
+    - Requires admin privileges
+    
+    Each worker keeps its own counters; `worker` is the process ID of the one that answered.
+    """
+    return {
+        "worker": os.getpid(),
+        "startup_ms": backends.timings,
+        "caches": [token_cache.stats(), profile_cache.stats(), message_history.cache.stats()],
+        "backends": datastore.stats(),
+        "queues": [post_processing.stats(), media_pipeline.queue.stats()],
+        "media": media_pipeline.stats(),
+        "writers": [message_writer.stats()],
+        "questions": question_pool.stats(),
+        "events": hub.stats(),
+        "settings": settings_cache.stats(),
+        "idempotency": idempotency_store.stats(),
+        "singleflight": [profile_reads.stats(), sync.change_reads.stats()],
+        "compaction": tombstone_compactor.stats(),
+        "compression": response_compression.stats(),
+        "slow_requests": slow_requests.stats(),
+        "profiler": profiler.stats(),
+        "logging": log_pipeline.stats(),
+        "admission": admission.stats()
+    }
 
 # AI Questions Endpoint
 @app.get(
@@ -437,23 +1052,16 @@ async def get_ai_questions(
     
     - **limit**: Number of questions to return (1-20)
     - Returns: List of question objects with IDs and text
+    
+    Questions are served from a pool that is generated in the background
+    (``QUESTION_GENERATOR``); a user is not served the same question twice
+    within their last ``QUESTION_RECENT_PER_USER`` questions.
     """
     try:
-        # In a real implementation, this would generate or fetch AI questions
-        # For now, we'll return some sample questions
-        sample_questions = [
-            {"id": str(uuid.uuid4()), "question": "What are the key principles of machine learning?"},
-            {"id": str(uuid.uuid4()), "question": "How does a neural network work?"},
-            {"id": str(uuid.uuid4()), "question": "What are the differences between AI and ML?"},
-            {"id": str(uuid.uuid4()), "question": "How can we ensure AI is used ethically?"},
-            {"id": str(uuid.uuid4()), "question": "What are some common NLP techniques?"}
-        ]
-        
-        # Return a random subset of questions based on the limit
-        selected_questions = sample_questions[:min(limit, len(sample_questions))]
+        selected_questions = question_pool.take(user["uid"], limit)
         
         # Log the request
-        logger.info(f"Returning {len(selected_questions)} AI questions to user {user['uid']}")
+        logger.info("Returning %d AI questions to user %s", len(selected_questions), user["uid"])
         
         return AskResponse(
             questions=selected_questions,
@@ -461,7 +1069,7 @@ async def get_ai_questions(
         )
         
     except Exception as e:
-        logger.error(f"Error getting AI questions: {str(e)}", exc_info=True)
+        logger.error("Error getting AI questions: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while generating AI questions"
@@ -476,61 +1084,61 @@ async def get_ai_questions(
 )
 async def sync_tasks(
     request: SyncRequest,
-    user: dict = Depends(get_current_user)
+    user: dict = Depends(get_current_user),
+    accept: Optional[str] = Header(None, description="application/json (default), application/msgpack; optionally layout=columnar")
 ):
     """
     Synchronize tasks between the client and server.
     
-    - **lastSyncTime**: Timestamp of last sync (optional)
-    - **tasks**: List of tasks to sync
-    - Returns: List of updated tasks and sync status
+    - **cursor**: Continuation token from the previous response (optional)
+    - **last_sync_time**: `server_time` of the previous response, for clients without a cursor (optional)
+    - **page_size**: Maximum number of server changes to return (optional)
+    - **tasks**: List of tasks to sync; conflicts resolve last-writer-wins on `updated_at`
+    - Returns: One page of server changes, `next_cursor` and `has_more`; `full_resync` when the
+      cursor was too old (deletions it had not seen were purged) and paging restarted from the
+      beginning, so the client must replace its local tasks with the pages that follow
+    - **Accept**: `application/msgpack` for MessagePack; `layout=columnar` on either type sends
+      `synced_tasks` as one array per task field (`{"id": [...], "title": [...], ...}`)
     """
     try:
         user_id = user["uid"]
-        tasks_ref = db.collection("users").document(user_id).collection("tasks")
-        
-        # Get server changes since last sync
-        query = tasks_ref.order_by("updatedAt", direction=firestore.Query.DESCENDING)
-        if request.lastSyncTime:
-            query = query.where("updatedAt", ">", request.lastSyncTime)
-            
-        server_changes = [doc.to_dict() for doc in query.stream()]
-        
-        # Process client updates
-        if request.tasks:
-            batch = db.batch()
-            for task in request.tasks:
-                task_ref = tasks_ref.document(task.id) if hasattr(task, 'id') else tasks_ref.document()
-                task_data = task.dict()
-                task_data["updatedAt"] = firestore.SERVER_TIMESTAMP
-                batch.set(task_ref, task_data, merge=True)
-            
-            # Commit all task updates in a single batch
-            batch.commit()
+        result = await sync.sync(
+            repos.tasks,
+            user_id,
+            request.tasks,
+            cursor=request.cursor,
+            last_sync_time=request.last_sync_time,
+            page_size=request.page_size
+        )
         
-        # Get the latest sync time
-        latest_sync = firestore.SERVER_TIMESTAMP
+        logger.info("Synced %d client and %d server tasks for user %s", len(request.tasks), len(result["synced_tasks"]), user_id)
         
-        logger.info(f"Synced {len(server_changes)} tasks for user {user_id}")
+        # Push the accepted versions to the user's connected sessions
+        written_tasks = result.pop("written_tasks")
+        if written_tasks and hub.has_subscribers(user_id):
+            hub.publish(user_id, "tasks.changed", {"tasks": written_tasks, "server_time": result["server_time"]})
         
-
-        return SyncResponse(
-            tasks=server_changes,
-            lastSyncTime=firestore.SERVER_TIMESTAMP,
-            status="success"
+        # Encode the (potentially large) task page in one pass, without intermediate dicts
+        return model_response(
+            SyncResponse(status="success", **result),
+            headers={"Vary": "Accept"},
+            encoding=negotiate_encoding(accept),
+            columnar_fields=["synced_tasks"]
         )
         
     except HTTPException:
         raise
         
     except Exception as e:
-        logger.error(f"Error syncing tasks: {str(e)}", exc_info=True)
+        logger.error("Error syncing tasks: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while syncing tasks"
         )
 
 # Health Check Endpoint
+HEALTH_PAYLOAD = PrecomputedJSON({"status": "ok", "version": "1.0.0"})
+
 @app.get(
     "/health",
     status_code=status.HTTP_200_OK,
@@ -543,38 +1151,82 @@ async def health_check():
     Returns:
         dict: Status information about the server
     """
-    return {
-        "status": "ok",
-        "timestamp": datetime.utcnow().isoformat(),
-        "version": "1.0.0"
-    }
+    return HEALTH_PAYLOAD.response(timestamp=datetime.utcnow().isoformat())
+
+# Event Stream Endpoint
+@app.get(
+    "/events",
+    status_code=status.HTTP_200_OK,
+    tags=["Events"]
+)
+async def stream_events(
+    authorization: str = Header(..., description="Bearer token")
+):
+    """
+    Server-Sent Events stream of the user's task and message changes.
+    
+    - Authenticated once, when the stream is opened; it ends when the token expires
+    - Events: `ready`, `message.created`, `tasks.changed` (accepted task versions),
+      `resync` (the stream fell behind: catch up with /syncTasks, then reconnect)
+      and `expired`
+    - A comment heartbeat is sent every `SSE_HEARTBEAT` seconds
+    
+    Clients only need to poll /syncTasks after (re)connecting.
+    """
+    user = await authenticate(authorization)
+    subscription = hub.subscribe(user["uid"], expires_at=user.get("token_expires_at"))
+    logger.info("Event stream %s opened for user %s", subscription.id, user["uid"])
+    return StreamingResponse(
+        hub.stream(subscription, config.SSE_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Metrics Endpoint
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    tags=["Health"]
+)
+async def get_metrics():
+    """
+    Prometheus metrics in the text exposition format.
+
+    Includes per-endpoint request latency histograms and in-flight gauges, backend
+    (auth, Firestore, Storage) call counts and latencies labelled by endpoint and
+    operation, and cache hit ratios.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 # Root Endpoint
+READ_ROOT_PAYLOAD = PrecomputedJSON({
+    "status": "success",
+    "message": "Genesis AI Backend is running!",
+    "version": "1.0.0",
+    "endpoints": [
+        {"path": "/sendMessage", "method": "POST", "description": "Send a new message"},
+        {"path": "/importFile", "method": "POST", "description": "Import a file"},
+        {"path": "/toggleRoot", "method": "POST", "description": "Toggle root access"},
+        {"path": "/getAiQuestions", "method": "GET", "description": "Get AI questions"},
+        {"path": "/syncTasks", "method": "POST", "description": "Synchronize tasks"}
+    ]
+})
+
 @app.get("/")
 async def read_root():
-    return {
-        "status": "success",
-        "message": "Genesis AI Backend is running!",
-        "version": "1.0.0",
-        "endpoints": [
-            {"path": "/sendMessage", "method": "POST", "description": "Send a new message"},
-            {"path": "/importFile", "method": "POST", "description": "Import a file"},
-            {"path": "/toggleRoot", "method": "POST", "description": "Toggle root access"},
-            {"path": "/getAiQuestions", "method": "GET", "description": "Get AI questions"},
-            {"path": "/syncTasks", "method": "POST", "description": "Synchronize tasks"}
-        ]
-    }
+    return READ_ROOT_PAYLOAD.response()
 
 # Error Handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"status": "error", "message": str(exc.detail)},
+        headers=getattr(exc, "headers", None),
     )
 
 # Server Startup
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run("app:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    from .__main__ import main
+    main()
\ No newline at end of file
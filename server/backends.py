@@ -0,0 +1,97 @@
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from . import config
+from .repositories import Repositories, create_repositories
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_repositories: Optional[Repositories] = None
+_firebase_ready = False
+
+# Milliseconds spent in each initialization step of this process
+timings: Dict[str, float] = {}
+
+
+@contextmanager
+def _timed(step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[step] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def init_firebase() -> None:
+    """Initialize the default Firebase app for this process (idempotent)."""
+    global _firebase_ready
+    if _firebase_ready:
+        return
+    with _lock:
+        if _firebase_ready:
+            return
+        with _timed("import_firebase_admin"):
+            import firebase_admin
+            from firebase_admin import credentials
+        # Check if Firebase app is already initialized to avoid error on hot reload
+        if not firebase_admin._apps:
+            with _timed("initialize_firebase"):
+                cred = credentials.Certificate(config.FIREBASE_CONFIG["service_account"])
+                firebase_admin.initialize_app(cred, {
+                    'databaseURL': config.FIREBASE_CONFIG["database_url"],
+                    'storageBucket': config.FIREBASE_CONFIG["storage_bucket"]
+                })
+            logger.info("Firebase Admin SDK initialized successfully")
+        _firebase_ready = True
+
+
+def get_repositories() -> Repositories:
+    """
+    Return this process's repositories, creating them on first use.
+
+    Nothing is imported or connected until then, so pre-forked workers each build
+    their own clients after the fork instead of inheriting them from the parent.
+    """
+    global _repositories
+    if _repositories is None:
+        with _lock:
+            if _repositories is None:
+                init_firebase()
+                with _timed("create_repositories"):
+                    _repositories = create_repositories(config.STORAGE_BACKEND)
+                logger.info("Using '%s' storage backend", config.STORAGE_BACKEND)
+    return _repositories
+
+
+def initialize() -> Dict[str, float]:
+    """Initialize Firebase and the repositories now; returns the step timings (ms)."""
+    get_repositories()
+    return dict(timings)
+
+
+class LazyRepositories:
+    """Stand-in for ``Repositories`` that initializes the backends on first attribute access."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_repositories(), name)
+
+
+class LazyModule:
+    """Imports ``name`` (after calling ``before``) on first attribute access."""
+
+    def __init__(self, name: str, before: Optional[Callable[[], None]] = None):
+        self._name = name
+        self._before = before
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            if self._before is not None:
+                self._before()
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
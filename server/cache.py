@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry and LRU eviction.
+
+    Every entry carries its own absolute expiry (monotonic seconds), so callers can
+    expire an item at whichever deadline comes first (e.g. a token's ``exp`` claim or
+    a fixed TTL). When the cache is full the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, name: str = "cache"):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None) -> None:
+        """
+        Store a value.
+
+        - **ttl**: Lifetime in seconds (defaults to the cache TTL)
+        - **expires_at**: Absolute wall-clock deadline (epoch seconds); the entry
+          expires at the earlier of this and ``ttl``
+        """
+        lifetime = self.ttl if ttl is None else ttl
+        if expires_at is not None:
+            lifetime = min(lifetime, expires_at - time.time())
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + lifetime)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class Generations:
+    """
+    Per-user write counters that version cached reads of that user's data.
+
+    Every write stamps the user with a new value from one process-wide counter.
+    The table is LRU-bounded; a user evicted from it reads as the highest value
+    ever evicted, which is at least their last stamp. Reads cached before their
+    last write therefore never match again, while reads cached since stay valid.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._stamps: "OrderedDict[str, int]" = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, uid: str) -> int:
+        with self._lock:
+            return self._stamps.get(uid, self._floor)
+
+    def bump(self, uid: str) -> None:
+        with self._lock:
+            self._counter += 1
+            self._stamps[uid] = self._counter
+            self._stamps.move_to_end(uid)
+            while len(self._stamps) > self.maxsize:
+                _, stamp = self._stamps.popitem(last=False)
+                self._floor = max(self._floor, stamp)
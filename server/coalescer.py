@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .datastore import firestore_pool
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batched writes with more than 500 operations
+MAX_BATCH_WRITES = 500
+
+
+class WriteCoalescer:
+    """
+    Group-commit concurrent inserts into one batched write.
+
+    Callers ``await submit(document)``; documents are collected for up to
+    ``max_delay`` seconds or until ``max_batch`` are pending, then handed to the
+    blocking ``commit`` function (run on ``firestore_pool``) as one list. ``commit``
+    must return one result (e.g. the generated document ID) per document, in order,
+    and each caller's future is resolved with its own result. If the commit fails
+    or returns the wrong number of results, every caller in that batch receives the
+    exception; if it is cancelled, so are the callers.
+    """
+
+    def __init__(self, name: str, commit: Callable[[List[Any]], List[Any]], max_batch: int, max_delay: float):
+        self.name = name
+        self.commit = commit
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_WRITES))
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._commits: set = set()
+        self.batches = 0
+        self.documents = 0
+        self.failed_batches = 0
+        self.max_batch_seen = 0
+        self.commit_seconds_total = 0.0
+        self.commit_seconds_max = 0.0
+        self.last_commit_seconds = 0.0
+
+    async def submit(self, document: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        future = loop.create_future()
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        task = asyncio.ensure_future(self._commit(pending))
+        self._commits.add(task)
+        task.add_done_callback(self._commits.discard)
+
+    async def _commit(self, pending: List[Tuple[Any, asyncio.Future]]) -> None:
+        started = time.perf_counter()
+        try:
+            results = await firestore_pool.run(self.commit, [document for document, _ in pending])
+            if len(results) != len(pending):
+                raise RuntimeError(f"commit returned {len(results)} results for {len(pending)} documents")
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error("%s batch of %d failed: %s", self.name, len(pending), e)
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancelled mid-commit: never leave a caller waiting forever
+            for _, future in pending:
+                if not future.done():
+                    future.cancel()
+            elapsed = time.perf_counter() - started
+            self.batches += 1
+            self.documents += len(pending)
+            self.max_batch_seen = max(self.max_batch_seen, len(pending))
+            self.commit_seconds_total += elapsed
+            self.commit_seconds_max = max(self.commit_seconds_max, elapsed)
+            self.last_commit_seconds = elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_batch": self.max_batch,
+            "max_delay": self.max_delay,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "documents": self.documents,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(self.documents / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_commit_ms": round(self.commit_seconds_total / self.batches * 1000, 2) if self.batches else 0.0,
+            "max_commit_ms": round(self.commit_seconds_max * 1000, 2),
+            "last_commit_ms": round(self.last_commit_seconds * 1000, 2),
+        }
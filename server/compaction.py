@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Any, Callable, Dict, Optional
+
+from . import config
+from .datastore import firestore_pool
+from .repositories import ChangePosition, LeaseRepository, TaskRepository
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "task-compaction"
+
+
+def horizon_start(horizon: float) -> int:
+    """Server stamp (ms) before which tombstones may be purged."""
+    return int((time.time() - horizon) * 1000)
+
+
+async def behind_watermark(tasks_repo: TaskRepository, uid: str, position: ChangePosition) -> bool:
+    """
+    Whether a client at ``position`` may have missed purged tombstones and needs a
+    full resync. Cursors within the horizon are past anything compaction may have
+    purged, so only older ones cost a watermark read.
+    """
+    updated_at, task_id = position
+    if updated_at >= horizon_start(config.TASK_TOMBSTONE_HORIZON):
+        return False
+    watermark = await firestore_pool.run(tasks_repo.tombstone_watermark, uid)
+    if watermark is None:
+        return False
+    if not task_id:
+        # "After everything stamped at updated_at"
+        return updated_at < watermark[0]
+    return position < watermark
+
+
+class TombstoneCompactor:
+    """
+    Purges deleted tasks that no client still needs, in batched background passes.
+
+    Sync delivers deletions as tombstones (``is_deleted`` tasks), which otherwise
+    stay in storage forever and slow every change query. A cursor that is more
+    than ``horizon`` seconds old belongs to a client that has been away that
+    long, so tombstones older than that are purged, oldest first, in batches of
+    ``batch_size`` and at most ``max_batches`` per pass. Each batch raises the
+    user's watermark; a client whose cursor is behind it is sent a full resync
+    instead of a delta that would be missing the purged deletions.
+
+    A pass holds a lease in the storage backend, so with several workers (on
+    any number of hosts) only one compacts at a time.
+    """
+
+    def __init__(self, interval: float, horizon: float, batch_size: int, max_batches: int, lease: float, name: str = "tasks"):
+        self.name = name
+        self.interval = interval
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.passes = 0
+        self.skipped = 0
+        self.reclaimed = 0
+        self.errors = 0
+        self.last_pass_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_pass(self, tasks_repo: TaskRepository, leases: LeaseRepository) -> int:
+        """Purge one pass worth of tombstones; returns how many were reclaimed."""
+        if not await firestore_pool.run(leases.acquire, LEASE_NAME, self.owner, self.lease, operation="compaction_lease"):
+            # Another worker is compacting
+            self.skipped += 1
+            return 0
+
+        started = time.monotonic()
+        before = horizon_start(self.horizon)
+        # Deletes and the users' watermarks are written together
+        limit = min(self.batch_size, tasks_repo.max_batch_writes // 2)
+        reclaimed = 0
+        try:
+            for _ in range(self.max_batches):
+                purged = await firestore_pool.run(tasks_repo.purge_tombstones, before, limit)
+                count = sum(purged.values())
+                reclaimed += count
+                self.reclaimed += count
+                if count < limit:
+                    break
+        finally:
+            await firestore_pool.run(leases.release, LEASE_NAME, self.owner, operation="compaction_lease")
+            self.passes += 1
+            self.last_pass_seconds = round(time.monotonic() - started, 3)
+        if reclaimed:
+            logger.info("Purged %d task tombstones older than %gs in %.2fs", reclaimed, self.horizon, self.last_pass_seconds)
+        return reclaimed
+
+    def start(self, tasks_repo: Callable[[], TaskRepository], leases: Callable[[], LeaseRepository]) -> None:
+        """Run a pass every ``interval`` seconds (never, if ``interval`` is 0)."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(tasks_repo, leases))
+
+    async def _run(self, tasks_repo: Callable[[], TaskRepository], leases: Callable[[], LeaseRepository]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_pass(tasks_repo(), leases())
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Tombstone compaction failed: %s", e)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "passes": self.passes,
+            "skipped": self.skipped,
+            "reclaimed": self.reclaimed,
+            "errors": self.errors,
+            "last_pass_seconds": self.last_pass_seconds,
+        }
+
+
+tombstone_compactor = TombstoneCompactor(
+    interval=config.TASK_COMPACTION_INTERVAL,
+    horizon=config.TASK_TOMBSTONE_HORIZON,
+    batch_size=config.TASK_COMPACTION_BATCH_SIZE,
+    max_batches=config.TASK_COMPACTION_MAX_BATCHES,
+    lease=config.TASK_COMPACTION_LEASE
+)
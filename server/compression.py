@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # a dependency, but a slim install without it still serves gzip
+    brotli = None
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+# Content types worth compressing; anything else (images, archives, event streams) passes through
+COMPRESSIBLE_TYPES = (
+    b"application/json", b"application/x-ndjson", b"application/msgpack", b"application/javascript",
+    b"application/xml", b"text/plain", b"text/html", b"text/css", b"text/csv",
+)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """``"br;q=1.0, gzip;q=0.8, *;q=0"`` -> ``{"br": 1.0, "gzip": 0.8, "*": 0.0}``"""
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+class _Stream:
+    """Incremental encoder for a streamed body; every chunk is flushed so progress reaches the client."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(chunk) + self._brotli.flush()
+        return self._zlib.compress(chunk) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class ResponseCompression:
+    """
+    Content-Encoding negotiation and counters shared by every ``CompressionMiddleware``.
+
+    ``encodings`` lists the codings offered in order of preference; ``br`` is
+    dropped, with a warning, when brotli is not installed. Bodies smaller than ``minimum_size``
+    are sent as they are: below about a kilobyte the saving does not pay for
+    the CPU time and the extra header. Bodies of ``thread_size`` bytes or more
+    are compressed on a worker thread (zlib and brotli release the GIL), so a
+    large sync page does not stall the event loop for milliseconds.
+    """
+
+    def __init__(
+        self,
+        encodings: Iterable[str],
+        minimum_size: int,
+        gzip_level: int,
+        brotli_quality: int,
+        thread_size: int = 64 * 1024,
+        name: str = "http"
+    ):
+        self.name = name
+        offered = [encoding.strip().lower() for encoding in encodings]
+        self.encodings = [encoding for encoding in offered if encoding == "gzip" or (encoding == "br" and brotli is not None)]
+        if "br" in offered and brotli is None:
+            logger.warning("brotli is not installed; %s responses are not brotli-compressed", name)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.thread_size = thread_size
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """The preferred offered coding the client accepts, or ``None`` for identity."""
+        if not accept_encoding or not self.encodings:
+            return None
+        weights = parse_accept_encoding(accept_encoding)
+        best, best_weight = None, 0.0
+        for encoding in self.encodings:
+            weight = weights.get(encoding, weights.get("*", 0.0))
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return zlib.compress(body, self.gzip_level, wbits=16 + zlib.MAX_WBITS)
+
+    async def compress_async(self, body: bytes, encoding: str) -> bytes:
+        started = time.perf_counter()
+        if len(body) >= self.thread_size:
+            compressed = await asyncio.to_thread(self.compress, body, encoding)
+        else:
+            compressed = self.compress(body, encoding)
+        profiling.add("compress", time.perf_counter() - started)
+        self.count(len(body), len(compressed))
+        return compressed
+
+    def stream(self, encoding: str) -> _Stream:
+        return _Stream(encoding, self.gzip_level, self.brotli_quality)
+
+    def count(self, size: int, compressed_size: int) -> None:
+        self.compressed += 1
+        self.bytes_in += size
+        self.bytes_out += compressed_size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "encodings": ",".join(self.encodings),
+            "compressed": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+        }
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with gzip or brotli, as negotiated by ``Accept-Encoding``.
+
+    Only compressible content types are touched, and a body sent in one piece
+    only when it has at least ``minimum_size`` bytes; partial content, bodies
+    that are already encoded and Server-Sent Events pass through. A streamed
+    body is compressed chunk by chunk. A strong ``ETag`` is weakened, since the
+    compressed bytes differ from the identity representation.
+    """
+
+    def __init__(self, app, compression: ResponseCompression):
+        self.app = app
+        self.compression = compression
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = self.compression.negotiate(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Dict[str, Any]] = None
+        stream: Optional[_Stream] = None
+        passthrough = False
+        size = compressed_size = 0
+
+        async def compressing_send(message):
+            nonlocal start, stream, passthrough, size, compressed_size
+            if message["type"] == "http.response.start":
+                start = message
+                passthrough = not self._compressible(message)
+                if passthrough:
+                    await send(self._vary(message) if self._eligible_type(message) else message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                if not more_body:
+                    # Complete body in one message
+                    if len(body) < self.compression.minimum_size:
+                        await send(self._vary(start))
+                        await send(message)
+                    else:
+                        compressed = await self.compression.compress_async(body, encoding)
+                        await send(self._encoded_start(start, encoding, len(compressed)))
+                        await send({"type": "http.response.body", "body": compressed})
+                    return
+                stream = self.compression.stream(encoding)
+                await send(self._encoded_start(start, encoding, None))
+            chunk = stream.write(body) if body else b""
+            if not more_body:
+                chunk += stream.finish()
+            size += len(body)
+            compressed_size += len(chunk)
+            if not more_body:
+                self.compression.count(size, compressed_size)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    @staticmethod
+    def _header(message: Dict[str, Any], name: bytes) -> Optional[bytes]:
+        for key, value in message.get("headers", []):
+            if key.lower() == name:
+                return value
+        return None
+
+    def _eligible_type(self, message: Dict[str, Any]) -> bool:
+        content_type = (self._header(message, b"content-type") or b"").split(b";")[0].strip().lower()
+        return content_type in COMPRESSIBLE_TYPES
+
+    def _compressible(self, message: Dict[str, Any]) -> bool:
+        return (
+            message["status"] != 206
+            and self._header(message, b"content-encoding") is None
+            and self._header(message, b"content-range") is None
+            and self._eligible_type(message)
+        )
+
+    @staticmethod
+    def _vary(message: Dict[str, Any]) -> Dict[str, Any]:
+        headers: List[Tuple[bytes, bytes]] = []
+        vary = []
+        for name, value in message.get("headers", []):
+            if name.lower() == b"vary":
+                vary.extend(part.strip() for part in value.split(b",") if part.strip())
+            else:
+                headers.append((name, value))
+        if not any(part.lower() == b"accept-encoding" for part in vary):
+            vary.append(b"Accept-Encoding")
+        headers.append((b"vary", b", ".join(vary)))
+        return {**message, "headers": headers}
+
+    def _encoded_start(self, message: Dict[str, Any], encoding: str, length: Optional[int]) -> Dict[str, Any]:
+        message = self._vary(message)
+        headers = []
+        for name, value in message["headers"]:
+            lowered = name.lower()
+            if lowered == b"content-length":
+                continue
+            if lowered == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**message, "headers": headers}
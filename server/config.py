@@ -4,71 +4,231 @@ from pathlib import Path
 # Base directory
 BASE_DIR = Path(__file__).parent
 
-# Server settings
-HOST = "0.0.0.0"
-PORT = 8000
-DEBUG = True
-RELOAD = True
+# Server settings ("production" runs WORKERS processes without reload)
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+DEBUG = ENVIRONMENT != "production"
+RELOAD = os.getenv("RELOAD", str(DEBUG)).lower() in ("1", "true", "yes")
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1)) if not RELOAD else 1
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 10))  # seconds; ends open event streams
 
 # Firebase settings
 FIREBASE_CONFIG = {
     "project_id": "auraframefx",
     "storage_bucket": "auraframefx.appspot.com",
+    "database_url": "https://auraframefx.firebaseio.com",
     "service_account": str(BASE_DIR / "credentials" / "auraframefx-firebase-adminsdk-fbsvc-9c493ac034.json")
 }
 
+# Storage backend: "firestore" (Firestore + Cloud Storage) or "sql" (SQLAlchemy + local files)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{BASE_DIR / 'data' / 'genesis.db'}")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 10))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", 20))
+LOCAL_BLOB_DIR = os.getenv("LOCAL_BLOB_DIR", str(BASE_DIR / "data" / "blobs"))
+LOCAL_BLOB_URL = os.getenv("LOCAL_BLOB_URL", "/blobs")
+
+# Auth cache settings
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 3600))  # seconds, capped by the token's exp claim
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", 60))  # seconds
+
+# Backend call settings (blocking SDK calls run on a shared thread pool)
+AUTH_MAX_CONCURRENCY = int(os.getenv("AUTH_MAX_CONCURRENCY", 8))
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", 10))  # seconds
+FIRESTORE_MAX_CONCURRENCY = int(os.getenv("FIRESTORE_MAX_CONCURRENCY", 32))
+FIRESTORE_TIMEOUT = float(os.getenv("FIRESTORE_TIMEOUT", 15))  # seconds
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", 16))
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", 60))  # seconds
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 2))
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 60))  # seconds
+
+# Upload settings
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))  # 10MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))  # must be a multiple of 256KB
+UPLOAD_MULTIPART_OVERHEAD = 64 * 1024  # allowance for multipart headers and boundaries
+# Reuse the stored object when identical bytes are imported again: "user" (per-user index),
+# "global" (one index for everyone; reveals to a user that someone uploaded the same file) or "off"
+UPLOAD_DEDUP = os.getenv("UPLOAD_DEDUP", "user")
+
+# Media pipeline: image variants (Pillow) and text previews of documents (pypdf for PDFs),
+# derived from uploads in worker processes and stored next to the original
+MEDIA_PROCESSES = int(os.getenv("MEDIA_PROCESSES", 1))  # per server worker; 0 disables processing
+MEDIA_CONCURRENCY = int(os.getenv("MEDIA_CONCURRENCY", 2))  # jobs downloading, processing or storing at once
+MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", 200))  # waiting jobs; past this, uploads are marked failed
+MEDIA_MAX_RETRIES = int(os.getenv("MEDIA_MAX_RETRIES", 3))
+MEDIA_RETRY_DELAY = float(os.getenv("MEDIA_RETRY_DELAY", 2.0))  # seconds, doubled per attempt
+MEDIA_MAX_TASKS_PER_CHILD = int(os.getenv("MEDIA_MAX_TASKS_PER_CHILD", 200))  # jobs before a process is replaced
+MEDIA_IMAGE_SIZES = os.getenv("MEDIA_IMAGE_SIZES", "thumb:256,medium:1024")  # name:longest side in pixels
+MEDIA_IMAGE_FORMAT = os.getenv("MEDIA_IMAGE_FORMAT", "webp")  # "webp", "jpeg" or "png"
+MEDIA_IMAGE_QUALITY = int(os.getenv("MEDIA_IMAGE_QUALITY", 80))
+MEDIA_MAX_PIXELS = int(os.getenv("MEDIA_MAX_PIXELS", 50_000_000))  # larger images are refused undecoded
+MEDIA_PREVIEW_CHARS = int(os.getenv("MEDIA_PREVIEW_CHARS", 2000))
+
+# Background post-processing queue
+POSTPROCESS_QUEUE_SIZE = int(os.getenv("POSTPROCESS_QUEUE_SIZE", 1000))
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", 4))
+POSTPROCESS_MAX_RETRIES = int(os.getenv("POSTPROCESS_MAX_RETRIES", 3))
+POSTPROCESS_RETRY_DELAY = float(os.getenv("POSTPROCESS_RETRY_DELAY", 1.0))  # seconds, doubled per attempt
+
+# Task sync settings
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", 200))
+SYNC_MAX_PAGE_SIZE = int(os.getenv("SYNC_MAX_PAGE_SIZE", 1000))
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 400))  # writes per batch, at most 500
+# Concurrent identical change-page reads (one user's devices syncing together) share one
+# query; a page can also be kept for SYNC_READ_CACHE_TTL seconds (0 disables)
+SYNC_READ_CACHE_TTL = float(os.getenv("SYNC_READ_CACHE_TTL", 0))
+SYNC_READ_CACHE_SIZE = int(os.getenv("SYNC_READ_CACHE_SIZE", 1000))  # change pages kept per worker
+SYNC_MAX_USERS = int(os.getenv("SYNC_MAX_USERS", 100000))  # users whose task write generation is tracked
+# Deleted tasks (tombstones) older than the horizon are purged in the background; a client
+# whose cursor is behind what was purged gets a full resync
+TASK_TOMBSTONE_HORIZON = float(os.getenv("TASK_TOMBSTONE_HORIZON", 30 * 24 * 3600))  # seconds
+TASK_COMPACTION_INTERVAL = float(os.getenv("TASK_COMPACTION_INTERVAL", 3600))  # seconds between passes, 0 disables
+TASK_COMPACTION_BATCH_SIZE = int(os.getenv("TASK_COMPACTION_BATCH_SIZE", 200))  # tombstones per write
+TASK_COMPACTION_MAX_BATCHES = int(os.getenv("TASK_COMPACTION_MAX_BATCHES", 50))  # writes per pass
+TASK_COMPACTION_LEASE = float(os.getenv("TASK_COMPACTION_LEASE", 600))  # seconds one worker holds the pass
+
+# Message write coalescing
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", 100))  # documents per commit, at most 500
+MESSAGE_BATCH_DELAY = float(os.getenv("MESSAGE_BATCH_DELAY", 0.005))  # seconds to wait for more inserts
+
+# Message history (/messages)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", 1000))  # encoded pages kept per worker
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", 30))  # seconds; bounds staleness from writes on other workers
+HISTORY_MAX_USERS = int(os.getenv("HISTORY_MAX_USERS", 100000))  # users whose write generation is tracked
+
+# Bulk message ingest (/ingestMessages)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 200))  # documents per batched write, at most 500
+INGEST_MAX_ITEM_BYTES = int(os.getenv("INGEST_MAX_ITEM_BYTES", 64 * 1024))  # largest single message item
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", 100000))  # items per request
+INGEST_SPOOL_SIZE = int(os.getenv("INGEST_SPOOL_SIZE", 1024 * 1024))  # result bytes kept in memory before spilling to disk
+
+# Idempotency-Key support for retried writes: the first request with a key runs, duplicates
+# get its stored response. "memory" keeps records per worker; "shared" keeps them in the
+# storage backend, so a retry routed to another worker is caught too
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))  # records per worker ("memory")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))  # seconds a result is replayed
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE", 120))  # seconds before an abandoned claim expires
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 30))  # duplicate waits this long, then 409
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", 64 * 1024))  # larger results are not replayed
+IDEMPOTENCY_FINGERPRINT_BYTES = int(os.getenv("IDEMPOTENCY_FINGERPRINT_BYTES", 64 * 1024))  # bodies up to this are hashed
+# /syncTasks is left out: it is idempotent by design (last writer wins) and its pages are large
+IDEMPOTENCY_ROUTES = ["/sendMessage", "/ingestMessages", "/importFile", "/toggleRoot"]
+
+# Response compression, negotiated through Accept-Encoding
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "br,gzip")  # in order of preference; empty disables
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # smaller bodies are sent as they are
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 4))  # 1-9; 6 is ~2x the CPU for ~8% smaller sync pages
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))  # 0-11; higher costs much more CPU
+COMPRESSION_THREAD_SIZE = int(os.getenv("COMPRESSION_THREAD_SIZE", 64 * 1024))  # larger bodies are compressed off the event loop
+
+# Slow-request log: per-phase timings of the latest requests over the threshold, per worker
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", 0.5))  # seconds
+SLOW_REQUEST_LOG_SIZE = int(os.getenv("SLOW_REQUEST_LOG_SIZE", 200))  # entries kept; 0 disables tracing
+SLOW_REQUEST_EXCLUDED = ["/events", "/admin/profile"]  # long-lived by design
+
+# On-demand sampling profiler (/admin/profile)
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.01))  # seconds between stack samples
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 120))  # longest session
+
+# Server-Sent Events push channel (/events)
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", 100))  # undelivered events per stream before it must resync
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))  # seconds between keep-alive comments
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))  # client reconnect delay
+SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", 10000))  # per worker process
+SSE_MAX_CONNECTIONS_PER_USER = int(os.getenv("SSE_MAX_CONNECTIONS_PER_USER", 10))
+
+# Settings cache: every document of the settings collection, kept in memory per worker
+SETTINGS_POLL_INTERVAL = float(os.getenv("SETTINGS_POLL_INTERVAL", 5))  # seconds; propagation delay without a change listener
+SETTINGS_RESYNC_INTERVAL = float(os.getenv("SETTINGS_RESYNC_INTERVAL", 300))  # seconds between full reloads with a listener
+
+# AI question pool: generated in the background and served from memory
+QUESTION_GENERATOR = os.getenv("QUESTION_GENERATOR", "local")  # "local" or "vertex"
+QUESTION_POOL_SIZE = int(os.getenv("QUESTION_POOL_SIZE", 500))
+QUESTION_POOL_LOW_WATERMARK = int(os.getenv("QUESTION_POOL_LOW_WATERMARK", 100))  # refill below this
+QUESTION_BATCH_SIZE = int(os.getenv("QUESTION_BATCH_SIZE", 25))  # questions per generator call
+QUESTION_RECENT_PER_USER = int(os.getenv("QUESTION_RECENT_PER_USER", 50))  # not repeated to a user
+QUESTION_MAX_USERS = int(os.getenv("QUESTION_MAX_USERS", 10000))
+VERTEX_PROJECT = os.getenv("VERTEX_PROJECT", FIREBASE_CONFIG["project_id"])
+VERTEX_LOCATION = os.getenv("VERTEX_LOCATION", "us-central1")
+VERTEX_MODEL = os.getenv("VERTEX_MODEL", "gemini-1.5-flash")
+
+# Admission control: per-user token buckets (rate/s, burst) and per-class concurrency
+# caps; requests waiting longer than queue_timeout seconds for a slot get a 503
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_MAX_USERS = int(os.getenv("ADMISSION_MAX_USERS", 100000))  # tracked token buckets per class
+ADMISSION_CLASSES = {
+    "read": {
+        "rate": float(os.getenv("READ_RATE_LIMIT", 20)),
+        "burst": int(os.getenv("READ_RATE_BURST", 100)),
+        "max_concurrency": int(os.getenv("READ_MAX_CONCURRENCY", 512)),
+        "max_queue": int(os.getenv("READ_MAX_QUEUE", 1024)),
+        "queue_timeout": float(os.getenv("READ_QUEUE_TIMEOUT", 0.5)),
+    },
+    "write": {
+        "rate": float(os.getenv("WRITE_RATE_LIMIT", 10)),
+        "burst": int(os.getenv("WRITE_RATE_BURST", 50)),
+        "max_concurrency": int(os.getenv("WRITE_MAX_CONCURRENCY", 256)),
+        "max_queue": int(os.getenv("WRITE_MAX_QUEUE", 512)),
+        "queue_timeout": float(os.getenv("WRITE_QUEUE_TIMEOUT", 0.5)),
+    },
+    "sync": {
+        "rate": float(os.getenv("SYNC_RATE_LIMIT", 2)),
+        "burst": int(os.getenv("SYNC_RATE_BURST", 10)),
+        "max_concurrency": int(os.getenv("SYNC_MAX_CONCURRENCY", 64)),
+        "max_queue": int(os.getenv("SYNC_MAX_QUEUE", 128)),
+        "queue_timeout": float(os.getenv("SYNC_QUEUE_TIMEOUT", 1.0)),
+    },
+    "upload": {
+        "rate": float(os.getenv("UPLOAD_RATE_LIMIT", 1)),
+        "burst": int(os.getenv("UPLOAD_RATE_BURST", 5)),
+        "max_concurrency": int(os.getenv("UPLOAD_MAX_CONCURRENCY", 32)),
+        "max_queue": int(os.getenv("UPLOAD_MAX_QUEUE", 64)),
+        "queue_timeout": float(os.getenv("UPLOAD_QUEUE_TIMEOUT", 2.0)),
+    },
+}
+ADMISSION_DEFAULT_CLASS = "read"
+ADMISSION_ROUTES = {
+    "/sendMessage": "write",
+    "/ingestMessages": "write",
+    "/toggleRoot": "write",
+    "/syncTasks": "sync",
+    "/importFile": "upload",
+}
+
 # CORS settings
 CORS_ORIGINS = ["*"]
 ALLOW_CREDENTIALS = True
 
-# Logging settings
+# Logging: callers only enqueue records; one listener thread per process formats and writes them
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json" (one object per line)
+LOG_TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+LOG_FILE = os.getenv("LOG_FILE", str(BASE_DIR / "logs" / "server.log"))  # empty to log to stdout only
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024))  # 10MB, then rotate
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", 3))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # past this, routine records are dropped
+# Fraction of routine (below WARNING) records kept per logger and its children, e.g.
+# "uvicorn.access=0.01,server.app=0.1"; warnings and errors are always kept
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+# Passed to uvicorn: its loggers propagate to the root logger, which the log pipeline
+# (server/logpipeline.py) routes through its queue
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "standard": {
-            "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-        },
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "standard",
-            "level": "INFO",
-            "stream": "ext://sys.stdout"
-        },
-        "file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "standard",
-            "filename": str(BASE_DIR / "logs" / "server.log"),
-            "maxBytes": 10485760,  # 10MB
-            "backupCount": 3,
-            "encoding": "utf8"
-        }
-    },
     "loggers": {
-        "": {
-            "handlers": ["console", "file"],
-            "level": "INFO",
-            "propagate": True
-        },
-        "uvicorn": {
-            "handlers": ["console", "file"],
-            "level": "INFO",
-            "propagate": False
-        },
-        "uvicorn.error": {
-            "level": "INFO",
-            "handlers": ["console", "file"],
-            "propagate": False
-        },
-        "uvicorn.access": {
-            "handlers": ["console", "file"],
-            "level": "INFO",
-            "propagate": False
-        }
+        "uvicorn": {"handlers": [], "level": "INFO", "propagate": True},
+        "uvicorn.error": {"handlers": [], "level": "INFO", "propagate": True},
+        "uvicorn.access": {"handlers": [], "level": "INFO", "propagate": True},
     }
 }
 
-# Create logs directory if it doesn't exist
+# Create logs and data directories if they don't exist
 os.makedirs(BASE_DIR / "logs", exist_ok=True)
+os.makedirs(BASE_DIR / "data", exist_ok=True)
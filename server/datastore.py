@@ -0,0 +1,154 @@
+import asyncio
+import functools
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from . import config
+from .metrics import observe_backend_call
+
+logger = logging.getLogger(__name__)
+
+
+class BackendTimeoutError(HTTPException):
+    """Raised when a backend call does not complete within its time budget."""
+
+    def __init__(self, pool: str, timeout: float):
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Backend '{pool}' did not respond within {timeout:g}s"
+        )
+        self.pool = pool
+        self.timeout = timeout
+
+
+class BackendPool:
+    """
+    Runs blocking firebase_admin SDK calls on a shared thread pool so they never
+    block the event loop.
+
+    Each pool has its own concurrency limit and default per-call timeout. A call
+    holds its slot until the underlying SDK call has actually returned, even if the
+    caller already gave up on it, so the limit bounds real backend concurrency.
+
+    Every call is counted and timed in ``metrics``, labelled by the endpoint being
+    served, the pool and the operation (the function name, or ``operation=``).
+    """
+
+    def __init__(self, name: str, max_concurrency: int, timeout: float, executor: ThreadPoolExecutor):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = executor
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        operation: Optional[str] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Run ``fn(*args, **kwargs)`` on the backend executor and await its result.
+
+        - **timeout**: Seconds to wait, including time spent queued for a slot
+          (defaults to the pool timeout)
+        - **operation**: Metrics label for the call (defaults to ``fn.__name__``)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        operation = operation or getattr(fn, "__name__", type(fn).__name__)
+        started = time.monotonic()
+        deadline = started + timeout
+        semaphore = self._semaphore()
+        self.calls += 1
+
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            observe_backend_call(self.name, operation, "timeout", time.monotonic() - started)
+            raise BackendTimeoutError(self.name, timeout)
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self.in_flight -= 1
+            semaphore.release()
+            raise
+        future.add_done_callback(functools.partial(self._release, semaphore))
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            observe_backend_call(self.name, operation, "timeout", time.monotonic() - started)
+            logger.warning("%s call %r timed out after %gs", self.name, operation, timeout)
+            raise BackendTimeoutError(self.name, timeout)
+        except Exception:
+            self.errors += 1
+            observe_backend_call(self.name, operation, "error", time.monotonic() - started)
+            raise
+        observe_backend_call(self.name, operation, "ok", time.monotonic() - started)
+        task = asyncio.current_task()
+        if task is not None and task.cancelling():
+            # Before Python 3.12, wait_for returns the result instead of raising when the
+            # caller is cancelled just as the call completes; don't swallow the cancel
+            raise asyncio.CancelledError()
+        return result
+
+    def _release(self, semaphore: asyncio.Semaphore, future: asyncio.Future) -> None:
+        self.in_flight -= 1
+        semaphore.release()
+        if not future.cancelled():
+            # Retrieve the exception of abandoned calls so asyncio does not log it
+            future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+        }
+
+
+# Shared executor sized to the sum of all pool limits so no pool can starve another
+_executor = ThreadPoolExecutor(
+    max_workers=(
+        config.AUTH_MAX_CONCURRENCY + config.FIRESTORE_MAX_CONCURRENCY
+        + config.STORAGE_MAX_CONCURRENCY + config.AI_MAX_CONCURRENCY
+    ),
+    thread_name_prefix="backend"
+)
+
+auth_pool = BackendPool("auth", config.AUTH_MAX_CONCURRENCY, config.AUTH_TIMEOUT, _executor)
+firestore_pool = BackendPool("firestore", config.FIRESTORE_MAX_CONCURRENCY, config.FIRESTORE_TIMEOUT, _executor)
+storage_pool = BackendPool("storage", config.STORAGE_MAX_CONCURRENCY, config.STORAGE_TIMEOUT, _executor)
+ai_pool = BackendPool("ai", config.AI_MAX_CONCURRENCY, config.AI_TIMEOUT, _executor)
+
+
+def stats() -> list:
+    return [auth_pool.stats(), firestore_pool.stats(), storage_pool.stats(), ai_pool.stats()]
@@ -0,0 +1,118 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, status
+
+from . import config
+from .cache import Generations, TTLCache
+from .datastore import firestore_pool
+from .repositories import HistoryPosition, MessageRepository
+from .sync import decode_cursor, encode_cursor
+
+# Fields a client may request; ``id`` and ``timestamp`` are always returned
+HISTORY_FIELDS = ("message", "userId", "status")
+
+
+class HistoryPage:
+    """One encoded page of message history and its strong ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated projection; ``None`` means every field."""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in HISTORY_FIELDS + ("id", "timestamp")]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(HISTORY_FIELDS)}"
+        )
+    return sorted(set(requested) & set(HISTORY_FIELDS))
+
+
+def _timestamp_us(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp()) * 1_000_000 + value.microsecond
+
+
+def encode_position(position: HistoryPosition) -> str:
+    timestamp, message_id = position
+    return encode_cursor(_timestamp_us(timestamp), message_id)
+
+
+def decode_position(cursor: str) -> HistoryPosition:
+    timestamp_us, message_id = decode_cursor(cursor)
+    seconds, micros = divmod(timestamp_us, 1_000_000)
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=micros), message_id
+
+
+def _message(doc: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    # Same timestamp format as MessageResponse: naive UTC, ISO 8601
+    timestamp = doc["timestamp"].astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+    message = {"id": doc["id"], "timestamp": timestamp}
+    for field in HISTORY_FIELDS if fields is None else fields:
+        if field in doc:
+            message[field] = doc[field]
+    return message
+
+
+class MessageHistory:
+    """
+    Newest-first message history pages with a small cache of hot pages.
+
+    Pages are encoded once and cached with their ETag, so a conditional request
+    for a cached page is answered without touching Firestore or re-serializing.
+    The first page is keyed by the user's write generation (``record_write``
+    invalidates it); pages behind a cursor only hold older messages, which new
+    writes cannot change, so they are cached without one.
+    """
+
+    def __init__(self, cache_size: int, cache_ttl: float, max_users: int):
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl, name="history")
+        self.generations = Generations(max_users)
+
+    def record_write(self, uid: str) -> None:
+        self.generations.bump(uid)
+
+    async def page(
+        self,
+        messages_repo: MessageRepository,
+        uid: str,
+        cursor: Optional[str],
+        limit: int,
+        fields: Optional[List[str]]
+    ) -> HistoryPage:
+        before = decode_position(cursor) if cursor else None
+        key: Tuple[Any, ...] = (uid, cursor, limit, tuple(fields) if fields is not None else None)
+        if before is None:
+            key += (self.generations.get(uid),)
+        page = self.cache.get(key)
+        if page is not None:
+            return page
+
+        docs, has_more = await firestore_pool.run(messages_repo.history, uid, before, limit, fields, operation="message_history")
+        body = orjson.dumps({
+            "messages": [_message(doc, fields) for doc in docs],
+            "next_cursor": encode_position((docs[-1]["timestamp"], docs[-1]["id"])) if docs and has_more else None,
+            "has_more": has_more,
+        })
+        page = HistoryPage(body)
+        self.cache.set(key, page)
+        return page
+
+
+message_history = MessageHistory(
+    cache_size=config.HISTORY_CACHE_SIZE,
+    cache_ttl=config.HISTORY_CACHE_TTL,
+    max_users=config.HISTORY_MAX_USERS
+)
@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from . import config
+from .cache import TTLCache
+from .datastore import firestore_pool
+from .repositories import IdempotencyRepository
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_KEY_LENGTH = 255
+
+
+class MemoryIdempotencyBackend(IdempotencyRepository):
+    """Idempotency records in this process only: bounded, LRU-evicted and TTL-expired."""
+
+    def __init__(self, maxsize: int, name: str = "idempotency"):
+        self.records = TTLCache(maxsize=maxsize, name=name)
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, record: Dict[str, Any], lease: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            existing = self.records.get(key)
+            if existing is not None:
+                return existing
+            self.records.set(key, record, ttl=lease)
+            return None
+
+    def complete(self, key: str, record: Dict[str, Any], ttl: float) -> None:
+        self.records.set(key, record, ttl=ttl)
+
+    def release(self, key: str) -> None:
+        self.records.pop(key)
+
+
+class IdempotencyStore:
+    """
+    Runs each idempotency key at most once and keeps its result for replay.
+
+    Records live in this process (``shared`` unset) or in a shared backend that
+    every worker sees, reached through the Firestore pool. Within a process,
+    duplicates of a key that is being executed wait on a future for the first
+    execution instead of polling; a duplicate whose key is in flight on another
+    worker polls the shared record. Either way a duplicate gives up after
+    ``wait_timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        shared: Optional[Callable[[], IdempotencyRepository]],
+        cache_size: int,
+        ttl: float,
+        lease: float,
+        wait_timeout: float,
+        poll_interval: float = 0.1,
+        name: str = "idempotency"
+    ):
+        self.name = name
+        self.shared = shared
+        self.memory = MemoryIdempotencyBackend(cache_size) if shared is None else None
+        self.ttl = ttl
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.busy = 0
+
+    async def _call(self, method: str, *args: Any) -> Any:
+        if self.shared is None:
+            return getattr(self.memory, method)(*args)
+        return await firestore_pool.run(getattr(self.shared(), method), *args, operation=f"idempotency_{method}")
+
+    async def begin(self, key: str, fingerprint: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Claim ``key`` or wait for the execution that holds it.
+
+        Returns ``None`` when the caller now owns the key and must call ``finish``.
+        Otherwise returns the existing record: the completed result, or the
+        in-flight claim if it did not complete within ``wait_timeout``.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Executing in this process: wait for it, then look again
+                if not waited:
+                    waited = True
+                    self.waited += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.busy += 1
+                    return {"state": "in_flight", "fingerprint": None}
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Claim locally first, so duplicates in this process wait here rather
+            # than each asking the backend
+            future = self._pending[key] = asyncio.get_running_loop().create_future()
+            try:
+                existing = await self._call("reserve", key, {"state": "in_flight", "fingerprint": fingerprint}, self.lease)
+            except BaseException:
+                self._resolve(key)
+                raise
+            if existing is None:
+                self.executed += 1
+                return None
+            self._resolve(key)
+            if existing["state"] != "in_flight":
+                self.replayed += 1
+                return existing
+            # Executing on another worker
+            if time.monotonic() >= deadline:
+                self.busy += 1
+                return existing
+            await asyncio.sleep(self.poll_interval)
+
+    def _resolve(self, key: str) -> None:
+        future = self._pending.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def finish(self, key: str, result: Optional[Dict[str, Any]]) -> None:
+        """Store the result of an owned key, or release it (``None``) so it can run again."""
+        try:
+            if result is None:
+                await self._call("release", key)
+            else:
+                await self._call("complete", key, result, self.ttl)
+        except Exception as e:
+            logger.warning("Failed to record idempotency key result: %s", e)
+        finally:
+            self._resolve(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": len(self._pending),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "busy": self.busy,
+        }
+
+
+class _ResponseCapture:
+    """Copy of a response as it is sent, kept while it fits in ``max_bytes``."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.status: Optional[int] = None
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.complete = False
+
+    def add(self, message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            self.size += len(body)
+            if self.size <= self.max_bytes:
+                self.chunks.append(body)
+            if not message.get("more_body", False):
+                self.complete = True
+
+    def record(self, fingerprint: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The record to keep: only complete 2xx responses are replayed; anything else may be retried."""
+        if not self.complete or self.status is None or not 200 <= self.status < 300:
+            return None
+        return {
+            "state": "done",
+            "fingerprint": fingerprint,
+            "status": self.status,
+            "headers": [{"name": name.decode("latin-1"), "value": value.decode("latin-1")} for name, value in self.headers],
+            # Too large to keep: duplicates are told the request already ran
+            "body": b"".join(self.chunks) if self.size <= self.max_bytes else None,
+        }
+
+
+class IdempotencyMiddleware:
+    """
+    Execute a mutating request with an ``Idempotency-Key`` header at most once.
+
+    Keys are scoped to the authenticated user and the route. The first request
+    with a key runs normally and its 2xx response is stored; a retry with the
+    same key gets that response replayed (with ``Idempotent-Replayed: true``)
+    without running the endpoint again, so no second document or storage object
+    is written. A duplicate that arrives while the first is still running waits
+    for it. Error responses are not stored, so a failed request can be retried.
+
+    Small non-multipart bodies (up to ``fingerprint_bytes``) are hashed, and reusing
+    a key for a different body is rejected with 422. Requests whose token does not verify are
+    passed through for the endpoint to reject.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: IdempotencyStore,
+        identify: Callable[[str], Awaitable[str]],
+        paths: Iterable[str],
+        max_response_bytes: int = config.IDEMPOTENCY_MAX_RESPONSE_BYTES,
+        fingerprint_bytes: int = config.IDEMPOTENCY_FINGERPRINT_BYTES
+    ):
+        self.app = app
+        self.store = store
+        self.identify = identify
+        self.paths = set(paths)
+        self.max_response_bytes = max_response_bytes
+        self.fingerprint_bytes = fingerprint_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = {
+            name: value for name, value in scope["headers"]
+            if name in (b"idempotency-key", b"authorization", b"content-length", b"content-type")
+        }
+        idempotency_key = headers.get(b"idempotency-key", b"").decode("latin-1").strip()
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._error(send, status.HTTP_400_BAD_REQUEST, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+            return
+        try:
+            uid = await self.identify(headers.get(b"authorization", b"").decode("latin-1"))
+        except HTTPException:
+            await self.app(scope, receive, send)
+            return
+
+        fingerprint = None
+        # Multipart boundaries are random, so a rebuilt retry of the same upload differs byte-wise
+        if not headers.get(b"content-type", b"").lower().startswith(b"multipart/"):
+            receive, fingerprint = await self._fingerprint(headers.get(b"content-length"), receive)
+        key = hashlib.sha256(f"{uid}\n{scope['method']} {scope['path']}\n{idempotency_key}".encode("utf-8")).hexdigest()
+        existing = await self.store.begin(key, fingerprint)
+        if existing is not None:
+            await self._answer_duplicate(send, existing, fingerprint)
+            return
+
+        capture = _ResponseCapture(self.max_response_bytes)
+
+        async def capture_send(message):
+            capture.add(message)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            # A response that was fully produced is kept even if sending it failed:
+            # the work is done, and the client's retry should get it
+            await self.store.finish(key, capture.record(fingerprint))
+
+    async def _fingerprint(self, content_length: Optional[bytes], receive):
+        """Read and hash a small body up front; returns the receive to hand on and the hash."""
+        try:
+            length = int(content_length) if content_length is not None else None
+        except ValueError:
+            length = None
+        if length is None or length > self.fingerprint_bytes:
+            return receive, None
+        messages = []
+        digest = hashlib.sha256()
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                return self._replay(messages, receive), None
+            digest.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                return self._replay(messages, receive), digest.hexdigest()
+
+    @staticmethod
+    def _replay(messages: List[Dict[str, Any]], receive):
+        buffered = iter(messages)
+
+        async def replay_receive():
+            message = next(buffered, None)
+            return message if message is not None else await receive()
+
+        return replay_receive
+
+    async def _answer_duplicate(self, send, record: Dict[str, Any], fingerprint: Optional[str]) -> None:
+        if record.get("fingerprint") and fingerprint and record["fingerprint"] != fingerprint:
+            await self._error(send, status.HTTP_422_UNPROCESSABLE_ENTITY, "Idempotency-Key was already used for a different request")
+        elif record["state"] == "in_flight":
+            await self._error(
+                send, status.HTTP_409_CONFLICT, "A request with this Idempotency-Key is still being processed",
+                headers=[(b"retry-after", b"1")]
+            )
+        elif record.get("body") is None:
+            await self._error(
+                send, status.HTTP_409_CONFLICT,
+                "A request with this Idempotency-Key already completed; its response is too large to replay"
+            )
+        else:
+            headers = [(header["name"].encode("latin-1"), header["value"].encode("latin-1")) for header in record["headers"]]
+            await send({
+                "type": "http.response.start",
+                "status": record["status"],
+                "headers": headers + [(b"idempotent-replayed", b"true")],
+            })
+            await send({"type": "http.response.body", "body": record["body"]})
+
+    @staticmethod
+    async def _error(send, status_code: int, message: str, headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        body = json.dumps({"status": "error", "message": message}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ] + (headers or []),
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,336 @@
+import logging
+import re
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Union
+
+import orjson
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+JSON_MEDIA_TYPE = "application/json"
+
+
+class IngestFormatError(Exception):
+    """The body cannot be split into items any further; ingestion stops here."""
+
+
+class ItemError(Exception):
+    """One item was rejected; ingestion continues with the next one."""
+
+
+class UnsupportedMediaTypeError(HTTPException):
+    def __init__(self, media_type: str):
+        super().__init__(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported Content-Type {media_type!r}; send a JSON array or NDJSON"
+        )
+
+
+async def split_ndjson(chunks: AsyncIterator[bytes], max_item_bytes: int) -> AsyncIterator[Union[bytes, ItemError]]:
+    """
+    Split a newline-delimited JSON body into raw items as the chunks arrive.
+
+    Blank lines are skipped. A line longer than ``max_item_bytes`` is discarded as it
+    streams in and reported as an ``ItemError``, so the buffer never holds more than
+    one item plus one chunk.
+    """
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if oversized:
+                oversized = False
+                yield ItemError(f"Item exceeds {max_item_bytes} bytes")
+            elif line.strip():
+                yield line
+        if len(buffer) > max_item_bytes:
+            oversized = True
+            buffer = b""
+    if oversized:
+        yield ItemError(f"Item exceeds {max_item_bytes} bytes")
+    elif buffer.strip():
+        yield buffer
+
+
+class JSONArraySplitter:
+    """
+    Incrementally split a top-level JSON array into the raw bytes of its elements.
+
+    Only the structure is tracked (nesting depth and whether the scanner is inside
+    a string); elements themselves are parsed later, one at a time. Scanning jumps
+    between structural characters with a regex rather than walking every byte.
+    """
+
+    _STRUCTURE = re.compile(rb'["\[\]{},]')
+    _STRING = re.compile(rb'["\\]')
+
+    def __init__(self, max_item_bytes: int):
+        self.max_item_bytes = max_item_bytes
+        self._buffer = b""
+        self._pos = 0  # next byte of _buffer to scan
+        self._start: Optional[int] = None  # start of the current element
+        self._depth = 0  # nesting inside the current element
+        self._in_string = False
+        self._expect_item = False  # after a ',' another element must follow
+        self._opened = False
+        self._closed = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+        pos = self._pos
+
+        if not self._opened:
+            stripped = buffer.lstrip()
+            if not stripped:
+                self._buffer = b""
+                return items
+            if stripped[:1] != b"[":
+                raise IngestFormatError("Body must be a JSON array")
+            buffer = stripped[1:]
+            pos = 0
+            self._opened = True
+
+        while not self._closed:
+            if self._in_string:
+                match = self._STRING.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == b"\\":
+                    if match.end() >= len(buffer):
+                        # The escaped character has not arrived yet
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            match = self._STRUCTURE.search(buffer, pos)
+            if self._start is None:
+                # Between elements: skip whitespace to find where the next one starts
+                end = match.start() if match is not None else len(buffer)
+                segment = buffer[pos:end]
+                if segment.strip():
+                    self._start = pos + (len(segment) - len(segment.lstrip()))
+                elif match is not None and match.group() in b"[{\"":
+                    self._start = match.start()
+                elif match is not None and match.group() == b"]":
+                    if self._expect_item:
+                        raise IngestFormatError("Unexpected ']' after ',' in JSON array")
+                    self._closed = True
+                    pos = match.end()
+                    break
+                elif match is not None:
+                    raise IngestFormatError("Unexpected ',' in JSON array")
+            if match is None:
+                pos = len(buffer)
+                break
+
+            char = match.group()
+            pos = match.end()
+            if char == b'"':
+                self._in_string = True
+            elif char in b"[{":
+                self._depth += 1
+            elif self._depth > 0 and char in b"]}":
+                self._depth -= 1
+            elif self._depth == 0 and char in b",]":
+                items.append(buffer[self._start:match.start()])
+                self._start = None
+                self._expect_item = char == b","
+                if char == b"]":
+                    self._closed = True
+            elif self._depth == 0:
+                raise IngestFormatError(f"Unexpected {char.decode()!r} in JSON array")
+
+        # Keep only the unfinished element
+        keep_from = self._start if self._start is not None else pos
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._start is not None:
+            self._start = 0
+            if len(self._buffer) > self.max_item_bytes:
+                raise IngestFormatError(f"Item exceeds {self.max_item_bytes} bytes")
+        if self._closed and self._buffer[self._pos:].strip():
+            raise IngestFormatError("Unexpected data after the JSON array")
+        return items
+
+    def close(self) -> None:
+        if not self._closed:
+            raise IngestFormatError("JSON array is incomplete")
+
+
+async def split_json_array(chunks: AsyncIterator[bytes], max_item_bytes: int) -> AsyncIterator[bytes]:
+    """Split a streamed JSON array into raw items; raises ``IngestFormatError`` on bad framing."""
+    splitter = JSONArraySplitter(max_item_bytes)
+    async for chunk in chunks:
+        for item in splitter.feed(chunk):
+            yield item
+    splitter.close()
+
+
+def describe_error(error: Exception) -> str:
+    """Short, single-line description of why an item was rejected."""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in detail['loc']) or 'item'}: {detail['msg']}"
+            for detail in error.errors()
+        )
+    return str(error) or type(error).__name__
+
+
+async def ingest(
+    items: AsyncIterator[Union[bytes, ItemError]],
+    prepare: Callable[[bytes], Any],
+    commit: Callable[[List[Any]], Awaitable[List[Any]]],
+    batch_size: int,
+    max_items: int
+) -> AsyncIterator[Tuple[int, Any, Any, Optional[str]]]:
+    """
+    Validate raw items as they arrive and write them in batches of ``batch_size``.
+
+    ``prepare`` turns one raw item into the document to store (raising
+    ``ValueError`` to reject it); ``commit`` stores a batch and returns one result per document. Yields
+    ``(index, document, result, error)`` for every item, in order, as soon as its
+    batch is committed. At most one batch is held in memory, so arbitrarily long
+    bodies are ingested in bounded memory. A failed commit rejects every item of
+    that batch and ingestion continues.
+    """
+    # (index, document, error) of items whose results have not been reported yet
+    batch: List[Tuple[int, Any, Optional[str]]] = []
+
+    async def flush():
+        documents = [document for _, document, error in batch if error is None]
+        results: List[Any] = []
+        failure = None
+        if documents:
+            try:
+                results = await commit(documents)
+            except Exception as e:
+                logger.error("Ingest batch of %d items failed: %s", len(documents), e)
+                failure = "Write failed, retry this item"
+        outcomes = []
+        pending = iter(results)
+        for index, document, error in batch:
+            if error is not None:
+                outcomes.append((index, None, None, error))
+            elif failure is not None:
+                outcomes.append((index, document, None, failure))
+            else:
+                outcomes.append((index, document, next(pending), None))
+        batch.clear()
+        return outcomes
+
+    index = -1
+    try:
+        async for item in items:
+            index += 1
+            if index >= max_items:
+                raise IngestFormatError(f"Too many items; at most {max_items} per request")
+            try:
+                if isinstance(item, ItemError):
+                    raise item
+                batch.append((index, prepare(item), None))
+            except (ValueError, ItemError) as e:
+                # Rejections wait in the batch too, so results are reported in order
+                batch.append((index, None, describe_error(e)))
+            if len(batch) >= batch_size:
+                for outcome in await flush():
+                    yield outcome
+    except IngestFormatError:
+        # Items before the framing error are still stored
+        for outcome in await flush():
+            yield outcome
+        raise
+    for outcome in await flush():
+        yield outcome
+
+
+async def encode_results(
+    outcomes: AsyncIterator[Tuple[int, Any, Any, Optional[str]]],
+    render: Callable[[int, Any, Any, Optional[str]], bytes],
+    ndjson: bool
+) -> AsyncIterator[bytes]:
+    """
+    Encode ingest outcomes as NDJSON lines, or as one JSON object produced piecewise.
+
+    Each item is rendered by ``render``. The stream ends with a summary: the last
+    NDJSON line, or the ``accepted``/``rejected``/``error`` members of the object.
+    A framing error ends ingestion but is still reported in the summary.
+    """
+    accepted = rejected = 0
+    error = None
+    if not ndjson:
+        yield b'{"results":['
+    first = True
+    try:
+        async for index, document, result, item_error in outcomes:
+            if item_error is None:
+                accepted += 1
+            else:
+                rejected += 1
+            body = render(index, document, result, item_error)
+            if ndjson:
+                yield body + b"\n"
+            else:
+                yield body if first else b"," + body
+            first = False
+    except IngestFormatError as e:
+        error = str(e)
+    summary = {"accepted": accepted, "rejected": rejected, "error": error}
+    if ndjson:
+        yield orjson.dumps({"summary": summary}) + b"\n"
+    else:
+        yield b"]," + orjson.dumps(summary)[1:]
+
+
+def split_body(chunks: AsyncIterator[bytes], content_type: Optional[str]) -> Tuple[AsyncIterator[Any], bool]:
+    """Pick the splitter for ``content_type``; returns ``(items, ndjson)``."""
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:
+        return split_ndjson(chunks, config.INGEST_MAX_ITEM_BYTES), True
+    if media_type == JSON_MEDIA_TYPE:
+        return split_json_array(chunks, config.INGEST_MAX_ITEM_BYTES), False
+    raise UnsupportedMediaTypeError(media_type)
+
+
+async def spool_results(chunks: AsyncIterator[bytes], max_memory: int) -> SpooledTemporaryFile:
+    """
+    Collect the encoded results in a file that moves to disk past ``max_memory`` bytes.
+
+    Results are sent only after the whole body is read: most HTTP clients do not
+    read the response while they are still uploading, so writing it concurrently
+    would stall both sides once the socket buffers fill.
+    """
+    spool = SpooledTemporaryFile(max_size=max_memory)
+    try:
+        async for chunk in chunks:
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def iter_spool(spool: SpooledTemporaryFile, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
@@ -0,0 +1,246 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import orjson
+
+from . import config
+from .metrics import current_endpoint
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "taskName", "color_message"
+}
+# Argument types whose value cannot change between the logging call and formatting
+_IMMUTABLE = (str, int, float, bool, bytes, type(None))
+_traceback_formatter = logging.Formatter()
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse ``"uvicorn.access=0.01,server.app=0.1"`` into per-logger keep rates."""
+    rates = {}
+    for rule in spec.split(","):
+        if not rule.strip():
+            continue
+        name, separator, rate = rule.partition("=")
+        if not separator:
+            raise ValueError(f"Invalid log sampling rule {rule!r}; expected <logger>=<rate>")
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of each logger's routine records.
+
+    A rate applies to the named logger and its children, the most specific rule
+    winning ("root" covers everything else). Records at WARNING and above are
+    always kept. Kept records of a sampled logger carry ``sample_rate`` so counts
+    derived from the logs can be scaled back up.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._resolved: Dict[str, float] = {}
+        self.sampled_out = 0
+
+    def rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            candidate = name
+            while candidate not in self.rates and "." in candidate:
+                candidate = candidate.rpartition(".")[0]
+            rate = self.rates.get(candidate, self.rates.get("root", 1.0))
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1.0:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the listener thread without formatting them.
+
+    The standard QueueHandler renders every message on the calling thread. Here
+    that only happens when an argument is mutable (so the line still shows the
+    value at call time) and for tracebacks, which pin the caller's frames;
+    everything else is formatted by the listener. Records are stamped with the
+    endpoint being served. When the queue is full, routine records are dropped
+    and counted instead of blocking the caller; warnings and errors wait for space.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        if not hasattr(record, "endpoint"):
+            record.endpoint = current_endpoint.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record)
+            else:
+                self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # The stock version raises queue.Full if the writer is behind
+        self.queue.put(self._sentinel)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+
+def default_handlers() -> List[logging.Handler]:
+    """The configured outputs: stdout and, unless ``LOG_FILE`` is empty, a rotating file."""
+    if config.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(config.LOG_TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if config.LOG_FILE:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            config.LOG_FILE,
+            maxBytes=config.LOG_FILE_MAX_BYTES,
+            backupCount=config.LOG_FILE_BACKUPS,
+            encoding="utf8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+class LogPipeline:
+    """
+    Route the root logger through a queue drained by one writer thread.
+
+    Logging calls only build a record and enqueue it; formatting, console and
+    file output, and file rotation happen on the listener thread, so a slow disk
+    or terminal does not add latency to the request that logged.
+    """
+
+    def __init__(self, name: str = "root"):
+        self.name = name
+        self.queue: Optional[queue.Queue] = None
+        self.handler: Optional[StructuredQueueHandler] = None
+        self.sampling: Optional[SamplingFilter] = None
+        self.listener: Optional[_Listener] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.listener is not None
+
+    def start(
+        self,
+        handlers: Optional[Sequence[logging.Handler]] = None,
+        sampling: Optional[Dict[str, float]] = None,
+        level: Optional[str] = None,
+        queue_size: Optional[int] = None
+    ) -> None:
+        """
+        (Re)configure the root logger; unset arguments come from ``server/config.py``.
+
+        Handlers already on the root logger (e.g. from ``logging.basicConfig``) are
+        removed, so every record takes the queue.
+        """
+        with self._lock:
+            self._stop()
+            root = logging.getLogger()
+            for existing in root.handlers[:]:
+                root.removeHandler(existing)
+            self.queue = queue.Queue(maxsize=queue_size or config.LOG_QUEUE_SIZE)
+            self.handler = StructuredQueueHandler(self.queue)
+            self.sampling = SamplingFilter(parse_sampling(config.LOG_SAMPLING) if sampling is None else sampling)
+            self.handler.addFilter(self.sampling)
+            self.listener = _Listener(
+                self.queue,
+                *(default_handlers() if handlers is None else handlers),
+                respect_handler_level=True
+            )
+            self.listener.start()
+            root.addHandler(self.handler)
+            root.setLevel(level or config.LOG_LEVEL)
+
+    def stop(self) -> None:
+        """Write out everything queued and close the outputs."""
+        with self._lock:
+            self._stop()
+
+    def _stop(self) -> None:
+        if self.listener is None:
+            return
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "name": self.name,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "dropped": self.handler.dropped if self.handler is not None else 0,
+            "sampled_out": self.sampling.sampled_out if self.sampling is not None else 0,
+        }
+
+
+log_pipeline = LogPipeline()
+
+
+def setup_logging() -> None:
+    """Start the log pipeline for this process unless it is already running."""
+    if not log_pipeline.running:
+        log_pipeline.start()
+
+
+atexit.register(log_pipeline.stop)
@@ -0,0 +1,157 @@
+"""
+CPU-bound derivation of smaller variants of uploaded files.
+
+Runs in the media pipeline's worker processes (``server/mediapipeline.py``), so
+it must stay importable without the rest of the server: no backend clients,
+no config, only optional imaging and PDF packages.
+"""
+import io
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # a dependency; without it images are stored without variants (logged at startup)
+    Image = ImageOps = None
+
+try:
+    import pypdf
+except ImportError:  # a dependency; without it PDFs are stored without a preview (logged at startup)
+    pypdf = None
+
+TEXT_TYPES = ("application/json", "application/xml", "application/x-ndjson", "application/javascript")
+
+IMAGE_FORMATS = {
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "png": ("PNG", ".png", "image/png"),
+}
+
+# Pages read for a PDF preview; the preview is usually full well before that
+PDF_PREVIEW_PAGES = 5
+
+
+class UnprocessableMediaError(Exception):
+    """The file cannot be decoded; retrying will not help."""
+
+
+class Variant(NamedTuple):
+    name: str  # "thumb", "preview", ...
+    extension: str
+    content_type: str
+    body: bytes
+
+
+def media_kind(content_type: Optional[str]) -> Optional[str]:
+    """``"image"``, ``"text"`` or ``"pdf"`` if variants can be derived from this type here, else ``None``."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type.startswith("image/") and content_type != "image/svg+xml":
+        return "image" if Image is not None else None
+    if content_type.startswith("text/") or content_type in TEXT_TYPES:
+        return "text"
+    if content_type == "application/pdf":
+        return "pdf" if pypdf is not None else None
+    return None
+
+
+def derive(
+    data: bytes,
+    content_type: str,
+    image_sizes: Dict[str, int],
+    image_format: str,
+    image_quality: int,
+    max_pixels: int,
+    preview_chars: int
+) -> List[Variant]:
+    """
+    Variants of an uploaded file: for images, one downscaled copy per entry of
+    ``image_sizes`` (name -> longest side in pixels) that is smaller than the
+    original; for text and PDF documents, a plain-text ``preview`` of at most
+    ``preview_chars`` characters.
+
+    Raises ``UnprocessableMediaError`` if the file cannot be decoded, or is an
+    image of more than ``max_pixels`` pixels.
+    """
+    kind = media_kind(content_type)
+    if kind == "image":
+        return _image_variants(data, image_sizes, image_format, image_quality, max_pixels)
+    if kind == "text":
+        return [_preview(_decode_text(data[:preview_chars * 4]), preview_chars)]
+    if kind == "pdf":
+        return [_preview(_pdf_text(data, preview_chars), preview_chars)]
+    raise UnprocessableMediaError(f"No variants for {content_type}")
+
+
+def _image_variants(data: bytes, sizes: Dict[str, int], image_format: str, quality: int, max_pixels: int) -> List[Variant]:
+    pil_format, extension, content_type = IMAGE_FORMATS[image_format]
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        image = Image.open(io.BytesIO(data))
+        # Decompression bombs are refused from the header, before any pixel is decoded
+        if image.width * image.height > max_pixels:
+            raise UnprocessableMediaError(f"Image of {image.width}x{image.height} pixels exceeds the limit")
+        original = max(image.size)
+        largest = max(sizes.values())
+        # JPEG decodes straight to a reduced scale (1/2 to 1/8) no smaller than needed
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except UnprocessableMediaError:
+        raise
+    except Image.UnidentifiedImageError as e:
+        raise UnprocessableMediaError("Not a supported image format") from e
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise UnprocessableMediaError(f"Cannot decode image: {e}") from e
+
+    alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if alpha and pil_format != "JPEG":
+        image = image.convert("RGBA")
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    variants = []
+    # Largest first, each derived from the previous one, so every resample reads fewer pixels
+    for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        if size >= original:
+            continue
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+        output = io.BytesIO()
+        options = {"optimize": True} if pil_format == "PNG" else {"quality": quality}
+        image.save(output, pil_format, **options)
+        variants.append(Variant(name, extension, content_type, output.getvalue()))
+    return variants
+
+
+def _decode_text(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start > len(data) - 4:
+            # A multi-byte character cut off by the read limit
+            return data[:e.start].decode("utf-8")
+        return data.decode("latin-1")
+
+
+def _pdf_text(data: bytes, preview_chars: int) -> str:
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        parts: List[str] = []
+        length = 0
+        for page in reader.pages[:PDF_PREVIEW_PAGES]:
+            text = page.extract_text() or ""
+            parts.append(text)
+            length += len(text)
+            if length >= preview_chars:
+                break
+    except Exception as e:
+        # pypdf raises a variety of errors on malformed files
+        raise UnprocessableMediaError(f"Cannot read PDF: {e}") from e
+    return "\n".join(parts)
+
+
+def _preview(text: str, preview_chars: int) -> Variant:
+    text = text.replace("\x00", "")
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r"\n\s*\n+", "\n\n", text).strip()
+    return Variant("preview", ".txt", "text/plain; charset=utf-8", text[:preview_chars].encode("utf-8"))
@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from . import config, media
+from .datastore import storage_pool
+from .postprocess import Job, PostProcessingQueue
+from .repositories import BlobStore
+
+logger = logging.getLogger(__name__)
+
+# Custom metadata of an original upload that records the processing of its variants
+STATE_KEY = "mediaStatus"  # "queued", "processing", "done" or "failed"
+VARIANTS_KEY = "mediaVariants"  # JSON object: variant name -> blob path
+ERROR_KEY = "mediaError"
+
+
+def parse_sizes(spec: str) -> Dict[str, int]:
+    """``"thumb:256,medium:1024"`` -> ``{"thumb": 256, "medium": 1024}``"""
+    sizes = {}
+    for item in spec.split(","):
+        name, _, size = item.strip().partition(":")
+        if name:
+            sizes[name.strip()] = int(size)
+    return sizes
+
+
+def variant_path(path: str, name: str, extension: str) -> str:
+    """``users/u/uploads/x.jpg`` -> ``users/u/uploads/x.thumb.webp``: next to the original."""
+    stem, _ = os.path.splitext(path)
+    return f"{stem}.{name}{extension}"
+
+
+class MediaPipeline:
+    """
+    Derives small variants of uploads off the request path: downscaled images
+    (one per entry of ``image_sizes``) and plain-text previews of documents.
+
+    Jobs go through a bounded ``PostProcessingQueue`` served by ``concurrency``
+    worker tasks. A job downloads the original, runs ``media.derive`` in a pool
+    of ``processes`` worker processes, stores each variant next to the
+    original and records the outcome in the original's custom metadata, where
+    ``status`` reads it. The pool is spawned rather than forked (the server
+    holds gRPC threads) on the first job, and each process is replaced after
+    ``max_tasks_per_child`` jobs to bound the memory image decoders hold on to.
+
+    Files that cannot be decoded fail at once; storage errors and worker
+    processes that died are retried with backoff.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        concurrency: int,
+        queue_size: int,
+        max_retries: int,
+        retry_delay: float,
+        image_sizes: Dict[str, int],
+        image_format: str,
+        image_quality: int,
+        max_pixels: int,
+        preview_chars: int,
+        max_tasks_per_child: int,
+        name: str = "media"
+    ):
+        self.name = name
+        self.processes = processes
+        self.image_sizes = image_sizes
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.max_pixels = max_pixels
+        self.preview_chars = preview_chars
+        self.max_tasks_per_child = max_tasks_per_child
+        self.queue = PostProcessingQueue(
+            name,
+            maxsize=queue_size,
+            workers=concurrency,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            on_failure=self._failed
+        )
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if processes > 0:
+            for package, module, kind in (("Pillow", media.Image, "images"), ("pypdf", media.pypdf, "PDFs")):
+                if module is None:
+                    logger.warning("%s is not installed; %s are stored without variants", package, kind)
+        self.variants = 0
+        self.unprocessable = 0
+        self.pool_restarts = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def accepts(self, content_type: Optional[str]) -> bool:
+        """Whether variants are derived for uploads of this type."""
+        return self.processes > 0 and media.media_kind(content_type) is not None
+
+    async def submit(self, blobs: BlobStore, path: str, content_type: str) -> bool:
+        """
+        Queue the derivation of ``path``'s variants. When the queue is full the
+        original is marked failed and False is returned.
+        """
+        if self.queue.submit("derive_variants", self._process, blobs, path, content_type):
+            return True
+        try:
+            await self._set_state(blobs, path, "failed", error="Processing queue full")
+        except Exception as e:
+            logger.warning("Failed to record media status of %s: %s", path, e)
+        return False
+
+    async def status(self, blobs: BlobStore, path: str) -> Optional[Dict[str, Any]]:
+        """Processing state and variant paths of an upload, or ``None`` if it does not exist."""
+        metadata = await storage_pool.run(blobs.get_metadata, path, operation="media_status")
+        if metadata is None:
+            return None
+        return {
+            "state": metadata.get(STATE_KEY, "none"),
+            "variants": json.loads(metadata.get(VARIANTS_KEY) or "{}"),
+            "error": metadata.get(ERROR_KEY) or None,
+        }
+
+    async def _set_state(self, blobs: BlobStore, path: str, state: str, error: str = "", **fields: str) -> None:
+        metadata = {STATE_KEY: state, ERROR_KEY: error[:200], **fields}
+        await storage_pool.run(blobs.update_metadata, path, metadata, operation="media_status")
+
+    async def _process(self, blobs: BlobStore, path: str, content_type: str) -> None:
+        await self._set_state(blobs, path, "processing")
+        data = await storage_pool.run(blobs.read, path, operation="media_download")
+        try:
+            variants = await self._derive(data, content_type)
+        except media.UnprocessableMediaError as e:
+            self.unprocessable += 1
+            logger.warning("No variants for %s: %s", path, e)
+            await self._set_state(blobs, path, "failed", error=str(e))
+            return
+
+        stored = {}
+        for variant in variants:
+            target = variant_path(path, variant.name, variant.extension)
+            writer = blobs.open_writer(
+                target,
+                content_type=variant.content_type,
+                metadata={"variantOf": path, "variant": variant.name},
+                public=True
+            )
+            try:
+                await storage_pool.run(writer.write, variant.body, operation="media_upload")
+                await storage_pool.run(writer.close, operation="media_upload")
+            except BaseException:
+                writer.abort()
+                raise
+            stored[variant.name] = target
+            self.bytes_out += len(variant.body)
+        self.variants += len(stored)
+        self.bytes_in += len(data)
+        await self._set_state(blobs, path, "done", **{VARIANTS_KEY: json.dumps(stored)})
+        logger.info("Stored %d variants of %s", len(stored), path)
+
+    async def _derive(self, data: bytes, content_type: str) -> List[media.Variant]:
+        derive = functools.partial(
+            media.derive,
+            data,
+            content_type,
+            image_sizes=self.image_sizes,
+            image_format=self.image_format,
+            image_quality=self.image_quality,
+            max_pixels=self.max_pixels,
+            preview_chars=self.preview_chars
+        )
+        executor = self._pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, derive)
+        except BrokenProcessPool:
+            # A worker process died (e.g. killed for memory); retries get a fresh pool
+            if self._executor is executor:
+                self._executor = None
+                self.pool_restarts += 1
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child or None
+            )
+        return self._executor
+
+    async def _failed(self, job: Job, error: Exception) -> None:
+        blobs, path = job.args[:2]
+        await self._set_state(blobs, path, "failed", error=str(error) or type(error).__name__)
+
+    async def stop(self) -> None:
+        await self.queue.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "processes": self.processes,
+            "variants": self.variants,
+            "unprocessable": self.unprocessable,
+            "pool_restarts": self.pool_restarts,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+media_pipeline = MediaPipeline(
+    processes=config.MEDIA_PROCESSES,
+    concurrency=config.MEDIA_CONCURRENCY,
+    queue_size=config.MEDIA_QUEUE_SIZE,
+    max_retries=config.MEDIA_MAX_RETRIES,
+    retry_delay=config.MEDIA_RETRY_DELAY,
+    image_sizes=parse_sizes(config.MEDIA_IMAGE_SIZES),
+    image_format=config.MEDIA_IMAGE_FORMAT,
+    image_quality=config.MEDIA_IMAGE_QUALITY,
+    max_pixels=config.MEDIA_MAX_PIXELS,
+    preview_chars=config.MEDIA_PREVIEW_CHARS,
+    max_tasks_per_child=config.MEDIA_MAX_TASKS_PER_CHILD
+)
@@ -0,0 +1,271 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Endpoint (route path) of the request being served; backend calls made outside a
+# request, e.g. by background workers, are labelled "background"
+current_endpoint: contextvars.ContextVar = contextvars.ContextVar("current_endpoint", default="background")
+# Phase timings of the request being served (a profiling.RequestTrace), when it is traced
+current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return labels
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CallbackMetric:
+    """Counter or gauge whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._collect():
+            yield self.name, labels, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]], kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, collect, kind))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests served", ["endpoint", "method", "status"]
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["endpoint", "method"]
+)
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ["endpoint"]
+)
+backend_calls = registry.counter(
+    "backend_calls_total", "Backend (auth, database, storage) calls", ["endpoint", "backend", "operation", "outcome"]
+)
+backend_call_seconds = registry.histogram(
+    "backend_call_duration_seconds", "Backend call latency", ["endpoint", "backend", "operation"]
+)
+
+
+def observe_backend_call(backend: str, operation: str, outcome: str, seconds: float) -> None:
+    endpoint = current_endpoint.get()
+    backend_calls.inc(endpoint, backend, operation, outcome)
+    backend_call_seconds.observe(seconds, endpoint, backend, operation)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(backend, seconds)
+
+
+def track_stats(prefix: str, label: str, sources: Sequence[Any], fields: Dict[str, Tuple[str, str]]) -> None:
+    """
+    Expose numeric fields of each source's ``stats()`` dict as metrics.
+
+    ``fields`` maps a stats key to ``(kind, help)``; the metric is named
+    ``{prefix}_{key}`` (plus ``_total`` for counters) and labelled ``{label}=<stats name>``.
+    """
+    def collect(field):
+        return [({label: stats["name"]}, stats[field]) for stats in (source.stats() for source in sources)]
+
+    for field, (kind, documentation) in fields.items():
+        name = f"{prefix}_{field}_total" if kind == "counter" else f"{prefix}_{field}"
+        registry.callback(name, documentation, functools.partial(collect, field), kind)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-endpoint request latency, status and in-flight
+    requests, and labelling backend calls made while serving the request.
+
+    Requests are labelled with the matched route path; paths that match no route
+    are grouped under "unmatched" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app, excluded: Sequence[str] = ()):
+        self.app = app
+        self.excluded = set(excluded)
+        self._routes: Optional[Dict[str, str]] = None
+
+    def _endpoint(self, scope) -> str:
+        if self._routes is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            self._routes = {route.path: route.path for route in routes if hasattr(route, "path")}
+        path = scope["path"]
+        endpoint = self._routes.get(path)
+        if endpoint is None:
+            # Prefix match for mounted apps (e.g. static blobs)
+            endpoint = next((route for route in self._routes if path.startswith(route.rstrip("/") + "/") and route != "/"), "unmatched")
+        return endpoint
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        method = scope["method"]
+        status_code = 500
+        token = current_endpoint.set(endpoint)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc(endpoint)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_seconds.observe(time.perf_counter() - started, endpoint, method)
+            http_requests.inc(endpoint, method, str(status_code))
+            http_in_flight.dec(endpoint)
+            current_endpoint.reset(token)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from . import config
+from .metrics import current_endpoint
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, name: str, fn: Callable[..., Awaitable[Any]], args: tuple, kwargs: dict):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        # Backend calls made by the job are attributed to the endpoint that queued it
+        self.endpoint = current_endpoint.get()
+
+
+class PostProcessingQueue:
+    """
+    Bounded background queue for non-critical work deferred off the request path.
+
+    Jobs are coroutine functions run by a fixed number of worker tasks. A failing
+    job is retried with exponential backoff up to ``max_retries`` times and then
+    dropped and counted as failed, after awaiting ``on_failure(job, error)`` if
+    given. Workers are started lazily by the first submit (or explicitly with
+    ``start``) on the running event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        workers: int,
+        max_retries: int,
+        retry_delay: float,
+        on_failure: Optional[Callable[[Job, Exception], Awaitable[Any]]] = None
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_failure = on_failure
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_handles: set = set()
+        self._failure_tasks: set = set()
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.in_progress = 0
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        self._loop = loop
+        self._retry_handles.clear()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    def submit(self, name: str, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> bool:
+        """
+        Enqueue ``fn(*args, **kwargs)`` without waiting.
+
+        Returns False (and counts the job as rejected) if the queue is full.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(Job(name, fn, args, kwargs))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.error("%s queue full, dropping job %s", self.name, name)
+            return False
+        self.submitted += 1
+        return True
+
+    async def join(self) -> None:
+        """Wait until every queued job (including pending retries) has finished."""
+        while self._queue is not None:
+            await self._queue.join()
+            if not self._retry_handles:
+                return
+            await asyncio.sleep(self.retry_delay)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.in_progress += 1
+            current_endpoint.set(job.endpoint)
+            try:
+                job.attempts += 1
+                await job.fn(*job.args, **job.kwargs)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._retry_or_fail(job, e)
+            finally:
+                self.in_progress -= 1
+                self._queue.task_done()
+
+    def _retry_or_fail(self, job: Job, error: Exception) -> None:
+        if job.attempts > self.max_retries:
+            logger.error("%s job %s failed after %d attempts: %s", self.name, job.name, job.attempts, error)
+            self._fail(job, error)
+            return
+        self.retried += 1
+        delay = self.retry_delay * (2 ** (job.attempts - 1))
+        logger.warning("%s job %s failed (attempt %d), retrying in %gs: %s", self.name, job.name, job.attempts, delay, error)
+        loop = asyncio.get_running_loop()
+        handle = None
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            if self._queue is None:
+                return
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull as e:
+                logger.error("%s queue full, dropping retry of job %s", self.name, job.name)
+                self._fail(job, e)
+
+        handle = loop.call_later(delay, requeue)
+        self._retry_handles.add(handle)
+
+    def _fail(self, job: Job, error: Exception) -> None:
+        self.failed += 1
+        if self.on_failure is None:
+            return
+        task = asyncio.get_running_loop().create_task(self._notify_failure(job, error))
+        self._failure_tasks.add(task)
+        task.add_done_callback(self._failure_tasks.discard)
+
+    async def _notify_failure(self, job: Job, error: Exception) -> None:
+        try:
+            await self.on_failure(job, error)
+        except Exception as e:
+            logger.error("%s failure handler for job %s failed: %s", self.name, job.name, e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "pending_retries": len(self._retry_handles),
+            "in_progress": self.in_progress,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+post_processing = PostProcessingQueue(
+    "post_processing",
+    maxsize=config.POSTPROCESS_QUEUE_SIZE,
+    workers=config.POSTPROCESS_WORKERS,
+    max_retries=config.POSTPROCESS_MAX_RETRIES,
+    retry_delay=config.POSTPROCESS_RETRY_DELAY
+)
@@ -0,0 +1,414 @@
+import asyncio
+import collections
+import functools
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.routing import APIRoute
+
+from . import config
+from .metrics import current_endpoint, current_trace
+
+# Leaf frames of a thread that is waiting for work rather than running
+IDLE_FRAMES = frozenset({
+    "selectors:EpollSelector.select", "selectors:PollSelector.select",
+    "selectors:KqueueSelector.select", "selectors:SelectSelector.select",
+    "asyncio.runners:Runner.run", "threading:Condition.wait", "queue:Queue.get",
+    "concurrent.futures.thread:_worker",
+})
+
+
+class ProfilerBusyError(HTTPException):
+    """Raised when a profile is requested while another one is being recorded."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already being recorded on this worker"
+        )
+
+
+class RequestTrace:
+    """
+    Phase timings of one request.
+
+    The request moves through phases in order; ``mark`` starts the next one, so
+    phase durations never overlap and add up to the request's total. Work done
+    within phases (backend calls, encoding) is summed separately by ``add``.
+    """
+
+    __slots__ = ("endpoint", "method", "started", "started_at", "uid", "marks", "breakdown", "closed")
+
+    def __init__(self, endpoint: str, method: str):
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.uid: Optional[str] = None
+        self.marks: List[Tuple[str, float]] = [("receive", self.started)]
+        self.breakdown: Dict[str, List[float]] = {}
+        self.closed = False
+
+    def mark(self, phase: str) -> None:
+        if not self.closed:
+            self.marks.append((phase, time.perf_counter()))
+
+    def add(self, name: str, seconds: float) -> None:
+        if self.closed:
+            # Background work that outlived the request
+            return
+        entry = self.breakdown.get(name)
+        if entry is None:
+            self.breakdown[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def phases(self, finished: float) -> Dict[str, float]:
+        durations: Dict[str, float] = {}
+        for (phase, at), (_, until) in zip(self.marks, self.marks[1:] + [("", finished)]):
+            durations[phase] = durations.get(phase, 0.0) + until - at
+        return durations
+
+
+def mark(phase: str) -> None:
+    """Start ``phase`` of the request being served, if it is traced."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.mark(phase)
+
+
+def add(name: str, seconds: float) -> None:
+    """Count ``seconds`` of ``name`` work towards the request being served, if it is traced."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def set_user(uid: str) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.uid = uid
+
+
+class SlowRequestLog:
+    """
+    Ring buffer of the latest requests that took at least ``threshold`` seconds.
+
+    Each entry has the request's phases, in order: ``receive`` (middleware,
+    routing and reading the body), ``auth``, ``admission`` (waiting for a slot),
+    ``validation`` (parameters and body), ``handler`` (the endpoint itself),
+    ``serialize`` (response model validation, encoding and compression) and
+    ``send`` (until the last body chunk); phases a request did not go through
+    are left out. ``breakdown`` sums the backend calls (``auth``,
+    ``firestore``, ``storage``), ``encode`` and ``compress`` work done within
+    those phases. Paths in ``excluded`` (long-lived streams) are not traced.
+    """
+
+    def __init__(self, threshold: float, size: int, excluded: Sequence[str] = (), name: str = "http"):
+        self.name = name
+        self.threshold = threshold
+        self.size = size
+        self.excluded = set(excluded)
+        self.recorded = 0
+        self._entries: Deque[Dict[str, Any]] = collections.deque(maxlen=max(size, 1))
+
+    def finish(self, trace: RequestTrace, status_code: int) -> None:
+        finished = time.perf_counter()
+        trace.closed = True
+        total = finished - trace.started
+        if total < self.threshold:
+            return
+        self.recorded += 1
+        self._entries.append({
+            "endpoint": trace.endpoint,
+            "method": trace.method,
+            "status": status_code,
+            "uid": trace.uid,
+            "started_at": datetime.fromtimestamp(trace.started_at, timezone.utc).isoformat(),
+            "total_ms": round(total * 1000, 3),
+            "phases": {phase: round(seconds * 1000, 3) for phase, seconds in trace.phases(finished).items()},
+            "breakdown": {
+                name: {"calls": calls, "ms": round(seconds * 1000, 3)}
+                for name, (calls, seconds) in trace.breakdown.items()
+            },
+        })
+
+    def entries(self, endpoint: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recorded requests, newest first, optionally only those of one endpoint."""
+        entries = [entry for entry in reversed(self._entries) if endpoint is None or entry["endpoint"] == endpoint]
+        return entries[:limit] if limit is not None else entries
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "threshold_ms": round(self.threshold * 1000, 3),
+            "size": len(self._entries),
+            "capacity": self.size,
+            "recorded": self.recorded,
+        }
+
+
+class _Session:
+    def __init__(self, interval: float, loop_thread: int, all_threads: bool, route: Optional[str], requests: int):
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.all_threads = all_threads
+        self.route = route
+        self.requests = requests
+        self.completed = 0
+        self.in_flight = 0
+        self.samples = 0
+        self.idle_samples = 0
+        self.stacks: Dict[Tuple[str, ...], int] = collections.Counter()
+        self.stopping = threading.Event()
+        self.finished = asyncio.Event()
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        if self.completed >= self.requests:
+            self.finished.set()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for one worker process, run on demand.
+
+    While a session runs, a background thread captures the Python stack of the
+    event loop thread (and with ``all_threads``, of every other thread) every
+    ``interval`` seconds and counts identical stacks. Sampling costs a stack
+    walk per tick and nothing at all between sessions. A session limited to a
+    route only samples while a request to that route is being served, and ends
+    after ``requests`` of them.
+    """
+
+    def __init__(self, interval: float, max_seconds: float, max_depth: int = 64, name: str = "sampler"):
+        self.name = name
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_depth = max_depth
+        self.sessions = 0
+        self.samples = 0
+        self._session: Optional[_Session] = None
+        self._labels: Dict[Any, str] = {}
+        self._thread_names: Dict[int, str] = {}
+
+    @property
+    def active(self) -> bool:
+        return self._session is not None
+
+    def watching(self, endpoint: str) -> Optional[_Session]:
+        """The running session if it is limited to ``endpoint``."""
+        session = self._session
+        return session if session is not None and session.route == endpoint else None
+
+    async def profile(
+        self,
+        seconds: float,
+        route: Optional[str] = None,
+        requests: int = 0,
+        interval: Optional[float] = None,
+        all_threads: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Sample for ``seconds``, or with ``route``, until ``requests`` requests to it
+        have completed (at most ``seconds``), and return the aggregated profile.
+        """
+        seconds = min(seconds, self.max_seconds)
+        if self._session is not None:
+            raise ProfilerBusyError()
+        session = _Session(interval or self.interval, threading.get_ident(), all_threads, route, requests)
+        self._session = session
+        self.sessions += 1
+        sampler = threading.Thread(target=self._sample, args=(session,), name="profiler", daemon=True)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            if route is None:
+                await asyncio.sleep(seconds)
+            else:
+                try:
+                    await asyncio.wait_for(session.finished.wait(), seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            session.stopping.set()
+            self._session = None
+            await asyncio.to_thread(sampler.join)
+        self.samples += session.samples
+        return self._report(session, time.perf_counter() - started)
+
+    def _sample(self, session: _Session) -> None:
+        own = threading.get_ident()
+        next_at = time.perf_counter()
+        while not session.stopping.wait(max(next_at - time.perf_counter(), 0)):
+            next_at = max(next_at + session.interval, time.perf_counter())
+            if session.route is not None and session.in_flight <= 0:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (ident != session.loop_thread and not session.all_threads):
+                    continue
+                stack = self._stack(frame)
+                session.samples += 1
+                if stack[-1] in IDLE_FRAMES:
+                    session.idle_samples += 1
+                    continue
+                if session.all_threads:
+                    stack = (self._thread_name(ident, session.loop_thread),) + stack
+                session.stacks[stack] += 1
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def _thread_name(self, ident: int, loop_thread: int) -> str:
+        if ident == loop_thread:
+            return "event-loop"
+        if ident not in self._thread_names:
+            # Pool threads ("backend_3") are grouped under their pool
+            self._thread_names = {thread.ident: re.sub(r"_\d+$", "", thread.name) for thread in threading.enumerate()}
+        return self._thread_names.get(ident, "thread")
+
+    def _report(self, session: _Session, elapsed: float) -> Dict[str, Any]:
+        own: Dict[str, int] = collections.Counter()
+        total: Dict[str, int] = collections.Counter()
+        for stack, count in session.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        busy = sum(session.stacks.values())
+        return {
+            "route": session.route,
+            "requests": session.completed if session.route is not None else None,
+            "seconds": round(elapsed, 3),
+            "interval_ms": round(session.interval * 1000, 3),
+            "samples": session.samples,
+            "idle_samples": session.idle_samples,
+            "busy_samples": busy,
+            "functions": sorted(
+                ({"function": label, "self_samples": own[label], "total_samples": count} for label, count in total.items()),
+                key=lambda item: (item["self_samples"], item["total_samples"]),
+                reverse=True
+            ),
+            "stacks": [
+                {"stack": ";".join(stack), "samples": count}
+                for stack, count in sorted(session.stacks.items(), key=lambda item: item[1], reverse=True)
+            ],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "active": int(self.active),
+            "sessions": self.sessions,
+            "samples": self.samples,
+        }
+
+
+def collapsed(stacks: List[Dict[str, Any]]) -> str:
+    """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+    return "".join(f"{item['stack']} {item['samples']}\n" for item in stacks)
+
+
+class TracingMiddleware:
+    """
+    Trace every request's phases into the slow-request log, and count requests to
+    the route being profiled. Runs inside ``MetricsMiddleware``, which resolves
+    the endpoint.
+    """
+
+    def __init__(self, app, log: SlowRequestLog, profiler: SamplingProfiler):
+        self.app = app
+        self.log = log
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.log.excluded:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = current_endpoint.get()
+        profiled = self.profiler.watching(endpoint)
+        if profiled is not None:
+            profiled.request_started()
+        if self.log.size <= 0:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                if profiled is not None:
+                    profiled.request_finished()
+            return
+
+        trace = RequestTrace(endpoint, scope["method"])
+        token = current_trace.set(trace)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                trace.mark("send")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiled is not None:
+                profiled.request_finished()
+            self.log.finish(trace, status_code)
+            current_trace.reset(token)
+
+
+def _timed(call: Callable) -> Callable:
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def timed(*args, **kwargs):
+            mark("handler")
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                mark("serialize")
+    else:
+        @functools.wraps(call)
+        def timed(*args, **kwargs):
+            mark("handler")
+            try:
+                return call(*args, **kwargs)
+            finally:
+                mark("serialize")
+    return timed
+
+
+class TracedRoute(APIRoute):
+    """Route that marks where its endpoint starts and returns in the request's trace."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The request handler calls the endpoint through the dependant, after
+        # dependencies and body validation
+        self.dependant.call = _timed(self.dependant.call)
+
+
+slow_requests = SlowRequestLog(
+    threshold=config.SLOW_REQUEST_THRESHOLD,
+    size=config.SLOW_REQUEST_LOG_SIZE,
+    excluded=config.SLOW_REQUEST_EXCLUDED
+)
+profiler = SamplingProfiler(interval=config.PROFILER_INTERVAL, max_seconds=config.PROFILER_MAX_SECONDS)
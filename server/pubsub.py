@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import orjson
+from fastapi import HTTPException, status
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """Encode one Server-Sent Events frame (``data`` as single-line JSON)."""
+    frame = b"id: %d\n" % event_id if event_id is not None else b""
+    return frame + b"event: " + event.encode("utf-8") + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+class TooManyConnectionsError(HTTPException):
+    """Raised when a new stream would exceed the per-user or per-process limit."""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class Subscription:
+    """One connected stream: a bounded queue of encoded frames."""
+
+    def __init__(self, uid: str, maxsize: int, expires_at: Optional[float] = None):
+        self.uid = uid
+        self.id = uuid.uuid4().hex[:16]
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.expires_at = expires_at
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue ``frame`` without waiting; a full queue marks the stream as overflowed."""
+        if self.overflowed or self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            # Wake the stream if it is waiting for a frame
+            self.queue.put_nowait(b"")
+        except asyncio.QueueFull:
+            pass
+
+
+class PubSubHub:
+    """
+    In-process fan-out of per-user change events to connected streams.
+
+    ``publish`` encodes an event once and offers it to each of the user's streams
+    without waiting, so a slow client never delays the publisher or other clients.
+    A stream whose queue fills up is sent a ``resync`` event and closed; the client
+    then catches up with /syncTasks and reconnects. Events are not replayed, and
+    only streams connected to this worker process receive them.
+    """
+
+    def __init__(self, queue_size: int, max_connections: int, max_connections_per_user: int, retry_ms: int):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.max_connections_per_user = max_connections_per_user
+        self.retry_ms = retry_ms
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._sequence = 0
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def subscribe(self, uid: str, expires_at: Optional[float] = None) -> Subscription:
+        sessions = self._subscribers.get(uid, ())
+        if len(sessions) >= self.max_connections_per_user:
+            self.rejected += 1
+            raise TooManyConnectionsError("Too many open event streams for this user", retry_after=5)
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            raise TooManyConnectionsError("Server is not accepting more event streams", retry_after=30)
+        subscription = Subscription(uid, self.queue_size, expires_at)
+        self._subscribers.setdefault(uid, set()).add(subscription)
+        self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        sessions = self._subscribers.get(subscription.uid)
+        if sessions is None or subscription not in sessions:
+            return
+        sessions.discard(subscription)
+        if not sessions:
+            del self._subscribers[subscription.uid]
+        self.connections -= 1
+
+    def has_subscribers(self, uid: str) -> bool:
+        return uid in self._subscribers
+
+    def publish(self, uid: str, event: str, data: Any) -> int:
+        """Offer an event to every stream of ``uid``; returns how many accepted it."""
+        sessions = self._subscribers.get(uid)
+        if not sessions:
+            return 0
+        self._sequence += 1
+        frame = format_event(event, data, self._sequence)
+        delivered = 0
+        for subscription in sessions:
+            if subscription.offer(frame):
+                delivered += 1
+            elif subscription.overflowed and not subscription.closed:
+                self.evicted += 1
+                subscription.close()
+        self.published += 1
+        self.delivered += delivered
+        return delivered
+
+    def close_all(self) -> None:
+        for sessions in list(self._subscribers.values()):
+            for subscription in list(sessions):
+                subscription.close()
+
+    async def stream(self, subscription: Subscription, heartbeat: float) -> AsyncIterator[bytes]:
+        """
+        Yield the SSE frames for ``subscription`` until it is closed.
+
+        Sends ``ready`` first and a comment heartbeat after ``heartbeat`` idle seconds.
+        The stream ends at the token's expiry (the client reconnects with a fresh
+        token) and unsubscribes when the client disconnects.
+        """
+        try:
+            yield b"retry: %d\n" % self.retry_ms + format_event("ready", {"session": subscription.id})
+            while True:
+                if subscription.overflowed:
+                    # Queued events are dropped: the client catches up with /syncTasks anyway
+                    yield format_event("resync", {"reason": "stream fell behind"})
+                    return
+                if subscription.closed:
+                    return
+                wait = heartbeat
+                if subscription.expires_at is not None:
+                    wait = min(wait, subscription.expires_at - time.time())
+                    if wait <= 0:
+                        yield format_event("expired", {})
+                        return
+                try:
+                    async with asyncio.timeout(wait):
+                        frame = await subscription.queue.get()
+                except TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if frame and not subscription.overflowed:
+                    yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": "events",
+            "connections": self.connections,
+            "users": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+        }
+
+
+hub = PubSubHub(
+    queue_size=config.SSE_QUEUE_SIZE,
+    max_connections=config.SSE_MAX_CONNECTIONS,
+    max_connections_per_user=config.SSE_MAX_CONNECTIONS_PER_USER,
+    retry_ms=config.SSE_RETRY_MS
+)
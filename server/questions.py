@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from . import config
+from .datastore import ai_pool
+from .metrics import current_endpoint
+
+logger = logging.getLogger(__name__)
+
+
+def question_id(text: str) -> str:
+    """Stable ID for a question, so the same text always has the same ID."""
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()[:20]
+
+
+class QuestionGenerator:
+    """Produces question texts. ``generate`` is blocking and runs on ``ai_pool``."""
+
+    name = "base"
+
+    def generate(self, count: int) -> List[str]:
+        raise NotImplementedError
+
+
+class LocalQuestionGenerator(QuestionGenerator):
+    """
+    Deterministic generator that cycles through templated questions.
+
+    Needs no network or credentials; two instances produce the same sequence.
+    """
+
+    name = "local"
+
+    SEED_QUESTIONS = [
+        "What are the key principles of machine learning?",
+        "How does a neural network work?",
+        "What are the differences between AI and ML?",
+        "How can we ensure AI is used ethically?",
+        "What are some common NLP techniques?",
+    ]
+    TEMPLATES = [
+        "How does {topic} work?",
+        "What problems is {topic} best suited for?",
+        "What are common pitfalls when applying {topic}?",
+        "How would you explain {topic} to a beginner?",
+        "What are the trade-offs of {topic}?",
+        "How can we evaluate {topic} in practice?",
+    ]
+    TOPICS = [
+        "machine learning", "a neural network", "natural language processing",
+        "reinforcement learning", "computer vision", "transfer learning",
+        "a recommendation system", "a large language model", "retrieval-augmented generation",
+        "prompt engineering", "model fine-tuning", "speech recognition",
+    ]
+
+    def __init__(self):
+        templated = (template.format(topic=topic) for topic in self.TOPICS for template in self.TEMPLATES)
+        self._questions = itertools.cycle(list(itertools.chain(self.SEED_QUESTIONS, templated)))
+        self._lock = threading.Lock()
+
+    def generate(self, count: int) -> List[str]:
+        with self._lock:
+            return list(itertools.islice(self._questions, count))
+
+
+class VertexQuestionGenerator(QuestionGenerator):
+    """Generates questions with a Vertex AI model (requires ``google-cloud-aiplatform``)."""
+
+    name = "vertex"
+
+    PROMPT = (
+        "Write {count} distinct, concise questions a curious user might ask an AI "
+        "assistant about artificial intelligence and software. One question per line, "
+        "no numbering, each ending with a question mark."
+    )
+
+    def __init__(self, project: str, location: str, model: str):
+        self.project = project
+        self.location = location
+        self.model_name = model
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                import vertexai
+                from vertexai.generative_models import GenerativeModel
+
+                vertexai.init(project=self.project, location=self.location)
+                self._model = GenerativeModel(self.model_name)
+            return self._model
+
+    def generate(self, count: int) -> List[str]:
+        response = self._get_model().generate_content(self.PROMPT.format(count=count))
+        questions = []
+        for line in response.text.splitlines():
+            question = line.strip().lstrip("-*0123456789.) ").strip()
+            if question.endswith("?"):
+                questions.append(question)
+        return questions[:count]
+
+
+def create_generator(name: str) -> QuestionGenerator:
+    if name == "local":
+        return LocalQuestionGenerator()
+    if name == "vertex":
+        return VertexQuestionGenerator(config.VERTEX_PROJECT, config.VERTEX_LOCATION, config.VERTEX_MODEL)
+    raise ValueError(f"Unknown question generator: {name!r}")
+
+
+class QuestionPool:
+    """
+    Bounded pool of pre-generated questions, refilled in the background.
+
+    A producer task tops the pool up to ``maxsize`` in batches of ``batch_size``
+    whenever it drops below ``low_watermark``, so requests never wait for the
+    generator. ``take`` serves questions in O(limit): each question is handed out
+    once, skipping (and returning to the pool) any the user was served recently.
+    If the pool runs short, the remainder comes from the local generator rather
+    than waiting for a refill.
+    """
+
+    def __init__(
+        self,
+        generator: QuestionGenerator,
+        maxsize: int,
+        low_watermark: int,
+        batch_size: int,
+        recent_per_user: int,
+        max_users: int,
+        retry_delay: float = 5.0
+    ):
+        self.generator = generator
+        self.fallback = LocalQuestionGenerator()
+        self.maxsize = maxsize
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.recent_per_user = recent_per_user
+        self.max_users = max_users
+        self.retry_delay = retry_delay
+        self._pool: deque = deque()
+        self._recent: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        self._refill: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.served = 0
+        self.generated = 0
+        self.fallbacks = 0
+        self.generation_errors = 0
+
+    def start(self) -> None:
+        """Start the producer on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._loop is loop and not self._task.done():
+            return
+        self._loop = loop
+        self._refill = asyncio.Event()
+        self._task = loop.create_task(self._produce(), name="question-pool-producer")
+        self._refill.set()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._loop = None
+
+    async def _generate_batch(self) -> bool:
+        count = min(self.batch_size, self.maxsize - len(self._pool))
+        try:
+            questions = await ai_pool.run(self.generator.generate, count, operation=f"generate_{self.generator.name}")
+        except Exception as e:
+            self.generation_errors += 1
+            logger.error("Question generation failed: %s", e)
+            return False
+        for text in questions[:self.maxsize - len(self._pool)]:
+            self._pool.append({"id": question_id(text), "question": text})
+        self.generated += len(questions)
+        return bool(questions)
+
+    async def _produce(self) -> None:
+        # Generation is background work, not part of the request that started the producer
+        current_endpoint.set("background")
+        while True:
+            await self._refill.wait()
+            self._refill.clear()
+            while len(self._pool) < self.maxsize:
+                if not await self._generate_batch():
+                    await asyncio.sleep(self.retry_delay)
+                    break
+
+    def _recent_for(self, uid: str) -> "OrderedDict[str, None]":
+        recent = self._recent.get(uid)
+        if recent is None:
+            recent = self._recent[uid] = OrderedDict()
+            if len(self._recent) > self.max_users:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(uid)
+        return recent
+
+    def take(self, uid: str, limit: int) -> List[Dict[str, Any]]:
+        """Serve up to ``limit`` questions ``uid`` has not been served recently."""
+        self.start()
+        recent = self._recent_for(uid)
+        selected: List[Dict[str, Any]] = []
+        chosen = set()
+        skipped = []
+        # Bound the scan so a pool full of recently served questions stays O(limit)
+        budget = 2 * limit
+        while self._pool and len(selected) < limit and budget > 0:
+            question = self._pool.popleft()
+            budget -= 1
+            if question["id"] in recent or question["id"] in chosen:
+                skipped.append(question)
+                continue
+            selected.append(question)
+            chosen.add(question["id"])
+        # Questions this user has already seen go back for other users
+        self._pool.extend(skipped)
+
+        if len(selected) < limit:
+            self.fallbacks += 1
+            # Scanning limit + len(recent) texts finds limit unseen ones whenever they exist
+            for text in self.fallback.generate(limit + len(recent)):
+                if len(selected) >= limit:
+                    break
+                qid = question_id(text)
+                if qid not in recent and qid not in chosen:
+                    selected.append({"id": qid, "question": text})
+                    chosen.add(qid)
+
+        for question in selected:
+            recent[question["id"]] = None
+            recent.move_to_end(question["id"])
+        while len(recent) > self.recent_per_user:
+            recent.popitem(last=False)
+
+        if len(self._pool) < self.low_watermark:
+            self._refill.set()
+        self.served += len(selected)
+        return selected
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": "questions",
+            "generator": self.generator.name,
+            "size": len(self._pool),
+            "maxsize": self.maxsize,
+            "low_watermark": self.low_watermark,
+            "tracked_users": len(self._recent),
+            "served": self.served,
+            "generated": self.generated,
+            "fallbacks": self.fallbacks,
+            "generation_errors": self.generation_errors,
+        }
+
+
+question_pool = QuestionPool(
+    create_generator(config.QUESTION_GENERATOR),
+    maxsize=config.QUESTION_POOL_SIZE,
+    low_watermark=config.QUESTION_POOL_LOW_WATERMARK,
+    batch_size=config.QUESTION_BATCH_SIZE,
+    recent_per_user=config.QUESTION_RECENT_PER_USER,
+    max_users=config.QUESTION_MAX_USERS
+)
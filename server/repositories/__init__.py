@@ -0,0 +1,40 @@
+from .base import (
+    BlobStore, BlobWriter, ChangePosition, HistoryPosition, IdempotencyRepository, LeaseRepository,
+    MessageRepository, Repositories, SettingsRepository, TaskRepository, TaskResolver, UploadIndexRepository,
+    UserRepository, VersionedSetting
+)
+
+
+def create_repositories(backend: str) -> Repositories:
+    """
+    Build the repositories for a storage backend.
+
+    - **firestore**: Cloud Firestore and Cloud Storage through firebase_admin
+      (the Firebase app must already be initialized)
+    - **sql**: SQLAlchemy (``DATABASE_URL``) with local filesystem blobs
+    """
+    from .. import config
+
+    if backend == "firestore":
+        from firebase_admin import firestore, storage
+        from .firestore import create_firestore_repositories
+        return create_firestore_repositories(firestore.client(), storage.bucket())
+
+    if backend == "sql":
+        from .local_blobs import LocalBlobStore
+        from .sql import create_sql_repositories
+        return create_sql_repositories(
+            config.DATABASE_URL,
+            blobs=LocalBlobStore(config.LOCAL_BLOB_DIR, config.LOCAL_BLOB_URL),
+            pool_size=config.DATABASE_POOL_SIZE,
+            max_overflow=config.DATABASE_MAX_OVERFLOW
+        )
+
+    raise ValueError(f"Unknown storage backend: {backend!r}")
+
+
+__all__ = [
+    "BlobStore", "BlobWriter", "ChangePosition", "HistoryPosition", "IdempotencyRepository", "LeaseRepository",
+    "MessageRepository", "Repositories", "SettingsRepository", "TaskRepository", "TaskResolver", "UploadIndexRepository",
+    "UserRepository", "VersionedSetting", "create_repositories",
+]
@@ -0,0 +1,263 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# A position in a user's task change feed: (server updatedAt stamp, task ID)
+ChangePosition = Tuple[int, str]
+
+# A position in a user's message history: (stored timestamp, message ID)
+HistoryPosition = Tuple[datetime, str]
+
+# A stored setting: (version, data); the version grows by one with every write
+VersionedSetting = Tuple[int, Dict[str, Any]]
+
+# Decides a task write from the stored versions (by ID) and the user's last stamp:
+# returns (documents to write, anything else the caller wants back)
+TaskResolver = Callable[[Dict[str, Dict[str, Any]], int], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]
+
+
+class UserRepository:
+    def get_profile(self, uid: str) -> Dict[str, Any]:
+        """Return the stored profile of a user, or an empty dict if there is none."""
+        raise NotImplementedError
+
+
+class MessageRepository:
+    def add_many(self, messages: List[Dict[str, Any]]) -> List[HistoryPosition]:
+        """
+        Insert messages with generated IDs in one write and return, in order, each
+        message's ``(timestamp, id)`` as stored.
+
+        The repository sets each message's ``timestamp`` to the server time (a UTC
+        ``datetime``), the same value ``history`` later returns for it.
+        """
+        raise NotImplementedError
+
+    def history(
+        self,
+        uid: str,
+        before: Optional[HistoryPosition],
+        limit: int,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Return up to ``limit`` of the user's messages stored before ``before``, newest
+        first in ``(timestamp, id)`` order, and whether more follow.
+
+        Every document has ``id`` and ``timestamp`` (a UTC ``datetime``); other
+        fields are limited to ``fields`` when given.
+        """
+        raise NotImplementedError
+
+
+class TaskRepository:
+    # Maximum number of writes a single atomic call may make
+    max_batch_writes: int = 500
+
+    def write_many(self, uid: str, task_ids: List[str], resolve: TaskResolver) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Atomically read the stored versions of ``task_ids`` and write what ``resolve`` decides.
+
+        ``resolve(stored, last_stamp)`` gets the stored documents that exist, keyed
+        by ID, and the last ``updatedAt`` issued in the user's change sequence. It
+        returns ``(documents, other)``: complete task documents to write, with
+        increasing ``updatedAt`` stamps above ``last_stamp``, and a list passed back
+        to the caller. It runs again if another write for the user commits first.
+
+        Writes for one user commit one at a time, in stamp order, so a change never
+        becomes visible after a change with a later stamp. At most
+        ``max_batch_writes - 1`` documents. Returns what the final ``resolve`` returned.
+        """
+        raise NotImplementedError
+
+    def changes_since(self, uid: str, position: Optional[ChangePosition], limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Return up to ``limit`` task documents stored after ``position`` in
+        ``(updatedAt, id)`` order, and whether more follow. A position with an empty
+        ID means "after every task stamped at that time".
+        """
+        raise NotImplementedError
+
+    def purge_tombstones(self, before: int, limit: int) -> Dict[str, int]:
+        """
+        Delete up to ``limit`` deleted tasks (``is_deleted``) stamped before ``before``,
+        across all users, oldest first. In the same atomic write each affected user's
+        tombstone watermark is raised to the newest position purged for them, so
+        ``limit`` may be at most half of ``max_batch_writes``. Returns the number of
+        tasks purged per user.
+        """
+        raise NotImplementedError
+
+    def tombstone_watermark(self, uid: str) -> Optional[ChangePosition]:
+        """Position of the newest tombstone purged for the user, or ``None`` if none was."""
+        raise NotImplementedError
+
+
+class SettingsRepository:
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, data: Dict[str, Any], merge: bool = True) -> VersionedSetting:
+        """Store a setting and return its new version and stored data."""
+        raise NotImplementedError
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def load(self) -> Dict[str, VersionedSetting]:
+        """Every setting with its version."""
+        raise NotImplementedError
+
+    def watch(self, on_change: Callable[[Dict[str, VersionedSetting], List[str]], None]) -> Callable[[], None]:
+        """
+        Call ``on_change(changed, removed)`` from a background thread whenever settings
+        change, starting with every current setting. Returns a function that stops
+        watching. Raises ``NotImplementedError`` if the backend cannot push changes.
+        """
+        raise NotImplementedError
+
+
+class UploadIndexRepository:
+    """
+    Reference-counted index from content digest to a stored upload.
+
+    Entries live in a scope: a user's UID, or ``None`` for one index shared by all
+    users. An entry is a dict with at least ``path``; the repository adds
+    ``refcount`` (imports pointing at the object) and ``owners`` (references per
+    importing UID), so the object can be deleted safely once nobody holds one.
+    All operations are atomic with respect to each other.
+    """
+
+    def reference(self, scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+        """
+        Take one more reference for ``uid`` to the upload indexed under ``digest``.
+
+        Returns the stored entry, or ``None`` if the digest is not indexed.
+        """
+        raise NotImplementedError
+
+    def add(self, scope: Optional[str], digest: str, entry: Dict[str, Any], uid: str) -> Dict[str, Any]:
+        """
+        Index ``entry`` under ``digest`` with one reference for ``uid``.
+
+        If the digest is already indexed (another upload of the same content was
+        indexed first), takes a reference to that entry instead. Returns the stored
+        entry.
+        """
+        raise NotImplementedError
+
+    def release(self, scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+        """
+        Drop one of ``uid``'s references. When the last reference goes, the entry is
+        removed and returned so the caller can delete the object; otherwise (or if
+        ``uid`` holds no reference) returns ``None``.
+        """
+        raise NotImplementedError
+
+
+class BlobWriter:
+    """Write-once handle for a new blob; nothing is visible until ``close``."""
+
+    def write(self, chunk: bytes) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Finalize the blob."""
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        """Discard everything written so far without creating the blob."""
+        raise NotImplementedError
+
+
+class BlobStore:
+    def open_writer(self, path: str, content_type: str, metadata: Dict[str, str], public: bool = False) -> BlobWriter:
+        """Start a chunked upload; metadata and ACL are sent with the upload itself."""
+        raise NotImplementedError
+
+    def update_metadata(self, path: str, metadata: Dict[str, str]) -> None:
+        """Merge custom metadata into an existing blob."""
+        raise NotImplementedError
+
+    def get_metadata(self, path: str) -> Optional[Dict[str, str]]:
+        """Custom metadata of a blob, or ``None`` if it does not exist."""
+        raise NotImplementedError
+
+    def read(self, path: str) -> bytes:
+        """The whole content of a blob."""
+        raise NotImplementedError
+
+    def delete(self, path: str) -> bool:
+        """Delete a blob if it exists; returns whether it did."""
+        raise NotImplementedError
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+
+class IdempotencyRepository:
+    """
+    Records of requests made with an ``Idempotency-Key``, keyed by an opaque string.
+
+    A record is a dict with ``state`` ("in_flight" or "done") and, once done, the
+    stored response (``status``, ``headers``, ``body``); other fields are kept as
+    given. Records expire: an in-flight claim after its lease, so a crashed worker
+    does not block the key forever, and a result after its TTL.
+    """
+
+    def reserve(self, key: str, record: Dict[str, Any], lease: float) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim ``key`` by storing ``record`` for ``lease`` seconds.
+
+        Returns ``None`` if the key was claimed, otherwise the unexpired record
+        already stored under it.
+        """
+        raise NotImplementedError
+
+    def complete(self, key: str, record: Dict[str, Any], ttl: float) -> None:
+        """Replace the claim on ``key`` with its result, kept for ``ttl`` seconds."""
+        raise NotImplementedError
+
+    def release(self, key: str) -> None:
+        """Drop the record of ``key`` so the request can run again."""
+        raise NotImplementedError
+
+
+class LeaseRepository:
+    """
+    Named leases that let one worker at a time run a background job.
+
+    A lease is held by ``owner`` (a string unique to the worker) until it is
+    released or expires, so a crashed holder does not block the job forever.
+    """
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Take lease ``name`` for ``ttl`` seconds; ``False`` while an unexpired lease is held."""
+        raise NotImplementedError
+
+    def release(self, name: str, owner: str) -> None:
+        """Give up lease ``name`` if ``owner`` still holds it."""
+        raise NotImplementedError
+
+
+class Repositories:
+    """The set of repositories a storage backend provides."""
+
+    def __init__(
+        self,
+        users: UserRepository,
+        messages: MessageRepository,
+        tasks: TaskRepository,
+        settings: SettingsRepository,
+        blobs: BlobStore,
+        uploads: UploadIndexRepository,
+        idempotency: IdempotencyRepository,
+        leases: LeaseRepository
+    ):
+        self.users = users
+        self.messages = messages
+        self.tasks = tasks
+        self.settings = settings
+        self.blobs = blobs
+        self.uploads = uploads
+        self.idempotency = idempotency
+        self.leases = leases
@@ -0,0 +1,454 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from .. import config
+from .base import (
+    BlobStore, BlobWriter, ChangePosition, HistoryPosition, IdempotencyRepository, LeaseRepository,
+    MessageRepository, Repositories, SettingsRepository, TaskRepository, TaskResolver, UploadIndexRepository,
+    UserRepository, VersionedSetting
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FirestoreUserRepository(UserRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def get_profile(self, uid: str) -> Dict[str, Any]:
+        user_doc = self.db.collection("users").document(uid).get()
+        return user_doc.to_dict() if user_doc.exists else {}
+
+
+class FirestoreMessageRepository(MessageRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def add_many(self, messages: List[Dict[str, Any]]) -> List[HistoryPosition]:
+        # An explicit stamp rather than SERVER_TIMESTAMP, so the caller learns the stored value
+        now = datetime.now(timezone.utc)
+        batch = self.db.batch()
+        positions = []
+        for message_data in messages:
+            message_ref = self.db.collection("messages").document()
+            batch.set(message_ref, {**message_data, "timestamp": now})
+            positions.append((now, message_ref.id))
+        batch.commit()
+        return positions
+
+    def history(
+        self,
+        uid: str,
+        before: Optional[HistoryPosition],
+        limit: int,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        # Served by a composite index on (userId, timestamp desc)
+        query = (
+            self.db.collection("messages")
+            .where(filter=FieldFilter("userId", "==", uid))
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+        )
+        if before is not None:
+            timestamp, message_id = before
+            query = query.start_after({"timestamp": timestamp, "__name__": message_id})
+        if fields is not None:
+            query = query.select(sorted(set(fields) | {"timestamp"}))
+        docs = []
+        for snapshot in query.limit(limit + 1).stream():
+            data = snapshot.to_dict()
+            data["id"] = snapshot.id
+            docs.append(data)
+        return docs[:limit], len(docs) > limit
+
+
+class FirestoreTaskRepository(TaskRepository):
+    max_batch_writes = 500
+
+    def __init__(self, db):
+        self.db = db
+
+    def _tasks(self, uid: str):
+        return self.db.collection("users").document(uid).collection("tasks")
+
+    def write_many(self, uid: str, task_ids: List[str], resolve: TaskResolver) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        # The user's sequence (``lastStamp`` on their sync state) is advanced in the same
+        # batch as the tasks, with a precondition on its update time: a batch commits
+        # only if no other write for the user did since its reads, which keeps the
+        # last-writer-wins comparison atomic and commits in stamp order
+        tasks_ref = self._tasks(uid)
+        state_ref = self._sync_state(uid)
+        while True:
+            state = state_ref.get()
+            last_stamp = (state.to_dict() or {}).get("lastStamp")
+            if last_stamp is None:
+                # First write through the sequence: continue after whatever is stored
+                newest = list(tasks_ref.order_by("updatedAt", direction=firestore.Query.DESCENDING).limit(1).stream())
+                last_stamp = newest[0].get("updatedAt") if newest else 0
+            stored = {
+                snapshot.id: snapshot.to_dict()
+                for snapshot in self.db.get_all([tasks_ref.document(task_id) for task_id in task_ids])
+                if snapshot.exists
+            }
+            documents, other = resolve(stored, last_stamp)
+            if not documents:
+                return documents, other
+            batch = self.db.batch()
+            for document in documents:
+                batch.set(tasks_ref.document(document["id"]), document)
+            sequence = {"lastStamp": documents[-1]["updatedAt"]}
+            if state.exists:
+                batch.update(state_ref, sequence, option=self.db.write_option(last_update_time=state.update_time))
+            else:
+                batch.create(state_ref, sequence)
+            try:
+                batch.commit()
+                return documents, other
+            except (AlreadyExists, FailedPrecondition):
+                # Another write for this user committed first; decide again against it
+                continue
+
+    def changes_since(self, uid: str, position: Optional[ChangePosition], limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        query = self._tasks(uid).order_by("updatedAt").order_by("__name__")
+        if position is not None:
+            updated_at, task_id = position
+            if task_id:
+                query = query.start_after({"updatedAt": updated_at, "__name__": task_id})
+            else:
+                query = query.start_after({"updatedAt": updated_at})
+        docs = []
+        for snapshot in query.limit(limit + 1).stream():
+            data = snapshot.to_dict()
+            data["id"] = snapshot.id
+            docs.append(data)
+        return docs[:limit], len(docs) > limit
+
+    def _sync_state(self, uid: str):
+        return self.db.collection("users").document(uid).collection("syncState").document("tasks")
+
+    def purge_tombstones(self, before: int, limit: int) -> Dict[str, int]:
+        # Needs a collection group index on tasks (is_deleted, updatedAt, __name__)
+        query = (
+            self.db.collection_group("tasks")
+            .where(filter=FieldFilter("is_deleted", "==", True))
+            .where(filter=FieldFilter("updatedAt", "<", before))
+            .order_by("updatedAt")
+            .order_by("__name__")
+            .limit(limit)
+        )
+        batch = self.db.batch()
+        purged: Dict[str, int] = {}
+        newest: Dict[str, ChangePosition] = {}
+        for snapshot in query.select(["updatedAt"]).stream():
+            # users/{uid}/tasks/{id}
+            uid = snapshot.reference.parent.parent.id
+            # Unless the task was written again since the query read it
+            batch.delete(snapshot.reference, option=self.db.write_option(last_update_time=snapshot.update_time))
+            purged[uid] = purged.get(uid, 0) + 1
+            # Results are in (updatedAt, path) order, so the last one per user is their newest
+            newest[uid] = (snapshot.get("updatedAt"), snapshot.id)
+        if not purged:
+            return {}
+        for uid, (updated_at, task_id) in newest.items():
+            batch.set(self._sync_state(uid), {
+                "watermarkAt": updated_at,
+                "watermarkId": task_id,
+                "reclaimed": firestore.Increment(purged[uid]),
+            }, merge=True)
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            # A tombstone was written again meanwhile; the next pass purges the rest
+            return {}
+        return purged
+
+    def tombstone_watermark(self, uid: str) -> Optional[ChangePosition]:
+        state = self._sync_state(uid).get().to_dict() or {}
+        if state.get("watermarkAt") is None:
+            return None
+        return state["watermarkAt"], state.get("watermarkId", "")
+
+
+class FirestoreSettingsRepository(SettingsRepository):
+    """
+    Documents ``settings/{key}``. The version is kept in a ``version`` field that
+    every write increments atomically; it is not part of the returned data.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _versioned(snapshot) -> VersionedSetting:
+        data = snapshot.to_dict()
+        return data.pop("version", 0), data
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.db.collection("settings").document(key).get()
+        return self._versioned(snapshot)[1] if snapshot.exists else None
+
+    def set(self, key: str, data: Dict[str, Any], merge: bool = True) -> VersionedSetting:
+        reference = self.db.collection("settings").document(key)
+        update = {**data, "version": firestore.Increment(1)}
+        if not merge:
+            # A plain set would restart the version; delete the other fields instead
+            current = reference.get()
+            if current.exists:
+                for field in current.to_dict():
+                    if field not in update:
+                        update[field] = firestore.DELETE_FIELD
+        reference.set(update, merge=True)
+        return self._versioned(reference.get())
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        return {snapshot.id: self._versioned(snapshot)[1] for snapshot in self.db.collection("settings").stream()}
+
+    def load(self) -> Dict[str, VersionedSetting]:
+        return {snapshot.id: self._versioned(snapshot) for snapshot in self.db.collection("settings").stream()}
+
+    def watch(self, on_change: Callable[[Dict[str, VersionedSetting], List[str]], None]) -> Callable[[], None]:
+        def on_snapshot(snapshots, changes, read_time):
+            changed = {}
+            removed = []
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    removed.append(change.document.id)
+                else:
+                    changed[change.document.id] = self._versioned(change.document)
+            on_change(changed, removed)
+
+        return self.db.collection("settings").on_snapshot(on_snapshot).unsubscribe
+
+
+class FirestoreUploadIndexRepository(UploadIndexRepository):
+    """
+    Entries are documents ``users/{uid}/uploadIndex/{digest}``, or
+    ``uploadIndex/{digest}`` for the shared scope. ``create`` settles races
+    between uploads of the same content; references change with a precondition
+    on the entry's update time, retried when another change got there first.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _entry(self, scope: Optional[str], digest: str):
+        if scope is None:
+            return self.db.collection("uploadIndex").document(digest)
+        return self.db.collection("users").document(scope).collection("uploadIndex").document(digest)
+
+    def reference(self, scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+        reference = self._entry(scope, digest)
+        while True:
+            # Lookups are usually misses, which then cost a single read
+            snapshot = reference.get()
+            if not snapshot.exists:
+                return None
+            stored = snapshot.to_dict()
+            owners = dict(stored.get("owners") or {})
+            owners[uid] = owners.get(uid, 0) + 1
+            counts = {"refcount": stored["refcount"] + 1, "owners": owners}
+            try:
+                reference.update(counts, option=self.db.write_option(last_update_time=snapshot.update_time))
+            except (FailedPrecondition, NotFound):
+                continue
+            return {**stored, **counts}
+
+    def add(self, scope: Optional[str], digest: str, entry: Dict[str, Any], uid: str) -> Dict[str, Any]:
+        reference = self._entry(scope, digest)
+        while True:
+            stored = {**entry, "refcount": 1, "owners": {uid: 1}}
+            try:
+                reference.create(stored)
+                return stored
+            except AlreadyExists:
+                pass
+            # Another upload of the same content was indexed first; reference it
+            stored = self.reference(scope, digest, uid)
+            if stored is not None:
+                return stored
+
+    def release(self, scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+        reference = self._entry(scope, digest)
+        while True:
+            snapshot = reference.get()
+            if not snapshot.exists:
+                return None
+            stored = snapshot.to_dict()
+            owners = dict(stored.get("owners") or {})
+            if not owners.get(uid):
+                return None
+            owners[uid] -= 1
+            if not owners[uid]:
+                del owners[uid]
+            counts = {"refcount": stored["refcount"] - 1, "owners": owners}
+            option = self.db.write_option(last_update_time=snapshot.update_time)
+            try:
+                if counts["refcount"] > 0:
+                    reference.update(counts, option=option)
+                    return None
+                reference.delete(option=option)
+            except (FailedPrecondition, NotFound):
+                continue
+            return {**stored, **counts}
+
+
+class FirestoreIdempotencyRepository(IdempotencyRepository):
+    """
+    Records are documents ``idempotencyKeys/{key}`` with an ``expiresAt`` time (a
+    Firestore TTL policy on that field deletes old ones). A key is claimed by
+    creating its document; an expired record is first deleted with a precondition
+    on its update time, so only one worker takes it over.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def reserve(self, key: str, record: Dict[str, Any], lease: float) -> Optional[Dict[str, Any]]:
+        reference = self.db.collection("idempotencyKeys").document(key)
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                reference.create({**record, "expiresAt": now + timedelta(seconds=lease)})
+                return None
+            except AlreadyExists:
+                pass
+            snapshot = reference.get()
+            if not snapshot.exists:
+                continue
+            existing = snapshot.to_dict()
+            if existing.pop("expiresAt") > now:
+                return existing
+            try:
+                reference.delete(option=self.db.write_option(last_update_time=snapshot.update_time))
+            except (FailedPrecondition, NotFound):
+                pass
+
+    def complete(self, key: str, record: Dict[str, Any], ttl: float) -> None:
+        self.db.collection("idempotencyKeys").document(key).set({
+            **record,
+            "expiresAt": datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        })
+
+    def release(self, key: str) -> None:
+        self.db.collection("idempotencyKeys").document(key).delete()
+
+
+class FirestoreLeaseRepository(LeaseRepository):
+    """
+    Leases are documents ``leases/{name}`` with an ``owner`` and an ``expiresAt``
+    time. A lease is taken by creating its document; an expired one is first
+    deleted with a precondition on its update time, so only one worker takes it over.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        reference = self.db.collection("leases").document(name)
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                reference.create({"owner": owner, "expiresAt": now + timedelta(seconds=ttl)})
+                return True
+            except AlreadyExists:
+                pass
+            snapshot = reference.get()
+            if not snapshot.exists:
+                continue
+            if snapshot.to_dict()["expiresAt"] > now:
+                return False
+            try:
+                reference.delete(option=self.db.write_option(last_update_time=snapshot.update_time))
+            except (FailedPrecondition, NotFound):
+                pass
+
+    def release(self, name: str, owner: str) -> None:
+        reference = self.db.collection("leases").document(name)
+        snapshot = reference.get()
+        if not snapshot.exists or snapshot.to_dict()["owner"] != owner:
+            return
+        try:
+            reference.delete(option=self.db.write_option(last_update_time=snapshot.update_time))
+        except (FailedPrecondition, NotFound):
+            # Expired and taken over meanwhile
+            pass
+
+
+class StorageBlobWriter(BlobWriter):
+    """Resumable Cloud Storage upload sent in ``UPLOAD_CHUNK_SIZE`` requests."""
+
+    def __init__(self, blob, content_type: str, public: bool):
+        kwargs = {"predefined_acl": "publicRead"} if public else {}
+        self._writer = blob.open(
+            "wb",
+            chunk_size=config.UPLOAD_CHUNK_SIZE,
+            content_type=content_type,
+            ignore_flush=True,
+            **kwargs
+        )
+
+    def write(self, chunk: bytes) -> None:
+        self._writer.write(chunk)
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def abort(self) -> None:
+        # ``BlobWriter.close()`` (also called when the writer is garbage collected)
+        # would commit whatever was buffered as a truncated object. Closing only its
+        # buffer abandons the upload session instead, so no object is ever created.
+        try:
+            self._writer._buffer.close()
+        except Exception as e:
+            logger.error("Error discarding upload session: %s", e)
+
+
+class StorageBlobStore(BlobStore):
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def open_writer(self, path: str, content_type: str, metadata: Dict[str, str], public: bool = False) -> BlobWriter:
+        blob = self.bucket.blob(path)
+        blob.metadata = metadata
+        return StorageBlobWriter(blob, content_type, public)
+
+    def update_metadata(self, path: str, metadata: Dict[str, str]) -> None:
+        blob = self.bucket.blob(path)
+        blob.metadata = metadata
+        blob.patch()
+
+    def get_metadata(self, path: str) -> Optional[Dict[str, str]]:
+        blob = self.bucket.get_blob(path)
+        return None if blob is None else dict(blob.metadata or {})
+
+    def read(self, path: str) -> bytes:
+        return self.bucket.blob(path).download_as_bytes()
+
+    def delete(self, path: str) -> bool:
+        blob = self.bucket.blob(path)
+        if not blob.exists():
+            return False
+        blob.delete()
+        return True
+
+    def public_url(self, path: str) -> str:
+        return self.bucket.blob(path).public_url
+
+
+def create_firestore_repositories(db, bucket) -> Repositories:
+    return Repositories(
+        users=FirestoreUserRepository(db),
+        messages=FirestoreMessageRepository(db),
+        tasks=FirestoreTaskRepository(db),
+        settings=FirestoreSettingsRepository(db),
+        blobs=StorageBlobStore(bucket),
+        uploads=FirestoreUploadIndexRepository(db),
+        idempotency=FirestoreIdempotencyRepository(db),
+        leases=FirestoreLeaseRepository(db)
+    )
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+from .base import BlobStore, BlobWriter
+
+
+class LocalBlobWriter(BlobWriter):
+    """Writes to a temporary file that is atomically renamed into place on close."""
+
+    def __init__(self, target: Path, metadata_path: Path, metadata: Dict[str, str]):
+        self._target = target
+        self._metadata_path = metadata_path
+        self._metadata = metadata
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".part")
+        self._temp_path = Path(temp_path)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def close(self) -> None:
+        self._file.close()
+        self._metadata_path.parent.mkdir(parents=True, exist_ok=True)
+        self._metadata_path.write_text(json.dumps(self._metadata), encoding="utf-8")
+        os.replace(self._temp_path, self._target)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Filesystem blob storage for self-hosted deployments.
+
+    Objects live under ``<root>/objects`` (served by the app at ``base_url``) and
+    their custom metadata as JSON under ``<root>/metadata``.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.metadata_dir = self.root / "metadata"
+        self.base_url = base_url.rstrip("/")
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.metadata_dir.mkdir(parents=True, exist_ok=True)
+
+    def _object_path(self, path: str) -> Path:
+        target = (self.objects_dir / path).resolve()
+        if self.objects_dir.resolve() not in target.parents:
+            raise ValueError(f"Invalid blob path: {path}")
+        return target
+
+    def _metadata_path(self, path: str) -> Path:
+        return self.metadata_dir / f"{path}.json"
+
+    def open_writer(self, path: str, content_type: str, metadata: Dict[str, str], public: bool = False) -> BlobWriter:
+        return LocalBlobWriter(
+            self._object_path(path),
+            self._metadata_path(path),
+            {**metadata, "contentType": content_type}
+        )
+
+    def update_metadata(self, path: str, metadata: Dict[str, str]) -> None:
+        metadata_path = self._metadata_path(path)
+        current = json.loads(metadata_path.read_text(encoding="utf-8")) if metadata_path.exists() else {}
+        metadata_path.parent.mkdir(parents=True, exist_ok=True)
+        metadata_path.write_text(json.dumps({**current, **metadata}), encoding="utf-8")
+
+    def get_metadata(self, path: str) -> Optional[Dict[str, str]]:
+        if not self._object_path(path).exists():
+            return None
+        metadata_path = self._metadata_path(path)
+        return json.loads(metadata_path.read_text(encoding="utf-8")) if metadata_path.exists() else {}
+
+    def read(self, path: str) -> bytes:
+        return self._object_path(path).read_bytes()
+
+    def delete(self, path: str) -> bool:
+        target = self._object_path(path)
+        if not target.exists():
+            return False
+        target.unlink()
+        self._metadata_path(path).unlink(missing_ok=True)
+        return True
+
+    def public_url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
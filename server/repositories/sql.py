@@ -0,0 +1,497 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    JSON, BigInteger, Boolean, Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table, Text,
+    and_, create_engine, delete, func, insert, or_, select, update
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from .base import (
+    BlobStore, ChangePosition, HistoryPosition, IdempotencyRepository, LeaseRepository, MessageRepository,
+    Repositories, SettingsRepository, TaskRepository, TaskResolver, UploadIndexRepository, UserRepository,
+    VersionedSetting
+)
+
+metadata = MetaData()
+
+users_table = Table(
+    "users", metadata,
+    Column("uid", String(128), primary_key=True),
+    Column("data", JSON, nullable=False, default=dict),
+)
+
+messages_table = Table(
+    "messages", metadata,
+    Column("id", String(32), primary_key=True),
+    Column("user_id", String(128), nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+    Column("message", Text, nullable=False),
+    Column("status", String(32), nullable=False),
+    Column("data", JSON, nullable=False),
+    Index("ix_messages_user_id_timestamp", "user_id", "timestamp"),
+)
+
+tasks_table = Table(
+    "tasks", metadata,
+    Column("user_id", String(128), primary_key=True),
+    Column("id", String(128), primary_key=True),
+    Column("updated_at", BigInteger, nullable=False),  # server stamp ("updatedAt")
+    Column("is_deleted", Boolean, nullable=False, default=False),  # tombstone, copied from data
+    Column("data", JSON, nullable=False),
+    Index("ix_tasks_user_id_updated_at", "user_id", "updated_at", "id"),
+    # Tombstones in purge order, for compaction
+    Index("ix_tasks_is_deleted_updated_at", "is_deleted", "updated_at"),
+)
+
+# Last updatedAt stamp issued per user; locking its row orders the user's task writes
+task_sequences_table = Table(
+    "task_sequences", metadata,
+    Column("user_id", String(128), primary_key=True),
+    Column("last_stamp", BigInteger, nullable=False),
+)
+
+# Newest purged tombstone per user; task cursors before it need a full resync
+task_sync_state_table = Table(
+    "task_sync_state", metadata,
+    Column("user_id", String(128), primary_key=True),
+    Column("watermark_at", BigInteger, nullable=False),
+    Column("watermark_id", String(128), nullable=False),
+    Column("reclaimed", BigInteger, nullable=False, default=0),
+)
+
+settings_table = Table(
+    "settings", metadata,
+    Column("key", String(128), primary_key=True),
+    Column("version", Integer, nullable=False, default=0),
+    Column("data", JSON, nullable=False),
+)
+
+upload_index_table = Table(
+    "upload_index", metadata,
+    Column("scope", String(128), primary_key=True),  # user ID, or SHARED_SCOPE
+    Column("digest", String(64), primary_key=True),
+    Column("refcount", Integer, nullable=False),
+    Column("owners", JSON, nullable=False),  # references per importing user ID
+    Column("data", JSON, nullable=False),
+)
+
+idempotency_table = Table(
+    "idempotency_keys", metadata,
+    Column("key", String(64), primary_key=True),
+    Column("expires_at", DateTime, nullable=False, index=True),  # naive UTC
+    Column("data", JSON, nullable=False),
+    Column("body", LargeBinary),
+)
+
+leases_table = Table(
+    "leases", metadata,
+    Column("name", String(128), primary_key=True),
+    Column("owner", String(128), nullable=False),
+    Column("expires_at", DateTime, nullable=False),  # naive UTC
+)
+
+# Scope key of the index shared by all users
+SHARED_SCOPE = "*"
+
+
+def create_sql_engine(url: str, pool_size: int = 10, max_overflow: int = 20) -> Engine:
+    """Create a pooled engine; SQLite connections may be shared across executor threads."""
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # One shared connection, otherwise every pooled connection gets its own empty database
+        return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    if url.startswith("sqlite"):
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True
+        )
+    return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+
+
+def _upsert(engine: Engine, table: Table, rows: List[Dict[str, Any]], keys: List[str]):
+    """Build an INSERT ... ON CONFLICT DO UPDATE for SQLite and PostgreSQL."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(table).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={column.name: statement.excluded[column.name] for column in table.columns if column.name not in keys}
+    )
+
+
+class SQLUserRepository(UserRepository):
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def get_profile(self, uid: str) -> Dict[str, Any]:
+        with self.engine.connect() as connection:
+            data = connection.execute(select(users_table.c.data).where(users_table.c.uid == uid)).scalar()
+        return dict(data) if data else {}
+
+
+class SQLMessageRepository(MessageRepository):
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def add_many(self, messages: List[Dict[str, Any]]) -> List[HistoryPosition]:
+        now = datetime.utcnow()
+        rows = []
+        for message_data in messages:
+            rows.append({
+                "id": uuid.uuid4().hex[:20],
+                "user_id": message_data["userId"],
+                "timestamp": now,
+                "message": message_data["message"],
+                "status": message_data.get("status", "sent"),
+                "data": {key: value for key, value in message_data.items() if key != "timestamp"},
+            })
+        with self.engine.begin() as connection:
+            connection.execute(insert(messages_table), rows)
+        # Stored naive; history returns them as UTC
+        return [(now.replace(tzinfo=timezone.utc), row["id"]) for row in rows]
+
+    def history(
+        self,
+        uid: str,
+        before: Optional[HistoryPosition],
+        limit: int,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        query = select(messages_table.c.id, messages_table.c.timestamp, messages_table.c.data).where(
+            messages_table.c.user_id == uid
+        )
+        if before is not None:
+            timestamp, message_id = before
+            # Stored timestamps are naive UTC
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None) if timestamp.tzinfo else timestamp
+            query = query.where(or_(
+                messages_table.c.timestamp < timestamp,
+                and_(messages_table.c.timestamp == timestamp, messages_table.c.id < message_id)
+            ))
+        query = query.order_by(messages_table.c.timestamp.desc(), messages_table.c.id.desc()).limit(limit + 1)
+        docs = []
+        with self.engine.connect() as connection:
+            for message_id, timestamp, data in connection.execute(query):
+                if fields is not None:
+                    data = {field: data[field] for field in fields if field in data}
+                docs.append({**data, "id": message_id, "timestamp": timestamp.replace(tzinfo=timezone.utc)})
+        return docs[:limit], len(docs) > limit
+
+
+class SQLTaskRepository(TaskRepository):
+    max_batch_writes = 1000
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def write_many(self, uid: str, task_ids: List[str], resolve: TaskResolver) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        while True:
+            try:
+                with self.engine.begin() as connection:
+                    return self._write_many(connection, uid, task_ids, resolve)
+            except IntegrityError:
+                # Another first write for this user created the sequence; wait behind it
+                continue
+
+    def _write_many(self, connection, uid: str, task_ids: List[str], resolve: TaskResolver):
+        # Writing the sequence row first locks it until commit (SQLite locks the database),
+        # so the user's writes run one at a time and nothing changes between reads and writes
+        sequence = task_sequences_table.c.user_id == uid
+        if connection.execute(update(task_sequences_table).where(sequence).values(last_stamp=task_sequences_table.c.last_stamp)).rowcount:
+            last_stamp = connection.execute(select(task_sequences_table.c.last_stamp).where(sequence)).scalar_one()
+        else:
+            # First write through the sequence: continue after whatever is stored
+            last_stamp = connection.execute(
+                select(func.max(tasks_table.c.updated_at)).where(tasks_table.c.user_id == uid)
+            ).scalar() or 0
+            connection.execute(insert(task_sequences_table).values(user_id=uid, last_stamp=last_stamp))
+        stored = {
+            task_id: dict(data)
+            for task_id, data in connection.execute(
+                select(tasks_table.c.id, tasks_table.c.data).where(tasks_table.c.user_id == uid, tasks_table.c.id.in_(task_ids))
+            )
+        }
+        documents, other = resolve(stored, last_stamp)
+        if documents:
+            rows = [
+                {
+                    "user_id": uid,
+                    "id": document["id"],
+                    "updated_at": document["updatedAt"],
+                    "is_deleted": bool(document.get("is_deleted")),
+                    "data": document
+                }
+                for document in documents
+            ]
+            connection.execute(_upsert(self.engine, tasks_table, rows, ["user_id", "id"]))
+            connection.execute(update(task_sequences_table).where(sequence).values(last_stamp=documents[-1]["updatedAt"]))
+        return documents, other
+
+    def changes_since(self, uid: str, position: Optional[ChangePosition], limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        query = select(tasks_table.c.data).where(tasks_table.c.user_id == uid)
+        if position is not None:
+            updated_at, task_id = position
+            if task_id:
+                query = query.where(or_(
+                    tasks_table.c.updated_at > updated_at,
+                    and_(tasks_table.c.updated_at == updated_at, tasks_table.c.id > task_id)
+                ))
+            else:
+                query = query.where(tasks_table.c.updated_at > updated_at)
+        query = query.order_by(tasks_table.c.updated_at, tasks_table.c.id).limit(limit + 1)
+        with self.engine.connect() as connection:
+            docs = [dict(data) for data in connection.execute(query).scalars()]
+        return docs[:limit], len(docs) > limit
+
+    def purge_tombstones(self, before: int, limit: int) -> Dict[str, int]:
+        query = (
+            select(tasks_table.c.user_id, tasks_table.c.id, tasks_table.c.updated_at)
+            .where(tasks_table.c.is_deleted, tasks_table.c.updated_at < before)
+            .order_by(tasks_table.c.updated_at, tasks_table.c.user_id, tasks_table.c.id)
+            .limit(limit)
+        )
+        purged: Dict[str, List[str]] = {}
+        newest: Dict[str, ChangePosition] = {}
+        with self.engine.begin() as connection:
+            for uid, task_id, updated_at in connection.execute(query):
+                purged.setdefault(uid, []).append(task_id)
+                newest[uid] = (updated_at, task_id)
+            for uid, task_ids in purged.items():
+                # Unless a task was written again since the query read it
+                connection.execute(delete(tasks_table).where(
+                    tasks_table.c.user_id == uid,
+                    tasks_table.c.id.in_(task_ids),
+                    tasks_table.c.is_deleted,
+                    tasks_table.c.updated_at < before
+                ))
+                updated_at, task_id = newest[uid]
+                raised = connection.execute(
+                    update(task_sync_state_table)
+                    .where(task_sync_state_table.c.user_id == uid)
+                    .values(
+                        watermark_at=updated_at,
+                        watermark_id=task_id,
+                        reclaimed=task_sync_state_table.c.reclaimed + len(task_ids)
+                    )
+                ).rowcount
+                if not raised:
+                    connection.execute(insert(task_sync_state_table).values(
+                        user_id=uid, watermark_at=updated_at, watermark_id=task_id, reclaimed=len(task_ids)
+                    ))
+        return {uid: len(task_ids) for uid, task_ids in purged.items()}
+
+    def tombstone_watermark(self, uid: str) -> Optional[ChangePosition]:
+        query = select(task_sync_state_table.c.watermark_at, task_sync_state_table.c.watermark_id).where(
+            task_sync_state_table.c.user_id == uid
+        )
+        with self.engine.connect() as connection:
+            row = connection.execute(query).first()
+        return (row.watermark_at, row.watermark_id) if row is not None else None
+
+
+class SQLSettingsRepository(SettingsRepository):
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as connection:
+            data = connection.execute(select(settings_table.c.data).where(settings_table.c.key == key)).scalar()
+        return dict(data) if data is not None else None
+
+    def set(self, key: str, data: Dict[str, Any], merge: bool = True) -> VersionedSetting:
+        with self.engine.begin() as connection:
+            current = connection.execute(
+                select(settings_table.c.version, settings_table.c.data).where(settings_table.c.key == key).with_for_update()
+            ).first()
+            if current is None:
+                connection.execute(insert(settings_table).values(key=key, version=1, data=data))
+                return 1, dict(data)
+            new_data = {**current.data, **data} if merge else data
+            connection.execute(
+                update(settings_table)
+                .where(settings_table.c.key == key)
+                .values(data=new_data, version=settings_table.c.version + 1)
+            )
+            return current.version + 1, dict(new_data)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        with self.engine.connect() as connection:
+            return {key: dict(data) for key, data in connection.execute(select(settings_table.c.key, settings_table.c.data))}
+
+    def load(self) -> Dict[str, VersionedSetting]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(settings_table.c.key, settings_table.c.version, settings_table.c.data))
+            return {key: (version, dict(data)) for key, version, data in rows}
+
+
+class SQLUploadIndexRepository(UploadIndexRepository):
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    @staticmethod
+    def _key(scope: Optional[str], digest: str):
+        return and_(
+            upload_index_table.c.scope == (SHARED_SCOPE if scope is None else scope),
+            upload_index_table.c.digest == digest
+        )
+
+    def _change(self, connection, key, uid: str, amount: int) -> Optional[Dict[str, Any]]:
+        """Add ``amount`` to ``uid``'s references; ``None`` if not indexed or nothing to drop."""
+        # Writing the row first locks it until commit (SQLite locks the database)
+        if not connection.execute(
+            update(upload_index_table).where(key).values(refcount=upload_index_table.c.refcount)
+        ).rowcount:
+            return None
+        refcount, owners, data = connection.execute(
+            select(upload_index_table.c.refcount, upload_index_table.c.owners, upload_index_table.c.data).where(key)
+        ).one()
+        owners = dict(owners)
+        held = owners.get(uid, 0) + amount
+        if held < 0:
+            return None
+        if held:
+            owners[uid] = held
+        else:
+            owners.pop(uid, None)
+        refcount += amount
+        if refcount > 0:
+            connection.execute(update(upload_index_table).where(key).values(refcount=refcount, owners=owners))
+        else:
+            connection.execute(delete(upload_index_table).where(key))
+        return {**data, "refcount": refcount, "owners": owners}
+
+    def reference(self, scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+        with self.engine.begin() as connection:
+            return self._change(connection, self._key(scope, digest), uid, 1)
+
+    def add(self, scope: Optional[str], digest: str, entry: Dict[str, Any], uid: str) -> Dict[str, Any]:
+        key = self._key(scope, digest)
+        while True:
+            try:
+                with self.engine.begin() as connection:
+                    stored = self._change(connection, key, uid, 1)
+                    if stored is not None:
+                        # Another upload of the same content was indexed first
+                        return stored
+                    connection.execute(insert(upload_index_table).values(
+                        scope=SHARED_SCOPE if scope is None else scope,
+                        digest=digest,
+                        refcount=1,
+                        owners={uid: 1},
+                        data=entry
+                    ))
+                return {**entry, "refcount": 1, "owners": {uid: 1}}
+            except IntegrityError:
+                # Indexed concurrently; reference it on the next pass
+                continue
+
+    def release(self, scope: Optional[str], digest: str, uid: str) -> Optional[Dict[str, Any]]:
+        with self.engine.begin() as connection:
+            stored = self._change(connection, self._key(scope, digest), uid, -1)
+        return stored if stored is not None and stored["refcount"] == 0 else None
+
+
+class SQLIdempotencyRepository(IdempotencyRepository):
+    """The response body is kept in its own binary column; expired rows are swept on reserve."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def _values(record: Dict[str, Any], expires_at: datetime) -> Dict[str, Any]:
+        data = {field: value for field, value in record.items() if field != "body"}
+        return {"expires_at": expires_at, "data": data, "body": record.get("body")}
+
+    def reserve(self, key: str, record: Dict[str, Any], lease: float) -> Optional[Dict[str, Any]]:
+        while True:
+            now = self._now()
+            values = self._values(record, now + timedelta(seconds=lease))
+            try:
+                with self.engine.begin() as connection:
+                    row = connection.execute(
+                        select(idempotency_table).where(idempotency_table.c.key == key).with_for_update()
+                    ).first()
+                    if row is None:
+                        # Sweep expired records while adding one, so the table stays bounded
+                        connection.execute(delete(idempotency_table).where(idempotency_table.c.expires_at <= now))
+                        connection.execute(insert(idempotency_table).values(key=key, **values))
+                        return None
+                    if row.expires_at > now:
+                        return {**row.data, "body": row.body}
+                    taken = connection.execute(
+                        update(idempotency_table)
+                        .where(and_(idempotency_table.c.key == key, idempotency_table.c.expires_at == row.expires_at))
+                        .values(**values)
+                    ).rowcount
+                    if taken:
+                        return None
+            except IntegrityError:
+                # Claimed concurrently; read it on the next pass
+                continue
+
+    def complete(self, key: str, record: Dict[str, Any], ttl: float) -> None:
+        values = self._values(record, self._now() + timedelta(seconds=ttl))
+        with self.engine.begin() as connection:
+            if not connection.execute(update(idempotency_table).where(idempotency_table.c.key == key).values(**values)).rowcount:
+                connection.execute(insert(idempotency_table).values(key=key, **values))
+
+    def release(self, key: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(idempotency_table).where(idempotency_table.c.key == key))
+
+
+class SQLLeaseRepository(LeaseRepository):
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        values = {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}
+        try:
+            with self.engine.begin() as connection:
+                taken = connection.execute(
+                    update(leases_table)
+                    .where(and_(leases_table.c.name == name, leases_table.c.expires_at <= now))
+                    .values(**values)
+                ).rowcount
+                if taken:
+                    return True
+                if connection.execute(select(leases_table.c.name).where(leases_table.c.name == name)).first() is not None:
+                    return False
+                connection.execute(insert(leases_table).values(name=name, **values))
+            return True
+        except IntegrityError:
+            # Taken concurrently
+            return False
+
+    def release(self, name: str, owner: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(leases_table).where(and_(leases_table.c.name == name, leases_table.c.owner == owner)))
+
+
+def create_sql_repositories(url: str, blobs: BlobStore, pool_size: int = 10, max_overflow: int = 20) -> Repositories:
+    """Create SQLAlchemy-backed repositories, creating missing tables and indexes."""
+    engine = create_sql_engine(url, pool_size=pool_size, max_overflow=max_overflow)
+    metadata.create_all(engine)
+    return Repositories(
+        users=SQLUserRepository(engine),
+        messages=SQLMessageRepository(engine),
+        tasks=SQLTaskRepository(engine),
+        settings=SQLSettingsRepository(engine),
+        blobs=blobs,
+        uploads=SQLUploadIndexRepository(engine),
+        idempotency=SQLIdempotencyRepository(engine),
+        leases=SQLLeaseRepository(engine)
+    )
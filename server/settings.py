@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Mapping, NamedTuple, Optional
+
+from . import config
+from .datastore import firestore_pool
+from .repositories import SettingsRepository, VersionedSetting
+
+logger = logging.getLogger(__name__)
+
+
+class Setting(NamedTuple):
+    version: int
+    data: Mapping[str, Any]  # read-only view
+
+
+class SettingsCache:
+    """
+    Every document of the ``settings`` collection, held in process memory.
+
+    Reads are plain dictionary lookups without a lock or a backend call: updates
+    build a new dict and swap it in, so a reader sees either the old or the new
+    state. The cache is fed by the backend's change listener where there is one
+    (Firestore) and otherwise by reloading everything every ``poll_interval``
+    seconds; with a listener, a reload still runs every ``resync_interval`` in
+    case the listener stops delivering. An entry is only replaced by a higher
+    version, so a slow reload cannot undo a newer write.
+
+    Writes go through ``set``, which stores the setting and applies the result
+    locally at once; other workers pick it up through their listener, or within
+    one ``poll_interval`` when polling.
+    """
+
+    def __init__(self, poll_interval: float, resync_interval: float, name: str = "settings"):
+        self.name = name
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.source = "none"  # "listener" or "polling" once started
+        self.refreshes = 0
+        self.notifications = 0
+        self.errors = 0
+        self._entries: Dict[str, Setting] = {}
+        # Update sequence at which each key last changed; a reload only removes
+        # keys that did not change while it was reading
+        self._changed_at: Dict[str, int] = {}
+        self._sequence = 0
+        self._updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._repository: Optional[SettingsRepository] = None
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, key: str, default: Optional[Mapping[str, Any]] = None) -> Optional[Mapping[str, Any]]:
+        """The cached data of a setting (read-only), or ``default``."""
+        entry = self._entries.get(key)
+        return entry.data if entry is not None else default
+
+    def value(self, key: str, field: str, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        return entry.data.get(field, default) if entry is not None else default
+
+    def version(self, key: str) -> int:
+        entry = self._entries.get(key)
+        return entry.version if entry is not None else 0
+
+    def _apply(
+        self,
+        changed: Dict[str, VersionedSetting],
+        removed: Iterable[str] = (),
+        complete_since: Optional[int] = None
+    ) -> None:
+        """
+        Merge versioned settings into the cache. With ``complete_since``, ``changed``
+        is the whole collection as read after update ``complete_since``, and cached
+        keys missing from it are dropped unless they changed after that.
+        """
+        with self._lock:
+            self._sequence += 1
+            entries = dict(self._entries)
+            for key, (version, data) in changed.items():
+                current = entries.get(key)
+                if current is None or version > current.version:
+                    entries[key] = Setting(version, MappingProxyType(dict(data)))
+                    self._changed_at[key] = self._sequence
+            if complete_since is not None:
+                removed = [
+                    key for key in entries
+                    if key not in changed and self._changed_at.get(key, 0) <= complete_since
+                ]
+            for key in removed:
+                entries.pop(key, None)
+                self._changed_at.pop(key, None)
+            self._entries = entries
+            self._updated_at = time.monotonic()
+
+    def _on_change(self, changed: Dict[str, VersionedSetting], removed: Iterable[str]) -> None:
+        # Called on the listener's thread
+        self.notifications += 1
+        self._apply(changed, removed)
+
+    async def refresh(self) -> bool:
+        """Reload every setting; returns whether the reload succeeded."""
+        since = self._sequence
+        try:
+            loaded = await firestore_pool.run(self._repository.load, operation="settings_load")
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Settings reload failed: %s", e)
+            return False
+        self._apply(loaded, complete_since=since)
+        self.refreshes += 1
+        return True
+
+    async def start(self, repository: SettingsRepository) -> None:
+        """Load every setting, subscribe to changes (or fall back to polling) and keep them current."""
+        if self._task is not None:
+            return
+        self._repository = repository
+        await self.refresh()
+        try:
+            self._unsubscribe = await firestore_pool.run(repository.watch, self._on_change, operation="settings_watch")
+            self.source = "listener"
+        except NotImplementedError:
+            self.source = "polling"
+        except Exception as e:
+            logger.warning("Settings listener unavailable, polling every %gs: %s", self.poll_interval, e)
+            self.source = "polling"
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.resync_interval if self.source == "listener" else self.poll_interval)
+            await self.refresh()
+
+    async def stop(self) -> None:
+        if self._unsubscribe is not None:
+            try:
+                self._unsubscribe()
+            except Exception as e:
+                logger.warning("Failed to stop the settings listener: %s", e)
+            self._unsubscribe = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def set(self, repository: SettingsRepository, key: str, data: Dict[str, Any], merge: bool = True) -> Setting:
+        """Write a setting through to the backend and apply the stored result locally."""
+        version, stored = await firestore_pool.run(repository.set, key, data, merge, operation="settings_set")
+        self._apply({key: (version, stored)})
+        return self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "source": self.source,
+            "keys": len(self._entries),
+            "refreshes": self.refreshes,
+            "notifications": self.notifications,
+            "errors": self.errors,
+            "age_seconds": round(time.monotonic() - self._updated_at, 3) if self._updated_at is not None else 0.0,
+        }
+
+
+settings_cache = SettingsCache(
+    poll_interval=config.SETTINGS_POLL_INTERVAL,
+    resync_interval=config.SETTINGS_RESYNC_INTERVAL
+)
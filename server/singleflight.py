@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from .cache import TTLCache
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical reads into one backend call.
+
+    The first caller for a key starts the call; callers that ask for the same key
+    while it is running await that call and get its result (or its exception)
+    instead of starting their own. The call runs as its own task, so a caller that
+    gives up does not cancel it for the others.
+
+    With ``ttl`` set, a successful result is also kept for that many seconds and
+    served to later callers without a call. Results are shared, not copied:
+    callers must not modify them.
+    """
+
+    def __init__(self, name: str, ttl: float = 0.0, cache_size: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=cache_size, ttl=ttl, name=name) if ttl > 0 else None
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+        self.cache_hits = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """Await ``fn(*args, **kwargs)``, or the identical call already in flight for ``key``."""
+        if self.cache is not None:
+            cached = self.cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                self.cache_hits += 1
+                return cached
+
+        flight = self._flights.get(key)
+        if flight is not None and flight.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+        else:
+            self.calls += 1
+            flight = asyncio.ensure_future(fn(*args, **kwargs))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._landed(key, done))
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: Hashable, flight: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.cancelled():
+            return
+        if flight.exception() is not None:
+            self.errors += 1
+        elif self.cache is not None:
+            self.cache.set(key, flight.result())
+
+    def forget(self, key: Hashable) -> None:
+        """Make the next caller for ``key`` start a fresh call (e.g. after a write)."""
+        self._flights.pop(key, None)
+        if self.cache is not None:
+            self.cache.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "shared": self.shared,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+        }
+
+
+_MISSING = object()
@@ -0,0 +1,154 @@
+import base64
+import functools
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from . import config
+from .cache import Generations
+from .compaction import behind_watermark
+from .datastore import firestore_pool
+from .repositories import TaskRepository
+from .singleflight import SingleFlight
+
+
+# Per-user task write generations, and the coalesced change-page reads keyed on them
+generations = Generations(config.SYNC_MAX_USERS)
+change_reads = SingleFlight("sync_changes", ttl=config.SYNC_READ_CACHE_TTL, cache_size=config.SYNC_READ_CACHE_SIZE)
+
+
+def encode_cursor(updated_at: int, doc_id: str) -> str:
+    raw = json.dumps([updated_at, doc_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return int(updated_at), str(doc_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def last_writer_wins(tasks: List[Dict[str, Any]], stored: Dict[str, Dict[str, Any]], last_stamp: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Resolve client task versions against the stored ones on ``updated_at``; ties go
+    to the client so retried syncs are idempotent.
+
+    Returns ``(accepted, rejected)``: the accepted versions stamped with consecutive
+    server ``updatedAt`` values after ``last_stamp`` (and no earlier than the current
+    time), and the stored documents that beat a client version.
+    """
+    stamp = max(int(time.time() * 1000), last_stamp + 1)
+    accepted = []
+    rejected = []
+    for task in tasks:
+        existing = stored.get(task["id"])
+        if existing is not None and existing.get("updated_at", 0) > task["updated_at"]:
+            rejected.append({**existing, "id": task["id"]})
+        else:
+            accepted.append({**task, "updatedAt": stamp})
+            stamp += 1
+    return accepted, rejected
+
+
+async def apply_client_tasks(tasks_repo: TaskRepository, uid: str, tasks: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Write client task versions using last-writer-wins on ``Task.updated_at``.
+
+    Versions are written in atomic batches of at most ``SYNC_BATCH_SIZE``. The
+    repository compares them with the stored versions and stamps them from the
+    user's change sequence inside the write, so a concurrent write cannot slip
+    between the comparison and the commit, and stamps follow commit order.
+
+    Returns ``(written, rejected)``: the accepted task documents as stored (with
+    their server ``updatedAt``), and the stored documents that beat a client version.
+    """
+    # One write of the batch advances the user's change sequence
+    batch_size = min(config.SYNC_BATCH_SIZE, tasks_repo.max_batch_writes - 1)
+
+    # Keep only the newest version of each task when the client sends duplicates
+    latest: Dict[str, Any] = {}
+    for task in tasks:
+        current = latest.get(task.id)
+        if current is None or task.updated_at >= current.updated_at:
+            latest[task.id] = task
+
+    written = []
+    rejected = []
+    # Batches go one after another: the user's writes commit one at a time anyway
+    for chunk in _chunks([task.model_dump() for task in latest.values()], batch_size):
+        accepted, beaten = await firestore_pool.run(
+            tasks_repo.write_many, uid, [task["id"] for task in chunk], functools.partial(last_writer_wins, chunk)
+        )
+        written.extend(accepted)
+        rejected.extend(beaten)
+    return written, rejected
+
+
+async def sync(tasks_repo: TaskRepository, uid: str, tasks: List[Any], cursor: Optional[str], last_sync_time: Optional[int], page_size: Optional[int]) -> Dict[str, Any]:
+    """
+    Run one delta-sync round for a user's tasks.
+
+    Client versions are applied first, then one page of server changes after the
+    client's cursor is read. Versions this round just wrote are skipped in the
+    page (the client already has them) but still advance the cursor. Legacy
+    clients may send ``last_sync_time`` (milliseconds) instead of a cursor.
+
+    A cursor behind the user's tombstone watermark (deletions it has not seen
+    were purged) is discarded: the round starts over from the beginning and sets
+    ``full_resync`` so the client rebuilds its copy from the pages that follow.
+
+    The accepted client versions are returned as ``written_tasks`` (for change
+    notifications); they are not part of ``SyncResponse``.
+    """
+    if cursor:
+        position = decode_cursor(cursor)
+    elif last_sync_time:
+        position = (last_sync_time, "")
+    else:
+        position = None
+    limit = min(page_size or config.SYNC_PAGE_SIZE, config.SYNC_MAX_PAGE_SIZE)
+    full_resync = position is not None and await behind_watermark(tasks_repo, uid, position)
+    if full_resync:
+        position = None
+
+    written_tasks, rejected = await apply_client_tasks(tasks_repo, uid, tasks) if tasks else ([], [])
+    if written_tasks:
+        generations.bump(uid)
+    written = {task["id"]: task["updatedAt"] for task in written_tasks}
+    # Devices asking for the same page at once share one query; a round that just wrote
+    # is on a new generation, so it never joins a read that started before its write
+    docs, has_more = await change_reads.do(
+        (uid, generations.get(uid), position, limit),
+        firestore_pool.run, tasks_repo.changes_since, uid, position, limit
+    )
+
+    changes = [doc for doc in docs if written.get(doc["id"]) != doc.get("updatedAt")]
+    listed = {doc["id"] for doc in changes}
+    changes.extend(doc for doc in rejected if doc["id"] not in listed)
+    if docs:
+        position = (docs[-1]["updatedAt"], docs[-1]["id"])
+    next_cursor = encode_cursor(*position) if position is not None else None
+
+    return {
+        "synced_tasks": changes,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "full_resync": full_resync,
+        # Where a legacy client resumes: the last change delivered, never a clock reading
+        # that could pass over a write still being committed
+        "server_time": position[0] if position is not None else 0,
+        "written_tasks": written_tasks,
+    }
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+
+from . import config
+from .datastore import storage_pool
+from .repositories import BlobWriter
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(HTTPException):
+    """Raised as soon as an upload is known to exceed the size limit."""
+
+    def __init__(self, max_size: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum limit of {max_size} bytes"
+        )
+
+
+async def stream_upload(
+    file: UploadFile,
+    writer: BlobWriter,
+    max_size: int = config.MAX_UPLOAD_SIZE,
+    chunk_size: int = config.UPLOAD_CHUNK_SIZE
+) -> int:
+    """
+    Stream an UploadFile into a blob writer chunk by chunk.
+
+    The file is read ``chunk_size`` bytes at a time and each chunk is handed to the
+    writer before the next one is read, so memory per upload stays at about one
+    chunk regardless of file size. The size limit is enforced as bytes arrive;
+    exceeding it aborts the writer without creating a blob.
+
+    Returns the number of bytes uploaded.
+    """
+    size = 0
+    try:
+        if file.size is not None and file.size > max_size:
+            raise UploadTooLargeError(max_size)
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            await storage_pool.run(writer.write, chunk)
+        await storage_pool.run(writer.close)
+    except BaseException:
+        writer.abort()
+        raise
+    return size
+
+
+def _hash_file(fileobj: BinaryIO, chunk_size: int) -> Tuple[str, int]:
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+async def hash_upload(
+    file: UploadFile,
+    max_size: int = config.MAX_UPLOAD_SIZE,
+    chunk_size: int = config.UPLOAD_CHUNK_SIZE
+) -> Tuple[str, int]:
+    """
+    Return the SHA-256 hex digest and size of an upload, enforcing the size limit.
+
+    The form parser has already spooled the file locally (to disk past 1MB), so
+    hashing it first costs a local read and lets a duplicate skip the storage write
+    entirely. Runs in a thread; the file is rewound afterwards.
+    """
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+    digest, size = await asyncio.to_thread(_hash_file, file.file, chunk_size)
+    if size > max_size:
+        raise UploadTooLargeError(max_size)
+    return digest, size
+
+
+def dedup_scope(uid: str) -> Optional[str]:
+    """Index scope of ``uid``'s uploads under ``UPLOAD_DEDUP``: their UID, or ``None`` when shared."""
+    return None if config.UPLOAD_DEDUP == "global" else uid
+
+
+class ContentLengthLimitMiddleware:
+    """
+    Reject oversized request bodies before they are read.
+
+    FastAPI parses multipart bodies before the endpoint runs, so the endpoint can
+    only reject an oversized file after it has been received. This ASGI middleware
+    checks the declared Content-Length of requests to the given paths and answers
+    413 immediately. Bodies sent without a Content-Length are still limited by the
+    endpoint while streaming.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            limit = self.limits.get(scope["path"])
+            if limit is not None:
+                length = self._content_length(scope)
+                if length is not None and length > limit:
+                    await self._reject(send, limit)
+                    return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _content_length(scope) -> Optional[int]:
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps({
+            "status": "error",
+            "message": f"Request body exceeds maximum limit of {limit} bytes"
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})